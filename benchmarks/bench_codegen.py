@@ -0,0 +1,80 @@
+"""
+Benchmark: generic vs. compiled (code-generated) config loaders and exporters.
+
+Builds a schema with 2.000 values (100 sections with 20 values each) and compares
+loading a nested dict, loading a flat dict and exporting into an existing TOML
+document using the generic implementations and the compiled schema.
+
+Usage: ``python benchmarks/bench_codegen.py``
+"""
+import timeit
+
+import cyra
+from cyra.codegen import compile_schema
+
+N_SECTIONS = 100
+N_VALUES = 20
+N_RUNS = 20
+
+
+def make_builder():  # type: () -> cyra.ConfigBuilder
+    builder = cyra.ConfigBuilder()
+
+    for i in range(N_SECTIONS):
+        builder.comment('Section %d' % i)
+        builder.push('section_%d' % i)
+
+        for j in range(N_VALUES):
+            builder.comment('Value %d' % j)
+            if j % 4 == 0:
+                builder.define('value_%d' % j, 'value')
+            elif j % 4 == 1:
+                builder.define('value_%d' % j, j, validator=lambda x: x >= 0)
+            else:
+                builder.define('value_%d' % j, j)
+        builder.pop()
+
+    return builder
+
+
+def bench(name, fun):
+    t = min(timeit.repeat(fun, number=N_RUNS, repeat=3)) / N_RUNS
+    print('%-24s %8.3f ms' % (name, t * 1000))
+    return t
+
+
+def run(label, cfg, toml_str, cfg_dict, flat_dict):
+    print(label)
+    cfg.load_toml(toml_str)
+    results = (
+        bench('  load dict', lambda: cfg._load_dict(cfg_dict)),
+        bench('  load flat dict', lambda: cfg.load_flat_dict(flat_dict)),
+        bench('  export toml', cfg.export_toml),
+    )
+    return results
+
+
+def main():
+    print('%d values' % (N_SECTIONS * N_VALUES))
+
+    source = cyra.Config('', make_builder())
+    toml_str = source.export_toml()
+    cfg_dict = source._to_dict()
+    flat_dict = dict(('.'.join(path), entry._val) for path, entry in source._config.items()
+                     if isinstance(entry, cyra.core.ConfigValue))
+
+    generic = run('Generic', cyra.Config('', make_builder()), toml_str, cfg_dict, flat_dict)
+
+    builder = make_builder()
+    bench('Compile schema', lambda: compile_schema(builder._config))
+    builder.compile()
+    compiled = run('Compiled', cyra.Config('', builder), toml_str, cfg_dict, flat_dict)
+
+    print('Speedup')
+    for name, t_gen, t_comp in zip(('load dict', 'load flat dict', 'export toml'),
+                                   generic, compiled):
+        print('  %-22s %8.2fx' % (name, t_gen / t_comp))
+
+
+if __name__ == '__main__':
+    main()
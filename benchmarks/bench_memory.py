@@ -0,0 +1,60 @@
+"""
+Memory benchmark: per-key footprint of the config schema and of Config instances.
+
+Builds a schema with 50.000 values (1000 sections with 50 values each) and uses
+tracemalloc to measure the memory allocated by the ConfigBuilder and by each
+Config instance built from it.
+
+Usage: ``python benchmarks/bench_memory.py``
+"""
+import gc
+import tracemalloc
+
+import cyra
+
+N_SECTIONS = 1000
+N_VALUES = 50
+N_INSTANCES = 3
+
+
+def make_builder():  # type: () -> cyra.ConfigBuilder
+    builder = cyra.ConfigBuilder()
+
+    for i in range(N_SECTIONS):
+        builder.comment('Section %d' % i)
+        builder.push('section_%d' % i)
+
+        for j in range(N_VALUES):
+            builder.comment('Value %d' % j)
+            builder.define('value_%d' % j, j)
+        builder.pop()
+
+    return builder
+
+
+def measure(fun):
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    result = fun()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    n_keys = N_SECTIONS * N_VALUES
+
+    builder, size = measure(make_builder)
+    print('Schema:   %8.1f bytes/key' % (size / n_keys))
+
+    def make_instances():
+        return [cyra.Config('', builder) for _ in range(N_INSTANCES)]
+
+    _, size = measure(make_instances)
+    print('Instance: %8.1f bytes/key' % (size / n_keys / N_INSTANCES))
+
+
+if __name__ == '__main__':
+    main()
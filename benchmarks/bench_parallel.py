@@ -0,0 +1,51 @@
+"""
+Benchmark: loading a config with expensive hooks sequentially and in a thread pool.
+
+Builds a schema with 200 values whose hooks block for 2 ms each (like hooks that
+check files or load certificates) and compares the load time without an executor
+and with thread pools of different sizes.
+
+Usage: ``python benchmarks/bench_parallel.py``
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cyra
+
+N_VALUES = 200
+HOOK_DELAY = 0.002
+
+
+def slow_hook(value):
+    time.sleep(HOOK_DELAY)
+    return value
+
+
+def make_config():  # type: () -> cyra.Config
+    builder = cyra.ConfigBuilder()
+
+    for i in range(N_VALUES):
+        builder.define('value_%d' % i, 'value', hook=slow_hook)
+
+    return cyra.Config('', builder)
+
+
+def bench(name, cfg, json_str, executor=None):
+    start = time.perf_counter()
+    cfg.load_json(json_str, executor=executor)
+    print('%-24s %8.1f ms' % (name, (time.perf_counter() - start) * 1000))
+
+
+def main():
+    cfg = make_config()
+    json_str = cfg.export_json()
+
+    bench('Sequential', cfg, json_str)
+
+    for n_workers in (2, 4, 8, 16):
+        with ThreadPoolExecutor(n_workers) as executor:
+            bench('Thread pool (%d)' % n_workers, cfg, json_str, executor)
+
+
+if __name__ == '__main__':
+    main()
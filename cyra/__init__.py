@@ -1,3 +1,4 @@
-from cyra.core import Config, ConfigBuilder  # noqa: F401
+from cyra.core import Config, ConfigBuilder, ConfigValueError, ErrorReport, \
+    ConfigChange, ConfigDiff, ConfigFileChangedError, ConstraintError  # noqa: F401
 
 __version__ = '1.0.2'
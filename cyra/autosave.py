@@ -0,0 +1,195 @@
+"""
+Background persistence for configs that are modified at runtime.
+
+Use :meth:`cyra.Config.enable_autosave` to create an :class:`AutoSaver`.
+"""
+from typing import Optional  # noqa: F401
+import os
+import json
+import atexit
+import logging
+import weakref
+import threading
+
+from cyra.core import Config, ConfigValue, ErrorReport  # noqa: F401
+
+# Autosavers that have to be flushed when the interpreter exits
+_savers = weakref.WeakSet()
+
+
+class AutoSaver(object):
+    """
+    Saves a config to its file after its values were modified.
+
+    All changes within the debounce delay are coalesced into a single write
+    that is executed by a background timer.
+
+    Optionally, every change is appended to a journal file as a small JSON record
+    (``["DATABASE.port",1234]``), so changes that were not written yet survive a crash.
+    The journal is compacted into the config file on every write and replayed
+    when the autosaver is created.
+
+    Pending changes are written when the autosaver is closed and when the interpreter exits.
+    """
+
+    def __init__(self, config, delay=1.0, journal=None, compact_every=100):
+        # type: (Config, float, Optional[str], int) -> None
+        """
+        :param config: Config to be saved
+        :param delay: Debounce delay in seconds
+        :param journal: Path of the journal file (default: no journal)
+        :param compact_every: Write the config file after this number of journal records,
+                              even if the debounce delay has not expired yet
+        """
+        self.delay = delay
+        self.compact_every = compact_every
+
+        self._cfg = config
+        # The config lock also guards the pending flag and the timer, so saves
+        # never interleave with modifications of the config
+        self._lock = config._lock
+        self._timer = None  # type: Optional[threading.Timer]
+        self._pending = False
+        self._n_records = 0
+        self._journal = None
+
+        #: Number of changes replayed from the journal
+        self.n_replayed = 0
+
+        if journal is not None:
+            self.n_replayed = self._replay(journal)
+            self._journal = open(journal, 'a')
+            self._journal.truncate(0)
+
+        _savers.add(self)
+
+    def _replay(self, journal):  # type: (str) -> int
+        """
+        Apply the changes recorded in the journal and write them to the config file.
+
+        Incomplete records (from a crash while writing the journal)
+        and records of unknown config values are skipped. If the replayed changes
+        violate a constraint of the config, they are rolled back and the journal is discarded.
+
+        :param journal: Path of the journal file
+        :return: Number of replayed changes
+        """
+        if not os.path.isfile(journal):
+            return 0
+
+        cfg = self._cfg
+        report = ErrorReport()
+        n_replayed = 0
+
+        with cfg._lock:
+            snapshot = cfg._snapshot()
+            map_keys = cfg._snapshot_maps()
+
+            with open(journal, 'r') as f:
+                for line in f:
+                    try:
+                        path, value = json.loads(line)
+                        entry = cfg._get_entry(path, True)
+                    except (ValueError, TypeError, KeyError):
+                        continue
+
+                    entry._set(value, report)
+                    n_replayed += 1
+
+            error = cfg._commit_changes(snapshot)
+            if error is not None:
+                cfg._rollback_maps(map_keys)
+                report.add(error)
+                n_replayed = 0
+
+            report.finish()
+            cfg._values_loaded()
+
+            if n_replayed:
+                logging.info('Cyra replayed %d changes from %s' % (n_replayed, journal))
+                cfg.save_file(True)
+        return n_replayed
+
+    def notify(self, entry):  # type: (Optional[ConfigValue]) -> None
+        """
+        Record the change of a config value and schedule a write.
+
+        :param entry: Modified config value. None for changes that cannot be
+                      journaled (e.g. removed map entries).
+        """
+        with self._lock:
+            self._pending = True
+
+            if self._journal is not None:
+                record = None
+                if entry is not None:
+                    try:
+                        record = json.dumps(['.'.join(entry._path), entry._val],
+                                            separators=(',', ':'))
+                    except (TypeError, ValueError):
+                        pass
+
+                if record is None:
+                    # Changes that cannot be journaled are written immediately
+                    self._flush()
+                    return
+
+                self._journal.write(record + '\n')
+                self._journal.flush()
+                self._n_records += 1
+
+                if self._n_records >= self.compact_every:
+                    self._flush()
+                    return
+
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self._on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _on_timer(self):  # type: () -> None
+        # noinspection PyBroadException
+        try:
+            self.flush()
+        except Exception:
+            logging.exception('Cyra could not save your config to %s' % self._cfg._file)
+
+    def flush(self):  # type: () -> None
+        """Write pending changes to the config file and compact the journal"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):  # type: () -> None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._pending:
+            self._cfg.save_file(True)
+            self._pending = False
+
+        if self._journal is not None and self._n_records:
+            self._journal.truncate(0)
+            self._n_records = 0
+
+    def close(self):  # type: () -> None
+        """Write pending changes and stop the autosaver"""
+        with self._lock:
+            self._flush()
+
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+        _savers.discard(self)
+
+
+@atexit.register
+def _close_all():  # type: () -> None
+    """Write the pending changes of all autosavers on shutdown"""
+    for saver in list(_savers):
+        # noinspection PyBroadException
+        try:
+            saver.close()
+        except Exception:
+            logging.exception('Cyra could not save your config on shutdown')
@@ -0,0 +1,239 @@
+"""
+Command line interface for validating and converting config files in bulk.
+
+Usage: ``python -m cyra <command> <Module>.<Class> <files>``
+
+Commands:
+
+* ``validate``: Load the files and report invalid values
+* ``normalize``: Load the files and write them back (adding missing values)
+* ``convert``: Convert the files to another format (``toml``, ``json`` or ``binary``)
+* ``schema``: Output the JSON Schema of the config (``python -m cyra schema <Module>.<Class>``)
+
+Files are processed in parallel. Files with invalid values are never written.
+The exit code is 0 if all files are valid, 1 if any file is invalid
+and 2 if the config class could not be imported.
+"""
+from typing import Dict, List, Optional, Tuple  # noqa: F401
+import os
+import sys
+import json
+import timeit
+import logging
+import argparse
+import multiprocessing
+
+from cyra.core import Config, ErrorReport, import_config_class  # noqa: F401
+
+# Format name -> file extension
+FORMATS = {
+    'toml': '.toml',
+    'json': '.json',
+    'binary': '.bin',
+}
+
+
+def _get_format(file):  # type: (str) -> str
+    """Get the format of a config file from its extension (default: toml)"""
+    ext = os.path.splitext(file)[1].lower()
+    for fmt, fmt_ext in FORMATS.items():
+        if ext == fmt_ext:
+            return fmt
+    return 'toml'
+
+
+def _load(cfg, file):  # type: (Config, str) -> ErrorReport
+    """Load a config file in the format given by its extension"""
+    fmt = _get_format(file)
+
+    if fmt == 'binary':
+        with open(file, 'rb') as f:
+            return cfg.load_binary(f.read())
+
+    with open(file, 'r') as f:
+        data = f.read()
+
+    if fmt == 'json':
+        return cfg.load_json(data)
+    return cfg.load_toml(data)
+
+
+def _save(cfg, file, fmt):  # type: (Config, str, str) -> None
+    """Write a config file in the given format"""
+    if fmt == 'binary':
+        with open(file, 'wb') as f:
+            f.write(cfg.export_binary())
+        return
+
+    data = cfg.export_json(2) if fmt == 'json' else cfg.export_toml()
+    with open(file, 'w') as f:
+        f.write(data)
+
+
+def _output_path(file, fmt, output_dir=None):  # type: (str, str, Optional[str]) -> str
+    """Get the path of a converted config file"""
+    name = os.path.splitext(os.path.basename(file))[0] + FORMATS[fmt]
+    return os.path.join(output_dir or os.path.dirname(file), name)
+
+
+def process_file(task):  # type: (Tuple[str, str, str, Dict]) -> Dict
+    """
+    Validate, normalize or convert a config file.
+
+    This function is run in the worker processes.
+
+    :param task: Tuple: config class path, command, file path, options
+    :return: Result dictionary (file, ok, errors, output, time_ms)
+    """
+    cfg_path, command, file, options = task
+    start = timeit.default_timer()
+    result = {'file': file, 'ok': True, 'errors': [], 'output': None}
+
+    # noinspection PyBroadException
+    try:
+        cfg = import_config_class(cfg_path)(file)
+        report = _load(cfg, file)
+        result['errors'] = [str(error) for error in report]
+
+        if not report:
+            if command == 'normalize':
+                result['output'] = file
+                _save(cfg, file, _get_format(file))
+            elif command == 'convert':
+                result['output'] = _output_path(file, options['to'], options.get('output_dir'))
+                _save(cfg, result['output'], options['to'])
+    except Exception as e:
+        result['errors'] = ['%s: %s' % (type(e).__name__, e)]
+
+    result['ok'] = not result['errors']
+    result['time_ms'] = (timeit.default_timer() - start) * 1000
+    return result
+
+
+def run(cfg_path, command, files, options=None, jobs=None):
+    # type: (str, str, List[str], Optional[Dict], Optional[int]) -> Dict
+    """
+    Process config files in parallel.
+
+    :param cfg_path: Config class path with the format ``<Module>.<Class>``
+    :param command: ``validate``, ``normalize`` or ``convert``
+    :param files: Paths of the config files
+    :param options: Command options (``to``, ``output_dir``)
+    :param jobs: Number of worker processes (default: number of CPUs)
+    :return: Report dictionary
+    """
+    tasks = [(cfg_path, command, file, options or {}) for file in files]
+    jobs = min(jobs or multiprocessing.cpu_count(), len(tasks))
+
+    if jobs <= 1:
+        results = [process_file(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            results = pool.map(process_file, tasks, max(1, len(tasks) // (jobs * 4)))
+        finally:
+            pool.close()
+            pool.join()
+
+    return {
+        'config': cfg_path,
+        'command': command,
+        'n_files': len(results),
+        'n_failed': sum(1 for res in results if not res['ok']),
+        'files': results,
+    }
+
+
+def _print_report(report, timing=False):  # type: (Dict, bool) -> None
+    out = sys.stdout
+
+    for res in report['files']:
+        line = '%-4s %s' % ('OK' if res['ok'] else 'FAIL', res['file'])
+        if res['output'] and res['output'] != res['file']:
+            line += ' -> ' + res['output']
+        if timing:
+            line += ' (%.1f ms)' % res['time_ms']
+        out.write(line + '\n')
+
+        for error in res['errors']:
+            out.write('     %s\n' % error)
+
+    out.write('%d files, %d failed\n' % (report['n_files'], report['n_failed']))
+
+
+def make_parser():  # type: () -> argparse.ArgumentParser
+    parser = argparse.ArgumentParser(prog='python -m cyra',
+                                     description='Validate and convert Cyra config files.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    def add_command(name, help_text):
+        cmd = subparsers.add_parser(name, help=help_text)
+        cmd.add_argument('config', help='Config class (<Module>.<Class>)')
+        cmd.add_argument('files', nargs='+', help='Config files (.toml, .json, .bin)')
+        cmd.add_argument('-j', '--jobs', type=int, help='Number of worker processes')
+        cmd.add_argument('--json', action='store_true', help='Print the report as JSON')
+        cmd.add_argument('--timing', action='store_true', help='Print the time per file')
+        return cmd
+
+    add_command('validate', 'Report invalid config values')
+    add_command('normalize', 'Write the files back, adding missing values')
+    convert = add_command('convert', 'Convert the files to another format')
+    convert.add_argument('--to', required=True, choices=sorted(FORMATS), help='Output format')
+    convert.add_argument('-o', '--output-dir', help='Output directory (default: input directory)')
+
+    schema = subparsers.add_parser('schema', help='Output the JSON Schema of the config')
+    schema.add_argument('config', help='Config class (<Module>.<Class>)')
+    schema.add_argument('-o', '--output', help='Output file (default: stdout)')
+
+    return parser
+
+
+def _write_schema(cfg_class, output=None):  # type: (type, Optional[str]) -> None
+    """Write the JSON Schema of a config class to a file or to stdout"""
+    schema_str = json.dumps(cfg_class.builder.json_schema(cfg_class.__name__), indent=2) + '\n'
+
+    if output is None:
+        sys.stdout.write(schema_str)
+    else:
+        with open(output, 'w') as f:
+            f.write(schema_str)
+
+
+def main(argv=None):  # type: (Optional[List[str]]) -> int
+    """
+    Run the command line interface.
+
+    :param argv: Command line arguments (default: ``sys.argv[1:]``)
+    :return: Exit code
+    """
+    args = make_parser().parse_args(argv)
+
+    # Resolve the class once before starting the workers
+    try:
+        cfg_class = import_config_class(args.config)
+    except (ValueError, ImportError, AttributeError, TypeError) as e:
+        sys.stderr.write('Could not import config class %s: %s\n' % (args.config, e))
+        return 2
+
+    if args.command == 'schema':
+        _write_schema(cfg_class, args.output)
+        return 0
+
+    options = {}
+    if args.command == 'convert':
+        options = {'to': args.to, 'output_dir': args.output_dir}
+
+    # Value errors are part of the report, so they do not need to be logged
+    logging.disable(logging.CRITICAL)
+    try:
+        report = run(args.config, args.command, args.files, options, args.jobs)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    if args.json:
+        sys.stdout.write(json.dumps(report, indent=2) + '\n')
+    else:
+        _print_report(report, args.timing)
+
+    return 1 if report['n_failed'] else 0
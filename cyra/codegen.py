@@ -0,0 +1,163 @@
+"""
+Code generation for specialized config loaders and exporters.
+
+The generic implementations in :class:`cyra.core.Config` loop over the config dict
+and dispatch on the entry type for every entry. A compiled schema contains
+generated functions that are unrolled for exactly the paths of one schema.
+Values without validators/hooks get an inlined fast path for input values
+that already have the type of the default value.
+"""
+from typing import Dict, List, Tuple, Callable  # noqa: F401
+import tomlkit
+
+from cyra.core import ConfigEntry, ConfigValue, Config, TOMLDocument, ErrorReport  # noqa: F401
+
+# Types whose constructor returns the input value unchanged if it already has the exact type
+_FAST_TYPES = (int, float, bool, str)
+
+_INDENT = '    '
+
+
+class CompiledSchema(object):
+    """
+    Generated loader and exporter functions for a config schema.
+
+    All functions take the tuple of the config entries of a Config instance
+    (in schema order) as their first argument.
+
+    * ``load_dict(entries, cfg_dict, report)`` imports a nested dictionary
+      and returns a tuple (number of imported values, number of missing values)
+    * ``load_flat_dict(entries, flat_dict, report)`` imports a flat dictionary
+    * ``export(entries, document, dumps=tomlkit.dumps)`` writes the config into
+      a TOML document and returns the document rendered by ``dumps``
+    """
+    __slots__ = ('size', 'source', 'load_dict', 'load_flat_dict', 'export')
+
+    def __init__(self, size, source, namespace):  # type: (int, str, Dict) -> None
+        # Number of entries in the compiled schema
+        self.size = size
+        # Generated source code
+        self.source = source
+
+        self.load_dict = namespace['load_dict']  # type: Callable
+        self.load_flat_dict = namespace['load_flat_dict']  # type: Callable
+        self.export = namespace['export']  # type: Callable
+
+
+def _is_fast(entry):  # type: (ConfigEntry) -> bool
+    """Return True if setting the entry can be inlined for values of the default type"""
+    return isinstance(entry, ConfigValue) and type(entry._default) in _FAST_TYPES \
+        and entry._validator is None and entry._hook is None
+
+
+def _gen_set(lines, entry, i, depth):  # type: (List[str], ConfigValue, int, int) -> None
+    """Generate the code setting the input value ``v`` to entry number i"""
+    ind = _INDENT * depth
+
+    if _is_fast(entry):
+        lines.append(ind + 'if type(v) is %s:' % type(entry._default).__name__)
+        lines.append(ind + _INDENT + 'e[%d]._ConfigValue__val = v' % i)
+        lines.append(ind + 'else:')
+        ind += _INDENT
+    lines.append(ind + 'e[%d]._set(v, report)' % i)
+
+
+def _var(path, sections):  # type: (Tuple, Dict[Tuple, int]) -> str
+    """Return the name of the local variable holding the table at the given path"""
+    if not path:
+        return 'd'
+    return 's%d' % sections[path]
+
+
+def _gen_load_dict(config):  # type: (Dict[Tuple, ConfigEntry]) -> List[str]
+    lines = ['def load_dict(e, d, report):',
+             _INDENT + 'n = 0',
+             _INDENT + 'missing = 0']
+    sections = {}
+
+    for i, (path, entry) in enumerate(config.items()):
+        parent = _var(path[:-1], sections)
+
+        if isinstance(entry, ConfigValue):
+            lines.append(_INDENT + 'v = %s.get(%r)' % (parent, path[-1]))
+            lines.append(_INDENT + 'if v is not None:')
+            _gen_set(lines, entry, i, 2)
+            lines.append(_INDENT * 2 + 'n += 1')
+            lines.append(_INDENT + 'else:')
+            lines.append(_INDENT * 2 + 'missing += 1')
+        else:
+            sections[path] = i
+            lines.append(_INDENT + '%s = %s.get(%r) or EMPTY'
+                         % (_var(path, sections), parent, path[-1]))
+
+    lines.append(_INDENT + 'return n, missing')
+    return lines
+
+
+def _gen_load_flat_dict(config):  # type: (Dict[Tuple, ConfigEntry]) -> List[str]
+    lines = ['def load_flat_dict(e, d, report):',
+             _INDENT + 'get = d.get']
+
+    for i, (path, entry) in enumerate(config.items()):
+        if not isinstance(entry, ConfigValue):
+            continue
+
+        lines.append(_INDENT + 'v = get(P[%d])' % i)
+        lines.append(_INDENT + 'if v is None:')
+        lines.append(_INDENT * 2 + 'v = get(%r)' % '.'.join(path))
+        lines.append(_INDENT + 'if v is not None:')
+        _gen_set(lines, entry, i, 2)
+
+    return lines
+
+
+def _gen_export(config):  # type: (Dict[Tuple, ConfigEntry]) -> List[str]
+    # The document value is only read once. This is equivalent to the generic exporter
+    # since setting an entry never changes the lookup result of a following entry.
+    lines = ['def export(e, document, dumps=dumps):',
+             _INDENT + 'd = document.value']
+    sections = {}
+
+    for i, (path, entry) in enumerate(config.items()):
+        parent = _var(path[:-1], sections)
+        lines.append(_INDENT + 't = %s.get(%r)' % (parent, path[-1]))
+
+        if isinstance(entry, ConfigValue):
+            lines.append(_INDENT + 'if t is None or e[%d]._ConfigValue__val != t:' % i)
+        else:
+            sections[path] = i
+            lines.append(_INDENT + '%s = t or EMPTY' % _var(path, sections))
+            lines.append(_INDENT + 'if t is None:')
+        lines.append(_INDENT * 2 + 'set_entry(document, P[%d], e[%d])' % (i, i))
+
+    lines.append(_INDENT + 'return dumps(document)')
+    return lines
+
+
+def compile_schema(config):  # type: (Dict[Tuple, ConfigEntry]) -> CompiledSchema
+    """
+    Generate specialized loader and exporter functions for a config schema.
+
+    :param config: Config dict of a :class:`cyra.ConfigBuilder`
+    :return: Compiled schema
+    :raise ValueError: if the schema could not be compiled
+    """
+    lines = _gen_load_dict(config)
+    lines += _gen_load_flat_dict(config)
+    lines += _gen_export(config)
+    source = '\n'.join(lines) + '\n'
+
+    namespace = {
+        'EMPTY': {},
+        'P': tuple(config.keys()),
+        'set_entry': Config._set_toml_entry,
+        'dumps': tomlkit.dumps,
+    }
+
+    try:
+        code = compile(source, '<cyra schema>', 'exec')
+    except (SyntaxError, RuntimeError) as e:
+        raise ValueError('Config schema could not be compiled: %s' % e)
+
+    exec(code, namespace)
+    return CompiledSchema(len(config), source, namespace)
@@ -1,12 +1,186 @@
-from typing import Optional, Dict, List, Tuple, Callable, Any
-from collections import OrderedDict
+from typing import Optional, Dict, List, Set, Tuple, Callable, Any, Union, Iterator, Iterable
+from collections import OrderedDict, namedtuple
 import os
 import copy
+import json
+import marshal
+import shutil
+import hashlib
+import datetime
+import functools
 import logging
 import inspect
+import importlib
+import threading
+import contextlib
 import tomlkit
+from tomlkit.items import Table, AoT
 from tomlkit.toml_document import TOMLDocument
 
+try:
+    import reprlib
+except ImportError:  # pragma: no cover
+    import repr as reprlib
+
+try:
+    from sys import intern
+except ImportError:  # pragma: no cover
+    pass  # Python 2: intern is a builtin
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # pragma: no cover
+    ContextVar = None
+
+# Bounded repr for rendering rejected values in error messages
+_value_repr = reprlib.Repr()
+_value_repr.maxstring = 60
+_value_repr.maxother = 60
+_value_repr.maxlist = 5
+_value_repr.maxdict = 5
+
+# Header of the binary config format: magic bytes + format version
+BINARY_HEADER = b'CYRA\x01'
+
+# Cache for parsed dot-separated paths
+_path_cache = {}  # type: Dict[str, Tuple]
+_PATH_CACHE_SIZE = 4096
+
+_MISSING = object()
+
+
+class _LocalVar(threading.local):
+    """Fallback for ``contextvars.ContextVar`` (Python < 3.7): one value per thread"""
+
+    def __init__(self, name, default=None):  # type: (str, Any) -> None
+        self.name = name
+        self.value = default
+
+    def get(self):  # type: () -> Any
+        return self.value
+
+    def set(self, value):  # type: (Any) -> Any
+        """:return: Token for restoring the previous value with :meth:`reset`"""
+        token = self.value
+        self.value = value
+        return token
+
+    def reset(self, token):  # type: (Any) -> None
+        self.value = token
+
+
+# Overrides of the current context (see Config.override()): Config -> Path -> Value
+_overrides = (ContextVar or _LocalVar)('cyra_overrides', default=None)
+
+# Number of active overrides in all contexts. Reads only look up the overrides if it is not 0.
+_n_overrides = 0
+_overrides_lock = threading.Lock()
+
+
+def _count_overrides(n):  # type: (int) -> None
+    global _n_overrides
+    with _overrides_lock:
+        _n_overrides += n
+
+
+# Atomically replaces the destination file (os.rename on Python 2)
+_replace_file = getattr(os, 'replace', os.rename)
+
+
+def _synchronized(method):  # type: (Callable) -> Callable
+    """Decorator for Config methods that must hold the lock of the config"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+# Builtin scalar types of config values (subclasses are converted by Config._plain())
+_PLAIN_TYPES = (bool, int, float, type(u''), datetime.datetime, datetime.date, datetime.time)
+
+
+def _to_base_type(value, base):  # type: (Any, type) -> Any
+    """Convert an instance of a subclass of a builtin scalar type to the builtin type"""
+    if base is datetime.datetime:
+        return datetime.datetime(value.year, value.month, value.day, value.hour, value.minute,
+                                 value.second, value.microsecond, value.tzinfo)
+    if base is datetime.date:
+        return datetime.date(value.year, value.month, value.day)
+    if base is datetime.time:
+        return datetime.time(value.hour, value.minute, value.second, value.microsecond,
+                             value.tzinfo)
+    return base(value)
+
+
+def _json_default(value):  # type: (Any) -> str
+    """Encode the values that are not supported by JSON (dates and times as ISO 8601 strings)"""
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError('Object of type %s is not JSON serializable' % type(value).__name__)
+
+
+def _intern(string):  # type: (str) -> str
+    """Intern a string, so identical keys and comments share their storage"""
+    return intern(string) if type(string) is str else string
+
+
+def parse_path(path):  # type: (Union[str, Tuple]) -> Tuple
+    """
+    Convert a dot-separated path (for example ``'DATABASE.server'``) into a path tuple.
+    Parsed paths are cached.
+
+    :param path: Dot-separated path or path tuple
+    :return: Path tuple
+    """
+    if isinstance(path, tuple):
+        return path
+
+    try:
+        return _path_cache[path]
+    except KeyError:
+        if len(_path_cache) >= _PATH_CACHE_SIZE:
+            _path_cache.clear()
+
+        parsed = _path_cache[path] = tuple(path.split('.'))
+        return parsed
+
+
+def _value_hash(path, value):  # type: (Tuple, Any) -> int
+    """
+    Compute a 64-bit hash of a config value and its path.
+    The hash does not depend on the Python process (unlike ``hash()``).
+
+    :param path: Path tuple
+    :param value: Config value
+    :return: Hash
+    """
+    data = json.dumps([path, value], sort_keys=True, separators=(',', ':'), default=repr)
+    return int(hashlib.sha1(data.encode('utf-8')).hexdigest()[:16], 16)
+
+
+def _iter_document(document):  # type: (TOMLDocument) -> Iterator[str]
+    """
+    Render a TOML document, yielding one chunk per top-level item
+    (``tomlkit.dumps`` builds the whole string at once).
+
+    :param document: TOML document
+    :return: Iterator over the chunks of the TOML string
+    """
+    if not hasattr(document, '_render_table'):  # pragma: no cover
+        yield tomlkit.dumps(document)
+        return
+
+    for key, item in document.body:
+        if key is not None and isinstance(item, Table):
+            yield document._render_table(key, item)
+        elif key is not None and isinstance(item, AoT):
+            yield document._render_aot(key, item)
+        else:
+            yield document._render_simple_item(key, item)
+
 
 class DictUtil(object):
     """A few useful functions for handling nested dicts"""
@@ -67,6 +241,241 @@ class DictUtil(object):
             DictUtil.set_element(d.setdefault(path[0], default_dict), path[1:], value, default_dict)
 
 
+class ConfigValueError(ValueError):
+    """
+    A config value that was rejected and replaced with its default value.
+
+    When loading in fail-fast mode, this error is raised on the first invalid value.
+    Otherwise it is collected in the :class:`ErrorReport` of the load operation.
+    Invalid overrides (:meth:`Config.override`) are rejected with this error as well.
+    The error message is only formatted when needed, using a bounded representation
+    of the rejected value.
+    """
+
+    def __init__(self, path, reason, value, default, override=False):
+        # type: (Tuple, str, Any, Any, bool) -> None
+        """
+        :param path: Cfg field path
+        :param reason: Reason why the value was rejected (for example ``'is invalid'``)
+        :param value: Rejected value
+        :param default: Default value the field falls back to
+        :param override: The value was rejected as an override (the field keeps its value)
+        """
+        super(ConfigValueError, self).__init__(path, reason)
+        self.path = path
+        self.reason = reason
+        self.value = value
+        self.default = default
+        self.override = override
+
+    @property
+    def value_repr(self):  # type: () -> str
+        """Truncated representation of the rejected value"""
+        return _value_repr.repr(self.value)
+
+    def __str__(self):
+        if self.override:
+            return 'Cyra config override %s for field [%s] %s. The override was rejected.' \
+                   % (self.value_repr, '.'.join(self.path), self.reason)
+        return 'Cyra config value %s for field [%s] %s. Falling back to default value %s.' \
+               % (self.value_repr, '.'.join(self.path), self.reason,
+                  _value_repr.repr(self.default))
+
+
+class ConstraintError(ValueError):
+    """
+    A cross-field constraint that was violated by a change of config values.
+
+    The changes that violated the constraint have been rolled back
+    (or the overrides were rejected, if raised by :meth:`Config.override`).
+    """
+
+    def __init__(self, constraint, values, override=False):
+        # type: (Constraint, List[Any], bool) -> None
+        """
+        :param constraint: Violated constraint
+        :param values: Values of the constraint sources that violated the constraint
+        :param override: The constraint was violated by overridden values
+        """
+        super(ConstraintError, self).__init__(constraint.sources, constraint.message)
+        self.constraint = constraint
+        self.paths = constraint.sources
+        self.values = values
+        self.override = override
+
+    def __str__(self):
+        message = ' (%s)' % self.constraint.message if self.constraint.message else ''
+        return 'Cyra config constraint%s on fields [%s] is violated by %svalues %s. %s' \
+               % (message, ', '.join('.'.join(path) for path in self.paths),
+                  'overridden ' if self.override else '', _value_repr.repr(tuple(self.values)),
+                  'The override was rejected.' if self.override else 'Changes were rolled back.')
+
+
+class ErrorReport(object):
+    """
+    Collection of the value errors that occurred during a load operation.
+
+    The first ``log_limit`` errors are logged; further errors are only
+    recorded and summarized in a single log message at the end of the load.
+    """
+
+    #: Maximum number of errors logged per load operation
+    log_limit = 10
+
+    def __init__(self, fail_fast=False):  # type: (bool) -> None
+        """
+        :param fail_fast: Raise the first error instead of collecting it
+        """
+        self.fail_fast = fail_fast
+        self.errors = []  # type: List[ConfigValueError]
+
+        #: Keys of the input that are not config values (only recorded by :meth:`Config.ingest`)
+        self.unknown_keys = []  # type: List[Any]
+
+    def add(self, error):  # type: (Union[ConfigValueError, ConstraintError]) -> None
+        """
+        Add an error to the report.
+
+        :param error: Value error or constraint error
+        :raise ConfigValueError: if fail-fast mode is enabled
+        :raise ConstraintError: if fail-fast mode is enabled
+        """
+        if self.fail_fast:
+            raise error
+
+        self.errors.append(error)
+        if len(self.errors) <= self.log_limit:
+            logging.error('%s', error)
+
+    def finish(self):  # type: () -> ErrorReport
+        """
+        Log the number of suppressed errors (if any).
+
+        :return: self
+        """
+        n_suppressed = len(self.errors) - self.log_limit
+        if n_suppressed > 0:
+            logging.error('Cyra suppressed %d more config value errors.', n_suppressed)
+
+        if self.unknown_keys:
+            logging.warning('Cyra ignored %d unknown config keys: %s', len(self.unknown_keys),
+                            _value_repr.repr(self.unknown_keys))
+        return self
+
+    def __len__(self):
+        return len(self.errors)
+
+    def __iter__(self):
+        return iter(self.errors)
+
+    @property
+    def rolled_back(self):  # type: () -> bool
+        """True if the changes of the load operation were rolled back due to a constraint"""
+        return any(isinstance(error, ConstraintError) for error in self.errors)
+
+    def __bool__(self):
+        return bool(self.errors)
+
+    __nonzero__ = __bool__
+
+
+class LRUCache(object):
+    """
+    Thread-safe least-recently-used cache with a bounded number of entries.
+
+    The cache of a ConfigValue is shared between all Config instances built
+    from the same schema, since their values are created with ``ConfigValue._copy``.
+    """
+
+    def __init__(self, maxsize=128):  # type: (int) -> None
+        """
+        :param maxsize: Maximum number of cached entries
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(value):  # type: (Any) -> Any
+        """
+        Convert a value into a hashable cache key.
+        Lists and dicts are converted to tuples, the type is included in the key
+        so values like ``1`` and ``True`` do not collide.
+
+        :param value: Value
+        :return: Cache key
+        """
+        if isinstance(value, dict):
+            return dict, tuple((k, LRUCache.make_key(v)) for k, v in value.items())
+        if isinstance(value, (list, tuple)):
+            return type(value), tuple(LRUCache.make_key(v) for v in value)
+        return type(value), value
+
+    def get(self, key, default=None):  # type: (Any, Any) -> Any
+        """
+        Get a cached entry and mark it as recently used.
+
+        :param key: Cache key
+        :param default: Value to be returned if the key is not cached
+        :return: Cached entry / default
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def put(self, key, value):  # type: (Any, Any) -> None
+        """
+        Add an entry to the cache, evicting the least recently used entry if the cache is full.
+
+        :param key: Cache key
+        :param value: Entry
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):  # type: () -> None
+        """Remove all entries from the cache"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _run_checks(validator, hook, default, value):
+    # type: (Optional[Callable], Optional[Callable], Any, Any) -> Tuple[bool, bool, Any]
+    """
+    Run validator and hook on a cast config value.
+
+    This is a module-level function, so the checks can be run in a process pool.
+
+    :param validator: Validator (or None)
+    :param hook: Hook (or None)
+    :param default: Default value to fall back to
+    :param value: Cast value
+    :return: Tuple: is_valid (bool), hook_ok (bool), new_value
+    """
+    valid = validator is None or validator(value)
+    if not valid:
+        value = default
+
+    if hook is None:
+        return valid, True, value
+    # noinspection PyBroadException
+    try:
+        return valid, True, hook(value)
+    except Exception:
+        return valid, False, default
+
+
 class ConfigEntry(object):
     """
     Base class for config entries (both value-less nodes and ConfigValues).
@@ -75,6 +484,8 @@ class ConfigEntry(object):
     The base class holds comment and docstring.
     """
 
+    __slots__ = ('_comment', '_docstring')
+
     def __init__(self, comment='', docstring=''):  # type: (str, str) -> None
         """
         :param comment: Comment for cfg field
@@ -83,6 +494,16 @@ class ConfigEntry(object):
         self._comment = comment
         self._docstring = docstring
 
+    def _copy(self):  # type: () -> ConfigEntry
+        """
+        Copy the entry for a new Config instance.
+
+        Value-less entries do not hold any instance data, so they are shared with the schema.
+
+        :return: Config entry
+        """
+        return self
+
 
 class ConfigValue(ConfigEntry):
     """
@@ -91,9 +512,14 @@ class ConfigValue(ConfigEntry):
     Holds config value and handles validation.
     """
 
+    __slots__ = ('_default', '__val', '_path', '_validator', '_hook', '_strict', '_memo')
+
+    #: Default number of cached validator/hook results of a memoized value
+    memo_size = 128
+
     def __init__(self, comment='', docstring='', default='', path=tuple(),
-                 validator=None, hook=None, strict=False):
-        # type: (str, str, Any, Tuple, Callable, Callable, bool) -> None
+                 validator=None, hook=None, strict=False, memoize=False):
+        # type: (str, str, Any, Tuple, Callable, Callable, bool, Union[bool, int]) -> None
         """
         :param comment: Comment for cfg field
         :param docstring: Docstring for cfg field
@@ -102,6 +528,9 @@ class ConfigValue(ConfigEntry):
         :param validator: Validation function/lambda. Return true if valid value.
         :param hook: Hook function. Return modified value. Raise exception if invalid value.
         :param strict: Disable auto-casting and fall back to default value if type does not match.
+        :param memoize: Cache the results of validator and hook, keyed by the cast input value.
+                        Set to True or to the maximum number of cached results.
+                        Only use this with pure validators/hooks.
 
         :raise ValueError: if the validator/hook does not accept the default value
         """
@@ -112,6 +541,10 @@ class ConfigValue(ConfigEntry):
         self._validator = validator
         self._hook = hook
         self._strict = strict
+        self._memo = None  # type: Optional[LRUCache]
+
+        if memoize and (validator is not None or hook is not None):
+            self._memo = LRUCache(self.memo_size if memoize is True else memoize)
 
         if not self._validate(self._default):
             raise ValueError('Validator for field [%s] does not accept default value %s'
@@ -121,53 +554,232 @@ class ConfigValue(ConfigEntry):
             raise ValueError('Hook for field [%s] does not accept default value %s'
                              % ('.'.join(self._path), repr(self._default)))
 
+    def _copy(self):  # type: () -> ConfigValue
+        """
+        Copy the value for a new Config instance.
+
+        The copy shares comment, docstring, path, default value, validator, hook and cache
+        with the schema and only holds its own value.
+
+        :return: Config value
+        """
+        new = ConfigValue.__new__(type(self))
+        new._comment = self._comment
+        new._docstring = self._docstring
+        new._default = self._default
+        new.__val = self._copy_default()
+        new._path = self._path
+        new._validator = self._validator
+        new._hook = self._hook
+        new._strict = self._strict
+        new._memo = self._memo
+        return new
+
+    def _copy_default(self):  # type: () -> Any
+        """
+        :return: Default value (copied if it is mutable, since it is shared with the schema)
+        """
+        if isinstance(self._default, (list, dict)):
+            return copy.deepcopy(self._default)
+        return self._default
+
     @property
     def _val(self):
         return self.__val
 
     @_val.setter
     def _val(self, value):
+        self._set(value)
+
+    def _set(self, value, report=None):  # type: (Any, Optional[ErrorReport]) -> None
         """
         Auto-cast config value to specified type and validate it.
 
-        Log error and fall back to default value if any check did not pass.
+        Report error and fall back to default value if any check did not pass.
+
+        :param value: Raw input value
+        :param report: Error report of the current load operation.
+                       If None, errors are logged directly.
+        """
+        cast_val = self._cast(value, report)
+        self._commit(cast_val, self._check(cast_val), report)
+
+    def _commit(self, cast_val, result, report=None):
+        # type: (Any, Tuple[bool, bool, Any], Optional[ErrorReport]) -> None
         """
-        cast_val = self._cast(value)
-        nval = cast_val
+        Set the config value to the result of the validator and hook.
 
-        if not self._validate(nval):
-            self._setter_error('is invalid', cast_val)
-            nval = self._default
+        Report error if any check did not pass.
+
+        :param cast_val: Cast input value
+        :param result: Tuple: is_valid (bool), hook_ok (bool), new_value
+        :param report: Error report of the current load operation.
+                       If None, errors are logged directly.
+        """
+        valid, h_ok, nval = result
+
+        if not valid:
+            self._setter_error('is invalid', cast_val, report)
 
-        h_ok, nval = self._run_hook(nval)
         if not h_ok:
-            self._setter_error('is invalid (hook)', cast_val)
+            self._setter_error('is invalid (hook)', cast_val, report)
+
+        if nval is self._default:
+            nval = self._copy_default()
 
         self.__val = nval
 
-    def _cast(self, value):  # type: (Any) -> Any
+    def _restore(self, value):  # type: (Any) -> None
+        """
+        Restore a previous value without casting and validating it (used for rollbacks).
+
+        :param value: Previous value
+        """
+        self.__val = value
+
+    def _memo_key(self, value):  # type: (Any) -> Any
+        """
+        :param value: Cast value
+        :return: Cache key of the value. None if the value is not memoized or unhashable.
+        """
+        if self._memo is None:
+            return None
+
+        try:
+            key = LRUCache.make_key(value)
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    @staticmethod
+    def _copy_result(result):  # type: (Tuple[bool, bool, Any]) -> Tuple[bool, bool, Any]
+        """Copy a cached check result, so the cached value cannot be modified"""
+        valid, h_ok, nval = result
+        if isinstance(nval, (list, dict)):
+            nval = copy.deepcopy(nval)
+        return valid, h_ok, nval
+
+    def _check(self, value):  # type: (Any) -> Tuple[bool, bool, Any]
+        """
+        Run validator and hook on the cast input value.
+        If the value is memoized, results are taken from the cache if possible.
+
+        :param value: Cast value
+        :return: Tuple: is_valid (bool), hook_ok (bool), new_value
+        """
+        key = self._memo_key(value)
+        if key is None:
+            return self._run_checks(value)
+
+        result = self._memo.get(key)
+        if result is None:
+            result = self._run_checks(value)
+            self._memo.put(key, result)
+
+        return self._copy_result(result)
+
+    def _check_async(self, value, executor):
+        # type: (Any, Any) -> Callable[[], Tuple[bool, bool, Any]]
+        """
+        Start running validator and hook on the cast input value in an executor.
+        If the value is memoized, results are taken from the cache if possible.
+
+        :param value: Cast value
+        :param executor: Executor (for example a ``concurrent.futures.ThreadPoolExecutor``)
+        :return: Function returning the check result (waits for the executor if necessary)
+        """
+        if self._validator is None and self._hook is None:
+            return lambda: (True, True, value)
+
+        key = self._memo_key(value)
+        if key is not None:
+            result = self._memo.get(key)
+            if result is not None:
+                return lambda: self._copy_result(result)
+
+        get_result = self._submit_checks(value, executor)
+
+        def _result():
+            res = get_result()
+            if key is None:
+                return res
+
+            self._memo.put(key, res)
+            return self._copy_result(res)
+
+        return _result
+
+    def _submit_checks(self, value, executor):
+        # type: (Any, Any) -> Callable[[], Tuple[bool, bool, Any]]
+        """
+        Submit validator and hook to an executor.
+
+        If the executor fails to run the checks (e.g. a ``ProcessPoolExecutor``
+        cannot pickle a lambda validator), they are run in the calling thread.
+
+        :param value: Cast value
+        :param executor: Executor
+        :return: Function returning the check result (waits for the executor if necessary)
+        """
+        # noinspection PyBroadException
+        try:
+            future = executor.submit(_run_checks, self._validator, self._hook,
+                                     self._default, value)
+        except Exception:
+            return lambda: self._run_checks(value)
+
+        def _result():
+            # noinspection PyBroadException
+            try:
+                return future.result()
+            except Exception:
+                return self._run_checks(value)
+
+        return _result
+
+    def _run_checks(self, value):  # type: (Any) -> Tuple[bool, bool, Any]
+        """
+        Run validator and hook on the cast input value.
+
+        :param value: Cast value
+        :return: Tuple: is_valid (bool), hook_ok (bool), new_value
+        """
+        return _run_checks(self._validator, self._hook, self._default, value)
+
+    def _try_cast(self, value):  # type: (Any) -> Tuple[Optional[str], Any]
         """
         Try to cast the input value to the type of the default value
         (unless strict mode is enabled).
 
-        If the cast was not successful, log error and fall back to default value.
-
         :param value: Raw input value
-        :return: Cast value / default value
+        :return: Tuple: error message (None if successful), cast value / default value
         """
         if self._strict:
             if isinstance(value, type(self._default)):
-                return value
-            else:
-                self._setter_error('is not of type (%s)' % type(self._default), value)
-                return self._default
-        else:
-            try:
-                return type(self._default)(value)
-            except (TypeError, ValueError):
-                self._setter_error('could not be cast to (%s)'
-                                   % type(self._default).__name__, value)
-                return self._default
+                return None, value
+            return 'is not of type (%s)' % type(self._default), self._default
+
+        try:
+            return None, type(self._default)(value)
+        except (TypeError, ValueError):
+            return 'could not be cast to (%s)' % type(self._default).__name__, self._default
+
+    def _cast(self, value, report=None):  # type: (Any, Optional[ErrorReport]) -> Any
+        """
+        Try to cast the input value to the type of the default value
+        (unless strict mode is enabled).
+
+        If the cast was not successful, report error and fall back to default value.
+
+        :param value: Raw input value
+        :param report: Error report of the current load operation
+        :return: Cast value / default value
+        """
+        error, cast_val = self._try_cast(value)
+        if error is not None:
+            self._setter_error(error, value, report)
+        return cast_val
 
     def _validate(self, value):  # type: (Any) -> bool
         """
@@ -195,10 +807,15 @@ class ConfigValue(ConfigEntry):
         except Exception:
             return False, self._default
 
-    def _setter_error(self, msg, nval):  # type: (str, Any) -> None
-        """Print an error message if config value could not be set."""
-        logging.error('Cyra config value %s for field [%s] %s. Falling back to default value %s.'
-                      % (repr(nval), '.'.join(self._path), msg, repr(self._default)))
+    def _setter_error(self, msg, nval, report=None):
+        # type: (str, Any, Optional[ErrorReport]) -> None
+        """Report an error if config value could not be set."""
+        error = ConfigValueError(self._path, msg, nval, self._default)
+
+        if report is None:
+            logging.error('%s', error)
+        else:
+            report.add(error)
 
     def __str__(self):
         return str(self._val)
@@ -207,68 +824,288 @@ class ConfigValue(ConfigEntry):
         return repr(self._val)
 
 
-class ConfigBuilder(object):
-    """Use the ConfigBuilder to specify your configuration."""
+class ConfigMap(ConfigEntry):
+    """
+    Config section with keys that are not known in advance (for example one entry per host).
 
-    def __init__(self):
-        # Config dict: Key(tuple) -> ConfigEntry
-        self._config = OrderedDict()
+    All entries of the map share a sub-schema. Every Config instance holds its own
+    entries, which are created from the sub-schema.
 
-        # Temporary comment (will be added to next entry)
-        self._tmp_comment = ''
-        self._tmp_docstring = ''
+    As an attribute of a Config class, the map returns a :class:`ConfigMapSection`
+    view of the entries of the Config instance.
+    """
 
-        # Currently active path
-        self._active_path = tuple()
+    __slots__ = ('_path', '_schema', '_item')
 
-    @staticmethod
-    def _check_key(key):  # type: (str) -> None
+    def __init__(self, comment='', docstring='', path=tuple()):  # type: (str, str, Tuple) -> None
         """
-        Check if the key has a valid format. Keys must not be empty or contain dots
-
-        :param key: Key
-        :raise ValueError: if Key invalid
+        :param comment: Comment for the map section
+        :param docstring: Docstring for the map section
+        :param path: Path of the map section
         """
-        if not key:
-            raise ValueError('Key must not be empty.')
-        if '.' in key:
-            raise ValueError('Key must not contain dots.')
+        super(ConfigMap, self).__init__(comment, docstring)
+        self._path = path
 
-    def define(self, key, default, validator=None, hook=None, strict=False):
-        # type: (str, Any, Callable, Callable, bool) -> ConfigValue
-        """
-        Add a value to your config.
+        # Sub-schema: Path relative to a map entry -> Config entry
+        self._schema = OrderedDict()  # type: Dict[Tuple, ConfigEntry]
 
-        :param key: Key for the new value. Must not be empty or contain dots.
-        :param default: Default value. Determines the type.
-        :param validator: Validation function/lambda. Return true if valid value.
-        :param hook: Hook function. Return modified value. Raise exception if invalid value.
-        :param strict: Disable auto-casting and fall back to default value if type does not match.
-        :raise ValueError: if the key collides with an existing config value/section
-                           or the validator does not accept the default value
-        :return: ConfigValue
-        """
-        self._check_key(key)
-        npath = self._active_path + (key,)
+        # Section entry shared by all map entries
+        self._item = ConfigEntry()
 
-        if npath in self._config:
-            raise ValueError('Attempted to set existing entry at ' + str(npath))
+    def __get__(self, cfg, owner=None):
+        if cfg is None:
+            return self
+        return ConfigMapSection(cfg, self._path)
 
-        cfg_value = ConfigValue(self._tmp_comment, self._tmp_docstring, default, npath,
-                                validator, hook, strict)
-        self._config[npath] = cfg_value
-        self._tmp_comment = ''
-        self._tmp_docstring = ''
-        return cfg_value
+    def __set__(self, cfg, value):
+        raise AttributeError('Map sections cannot be assigned')
 
-    def comment(self, comment):  # type: (str) -> None
+    def _create(self, key):  # type: (str) -> OrderedDict
+        """
+        Create the config entries of a new map entry.
+
+        :param key: Key of the map entry
+        :return: Config dict of the map entry: Path -> Config entry (with default values)
+        """
+        root = self._path + (_intern(key),)
+        entries = OrderedDict([(root, self._item)])
+
+        for rel_path, entry in self._schema.items():
+            path = root + rel_path
+            if isinstance(entry, ConfigValue):
+                entry = entry._copy()
+                entry._path = path
+            entries[path] = entry
+        return entries
+
+
+class Constraint(object):
+    """Cross-field constraint between multiple config values"""
+
+    __slots__ = ('sources', 'check', 'message')
+
+    def __init__(self, sources, check, message=''):
+        # type: (Tuple[Tuple, ...], Callable[..., bool], str) -> None
+        """
+        :param sources: Paths of the config values the constraint depends on
+        :param check: Function called with the values of the sources. Returns true if valid.
+        :param message: Description of the constraint
+        """
+        self.sources = sources
+        self.check = check
+        self.message = message
+
+    def evaluate(self, values):  # type: (List[Any]) -> bool
+        """
+        Check if the constraint is fulfilled.
+        Raising an exception within the check function counts as a violation.
+
+        :param values: Values of the sources
+        :return: is_valid
+        """
+        # noinspection PyBroadException
+        try:
+            return bool(self.check(*values))
+        except Exception:
+            return False
+
+
+class ComputedValue(object):
+    """
+    Config value that is computed from other config values.
+
+    The value is evaluated on its first access and cached per Config instance
+    until one of its sources changes.
+    """
+
+    __slots__ = ('sources', 'func')
+
+    def __init__(self, sources, func):  # type: (Tuple[Tuple, ...], Callable[..., Any]) -> None
+        """
+        :param sources: Paths of the config values the value is computed from
+        :param func: Function called with the values of the sources
+        """
+        self.sources = sources
+        self.func = func
+
+    def __get__(self, cfg, owner=None):
+        if cfg is None:
+            return self
+        return cfg._get_computed(self)
+
+    def __set__(self, cfg, value):
+        raise AttributeError('Computed config values cannot be set')
+
+
+class ConfigBuilder(object):
+    """Use the ConfigBuilder to specify your configuration."""
+
+    def __init__(self):
+        # Config dict: Key(tuple) -> ConfigEntry
+        self._config = OrderedDict()
+
+        # Temporary comment (will be added to next entry)
+        self._tmp_comment = ''
+        self._tmp_docstring = ''
+
+        # Currently active path
+        self._active_path = tuple()
+
+        # Cached schema fingerprint
+        self._fingerprint = None  # type: Optional[str]
+
+        # Cached compiled schema (see compile())
+        self._compiled = None
+
+        # Generated frozen config types (see Config.freeze()): Config class -> FrozenSchema
+        self._frozen = {}  # type: Dict[type, Any]
+
+        # Constraint dependency graph: Path of config value -> Constraints depending on it
+        self._dependents = {}  # type: Dict[Tuple, List[Constraint]]
+
+        # Path of config value -> Computed values depending on it
+        self._computed = {}  # type: Dict[Tuple, List[ComputedValue]]
+
+        # Map sections: Path -> ConfigMap
+        self._maps = OrderedDict()  # type: Dict[Tuple, ConfigMap]
+
+        # Map section whose sub-schema is currently defined
+        self._active_map = None  # type: Optional[ConfigMap]
+
+    @staticmethod
+    def _check_key(key):  # type: (str) -> None
+        """
+        Check if the key has a valid format. Keys must not be empty or contain dots
+
+        :param key: Key
+        :raise ValueError: if Key invalid
+        """
+        if not key:
+            raise ValueError('Key must not be empty.')
+        if '.' in key:
+            raise ValueError('Key must not contain dots.')
+
+    def _new_entry_path(self, key):  # type: (str) -> Tuple[Dict[Tuple, ConfigEntry], Tuple, Tuple]
+        """
+        Get the location of a new entry in the active section.
+
+        :param key: Key for the new entry. Must not be empty or contain dots.
+        :return: Tuple: schema dict (config dict or sub-schema of the active map section),
+                 key of the entry in the schema dict, path of the entry
+        :raise ValueError: if Key invalid
+        """
+        self._check_key(key)
+        npath = self._active_path + (_intern(key),)
+
+        if self._active_map is None:
+            return self._config, npath, npath
+
+        # Entries of map sections are stored relative to the map entry
+        map_path = self._active_map._path
+        rel_path = npath[len(map_path):]
+        return self._active_map._schema, rel_path, map_path + ('*',) + rel_path
+
+    def define(self, key, default, validator=None, hook=None, strict=False, memoize=False):
+        # type: (str, Any, Callable, Callable, bool, Union[bool, int]) -> ConfigValue
+        """
+        Add a value to your config.
+
+        :param key: Key for the new value. Must not be empty or contain dots.
+        :param default: Default value. Determines the type.
+        :param validator: Validation function/lambda. Return true if valid value.
+        :param hook: Hook function. Return modified value. Raise exception if invalid value.
+        :param strict: Disable auto-casting and fall back to default value if type does not match.
+        :param memoize: Cache the results of validator and hook, keyed by the cast input value.
+                        The cache is shared between all instances of the config.
+                        Set to True or to the maximum number of cached results.
+                        Only use this with pure validators/hooks.
+        :raise ValueError: if the key collides with an existing config value/section
+                           or the validator does not accept the default value
+        :return: ConfigValue
+        """
+        schema, schema_path, npath = self._new_entry_path(key)
+
+        if schema_path in schema:
+            raise ValueError('Attempted to set existing entry at ' + str(npath))
+
+        cfg_value = ConfigValue(self._tmp_comment, self._tmp_docstring, default, npath,
+                                validator, hook, strict, memoize)
+        schema[schema_path] = cfg_value
+        self._schema_changed()
+        self._tmp_comment = ''
+        self._tmp_docstring = ''
+        return cfg_value
+
+    def _source_paths(self, sources):  # type: (List[Union[str, Tuple]]) -> Tuple[Tuple, ...]
+        """
+        Parse the source paths of a constraint or computed value.
+
+        :param sources: Paths (dot-separated or tuples)
+        :return: Path tuples
+        :raise ValueError: if a source is not a config value
+        """
+        paths = tuple(parse_path(source) for source in sources)
+
+        for path in paths:
+            if not isinstance(self._config.get(path), ConfigValue):
+                raise ValueError('Source %s is not a config value' % '.'.join(path))
+        return paths
+
+    def computed(self, sources, func):
+        # type: (List[Union[str, Tuple]], Callable[..., Any]) -> ComputedValue
+        """
+        Add a value that is computed from other config values (for example a database URL).
+
+        Computed values are evaluated on their first access and cached until one of their
+        sources changes. They are not stored in the config file.
+
+        :param sources: Paths of the config values the value is computed from
+                        (dot-separated or tuples). The values must already be defined.
+        :param func: Function called with the values of the sources. Returns the computed value.
+        :raise ValueError: if a source is not a config value
+        :return: Computed value
+        """
+        computed = ComputedValue(self._source_paths(sources), func)
+
+        for path in OrderedDict.fromkeys(computed.sources):
+            self._computed.setdefault(path, []).append(computed)
+        return computed
+
+    def constraint(self, sources, check, message=''):
+        # type: (List[Union[str, Tuple]], Callable[..., bool], str) -> Constraint
+        """
+        Add a constraint between multiple config values (for example ``min <= max``).
+
+        When config values are changed, all constraints depending on the changed values
+        are checked. If a constraint is violated, all changes are rolled back.
+
+        :param sources: Paths of the config values the constraint depends on
+                        (dot-separated or tuples). The values must already be defined.
+        :param check: Function called with the values of the sources. Return true if valid.
+        :param message: Description of the constraint (shown in error messages)
+        :raise ValueError: if a source is not a config value
+                           or the default values violate the constraint
+        :return: Constraint
+        """
+        paths = self._source_paths(sources)
+        constraint = Constraint(paths, check, message)
+
+        if not constraint.evaluate([self._config[path]._default for path in paths]):
+            raise ValueError('Default values of the fields [%s] violate constraint %s'
+                             % (', '.join('.'.join(path) for path in paths), repr(message)))
+
+        for path in OrderedDict.fromkeys(paths):
+            self._dependents.setdefault(path, []).append(constraint)
+        return constraint
+
+    def comment(self, comment):  # type: (str) -> None
         """
         Add a comment to your config. Comment will be applied to the
         value or section added next.
 
         :param comment: Comment string
         """
-        self._tmp_comment = comment
+        self._tmp_comment = _intern(comment)
 
     def docstring(self, docstring):  # type: (str) -> None
         """
@@ -289,74 +1126,1409 @@ class ConfigBuilder(object):
         :param key: Key for the new section. Must not be empty or contain dots.
         :raise ValueError: if the key collides with an existing config value
         """
-        self._check_key(key)
-        npath = self._active_path + (key,)
+        schema, schema_path, npath = self._new_entry_path(key)
+
+        if schema_path in schema:
+            raise ValueError('Attempted to push to existing entry at ' + str(npath))
+        else:
+            schema[schema_path] = ConfigEntry(self._tmp_comment, self._tmp_docstring)
+            self._schema_changed()
+
+        self._tmp_comment = ''
+        self._tmp_docstring = ''
+        self._active_path = self._active_path + (schema_path[-1],)
+
+    def push_map(self, key):  # type: (str) -> ConfigMap
+        """
+        Add a map section to your config. Its keys are not known in advance
+        (for example one entry per host).
+
+        The values and sections that are added until calling ``pop()``
+        define the sub-schema that is shared by all entries of the map.
+
+        :param key: Key for the new map section. Must not be empty or contain dots.
+        :raise ValueError: if the key collides with an existing config value
+                           or the active section is a map section
+        :return: ConfigMap
+        """
+        if self._active_map is not None:
+            raise ValueError('Map sections cannot be nested')
+
+        self._check_key(key)
+        npath = self._active_path + (_intern(key),)
+
+        if npath in self._config:
+            raise ValueError('Attempted to push to existing entry at ' + str(npath))
+
+        cfg_map = ConfigMap(self._tmp_comment, self._tmp_docstring, npath)
+        self._config[npath] = self._maps[npath] = cfg_map
+        self._schema_changed()
+
+        self._tmp_comment = ''
+        self._tmp_docstring = ''
+        self._active_path = npath
+        self._active_map = cfg_map
+        return cfg_map
+
+    def include(self, key, template):  # type: (str, ConfigBuilder) -> Dict[str, ConfigValue]
+        """
+        Add a section created from a template to your config.
+
+        A template is a ConfigBuilder that defines the values and subsections of a section
+        which is used several times (for example a database connection).
+        The config values of all included sections share the comments, docstrings,
+        default values, validators, hooks and memoization caches of the template
+        and only hold their own values. The template is copied at the time of the call,
+        later changes of the template are not applied.
+
+        :param key: Key for the new section. Must not be empty or contain dots.
+        :param template: Template
+        :raise ValueError: if the key collides with an existing config value/section
+                           or the template contains map sections, constraints or computed values
+        :return: Config values of the new section: Dot-separated path
+                 (relative to the section) -> ConfigValue
+        """
+        if template._maps or template._dependents or template._computed:
+            raise ValueError('Templates with map sections, constraints or computed values '
+                             'cannot be included')
+
+        schema, schema_path, npath = self._new_entry_path(key)
+        self.push(key)
+        self.pop()
+
+        values = OrderedDict()  # type: Dict[str, ConfigValue]
+
+        for rel_path, entry in template._config.items():
+            if isinstance(entry, ConfigValue):
+                entry = entry._copy()
+                entry._path = npath + rel_path
+                values['.'.join(rel_path)] = entry
+            schema[schema_path + rel_path] = entry
+
+        self._schema_changed()
+        return values
+
+    def pop(self, n=1):  # type: (int) -> None
+        """
+        Exit a config section created by ``push()``.
+
+        :param n: Number of sections to exit (default: 1)
+        :raise ValueError: if attempted to pop
+        """
+        if n > len(self._active_path):
+            raise ValueError('Attempted to pop %d sections when whe only had %d'
+                             % (n, len(self._active_path)))
+
+        self._active_path = self._active_path[:-n]
+
+        if self._active_map is not None and \
+                len(self._active_path) < len(self._active_map._path):
+            self._active_map = None
+
+    def _schema_changed(self):  # type: () -> None
+        """Invalidate all data cached for the current schema"""
+        self._fingerprint = None
+        self._compiled = None
+        self._frozen = {}
+
+    def fingerprint(self):  # type: () -> str
+        """
+        Return a stable hash of the config schema (paths, types, default values,
+        comments and docstrings). The hash is cached until the schema is modified.
+
+        :return: Schema fingerprint (hex string)
+        """
+        if self._fingerprint is None:
+            sha = hashlib.sha1()
+
+            for path, entry in self._config.items():
+                self._update_fingerprint(sha, path, entry)
+
+                if isinstance(entry, ConfigMap):
+                    for rel_path, map_entry in entry._schema.items():
+                        self._update_fingerprint(sha, path + ('*',) + rel_path, map_entry)
+
+            self._fingerprint = sha.hexdigest()
+        return self._fingerprint
+
+    @staticmethod
+    def _update_fingerprint(sha, path, entry):  # type: (Any, Tuple, ConfigEntry) -> None
+        if isinstance(entry, ConfigValue):
+            spec = (path, type(entry._default).__name__, repr(entry._default),
+                    entry._strict, entry._comment, entry._docstring)
+        else:
+            spec = (path, entry._comment, entry._docstring)
+        sha.update(repr(spec).encode('utf-8'))
+
+    def compile(self):  # type: () -> Any
+        """
+        Compile the config schema into generated loader and exporter functions
+        that are specialized for exactly the paths and types of the schema.
+
+        After calling this method, all Config instances with this schema use the
+        generated functions for loading and exporting. If the schema is modified
+        afterwards, the generic implementations are used until it is compiled again.
+        Compiling takes time proportional to the size of the schema.
+
+        :return: Compiled schema (:class:`cyra.codegen.CompiledSchema`)
+        :raise ValueError: if the schema could not be compiled
+                           (e.g. because it contains map sections)
+        """
+        if self._maps:
+            raise ValueError('Schemas with map sections cannot be compiled')
+
+        if self._compiled is None:
+            from cyra.codegen import compile_schema
+            self._compiled = compile_schema(self._config)
+        return self._compiled
+
+    def json_schema(self, title=None):  # type: (Optional[str]) -> Dict[str, Any]
+        """
+        Generate a `JSON Schema <https://json-schema.org>`_ document describing the config files
+        of this schema (types, default values, comments, sections).
+        The result is cached by the schema fingerprint.
+
+        :param title: Title of the JSON schema (for example the name of the config class)
+        :return: JSON schema
+        """
+        from cyra.schema import json_schema
+        return json_schema(self, title)
+
+    def build(self):  # type: () -> OrderedDict
+        """
+        Return a copy of the built config dict
+
+        :return: Built config
+        """
+        return OrderedDict((path, entry._copy()) for path, entry in self._config.items())
+
+
+class _TomlTable(object):
+    """Table node of the :class:`TomlEmitter`"""
+
+    def __init__(self, indent='', comment=''):  # type: (str, str) -> None
+        self.indent = indent
+        self.comment = comment
+        # Values of the table (rendered on output): Key, value, comment
+        self.values = []  # type: List[Tuple[str, Any, str]]
+        self.tables = OrderedDict()  # type: Dict[str, _TomlTable]
+
+    def add_table(self, key, comment=''):  # type: (str, str) -> _TomlTable
+        # Like tomlkit, separate a new table with an empty line if
+        # its parent already has content
+        table = _TomlTable('\n' if self.values or self.tables else '', comment)
+        self.tables[key] = table
+        return table
+
+
+# noinspection PyProtectedMember
+class TomlEmitter(object):
+    """
+    Renders a config dict directly to TOML text without building a tomlkit document.
+
+    The output is identical to writing the config dict into a new, empty TOMLDocument
+    using ``Config._config_to_toml``, which is much slower since every entry
+    is added to the document one by one.
+
+    Values are only rendered while iterating over the emitter, one line at a time,
+    so the TOML text does not have to be held in memory.
+    """
+
+    def __init__(self, config):  # type: (Dict[Tuple, ConfigEntry]) -> None
+        """
+        :param config: Config dict
+        :raise ValueError: if the config contains values that cannot be emitted directly
+                           (arrays of tables)
+        """
+        self._root = _TomlTable()
+
+        for path, entry in config.items():
+            parent = self._get_table(path[:-1])
+
+            if not isinstance(entry, ConfigValue):
+                parent.add_table(path[-1], self._comment(entry._comment))
+            elif isinstance(entry._val, dict):
+                table = parent.add_table(path[-1], self._comment(entry._comment))
+                self._add_dict(table, entry._val)
+            else:
+                self._add_value(parent, path[-1], entry._val, entry._comment)
+
+    def _get_table(self, path):  # type: (Tuple) -> _TomlTable
+        """Get the table at the given path, creating missing tables"""
+        table = self._root
+        for key in path:
+            if key not in table.tables:
+                table.add_table(key)
+            table = table.tables[key]
+        return table
+
+    @staticmethod
+    def _has_dict(value):  # type: (Any) -> bool
+        if isinstance(value, dict):
+            return True
+        if isinstance(value, list):
+            return any(TomlEmitter._has_dict(v) for v in value)
+        return False
+
+    @staticmethod
+    def _comment(comment):  # type: (str) -> str
+        if not comment:
+            return ''
+        if not comment.strip().startswith('#'):
+            comment = '# ' + comment
+        return ' ' + comment
+
+    @staticmethod
+    def _add_value(table, key, value, comment=''):  # type: (_TomlTable, str, Any, str) -> None
+        if TomlEmitter._has_dict(value):
+            raise ValueError('Arrays of tables cannot be emitted directly')
+        table.values.append((key, value, comment))
+
+    @staticmethod
+    def _value(key, value, comment=''):  # type: (str, Any, str) -> str
+        key = tomlkit.items.Key(key)
+        return key.as_string() + key.sep + tomlkit.item(value).as_string() \
+            + TomlEmitter._comment(comment) + '\n'
+
+    def _add_dict(self, table, value):  # type: (_TomlTable, Dict) -> None
+        # tomlkit places the sub-tables of a dict after its values
+        for k, v in sorted(value.items(), key=lambda i: isinstance(i[1], dict)):
+            if isinstance(v, dict):
+                self._add_dict(table.add_table(k), v)
+            else:
+                self._add_value(table, k, v)
+
+    def _iter_table(self, table, name):  # type: (_TomlTable, Optional[str]) -> Iterator[str]
+        if name is not None:
+            yield '%s[%s]%s\n' % (table.indent, name, table.comment)
+
+        for value in table.values:
+            yield self._value(*value)
+
+        for key, sub_table in table.tables.items():
+            sub_name = tomlkit.items.Key(key).as_string()
+            if name is not None:
+                sub_name = name + '.' + sub_name
+
+            for chunk in self._iter_table(sub_table, sub_name):
+                yield chunk
+
+    def __iter__(self):  # type: () -> Iterator[str]
+        """Iterate over the TOML text, yielding one chunk per table header and value"""
+        return self._iter_table(self._root, None)
+
+    def dumps(self):  # type: () -> str
+        """
+        Render the config.
+
+        :return: TOML string
+        """
+        return ''.join(self)
+
+
+class ConfigFileChangedError(RuntimeError):
+    """
+    The config file was modified by another process after the config was loaded
+    with ``release_toml=True``, so its styling cannot be preserved on export.
+    """
+
+
+class ConfigChange(namedtuple('ConfigChange', ['path', 'old', 'new'])):
+    """
+    Change of a single config value.
+
+    :ivar path: Cfg field path
+    :ivar old: Old value
+    :ivar new: New value
+    """
+    __slots__ = ()
+
+
+class ConfigDiff(list):
+    """List of :class:`ConfigChange` entries between two config states"""
+
+    def dumps(self):  # type: () -> str
+        """
+        Serialize the diff in a compact JSON format (list of ``[path, old, new]`` arrays
+        with dot-separated paths). Dates and times are written as ISO 8601 strings.
+
+        :return: JSON string
+        """
+        return json.dumps([['.'.join(c.path), c.old, c.new] for c in self],
+                          separators=(',', ':'), default=_json_default)
+
+    @classmethod
+    def loads(cls, diff_str):  # type: (str) -> ConfigDiff
+        """
+        Deserialize a diff created by ``dumps()``.
+
+        :param diff_str: JSON string
+        :return: Config diff
+        """
+        return cls(ConfigChange(tuple(path.split('.')), old, new)
+                   for path, old, new in json.loads(diff_str))
+
+
+# noinspection PyProtectedMember
+class ConfigAccessor(object):
+    """
+    Accessor bound to a single value of a Config instance.
+
+    The path is only resolved once when the accessor is created, so reading the value
+    is as fast as a regular attribute access.
+    """
+
+    __slots__ = ('_cfg', '_entry')
+
+    def __init__(self, cfg, entry):  # type: (Config, ConfigValue) -> None
+        """
+        :param cfg: Config instance
+        :param entry: Config value of the instance
+        """
+        self._cfg = cfg
+        self._entry = entry
+
+    @property
+    def path(self):  # type: () -> Tuple
+        """Cfg field path"""
+        return self._entry._path
+
+    def get(self):  # type: () -> Any
+        """
+        :return: Config value
+        """
+        if _n_overrides:
+            return self._cfg._read(self._entry)
+        return self._entry._val
+
+    def set(self, value):  # type: (Any) -> None
+        """
+        Set the config value (with casting and validation).
+
+        :param value: New value
+        :raise ConstraintError: if the new value violates a constraint (the value is not changed)
+        """
+        self._cfg._set_value(self._entry, value)
+
+    __call__ = get
+
+    def __repr__(self):
+        return '<ConfigAccessor %s = %r>' % ('.'.join(self._entry._path), self._entry._val)
+
+
+class ConfigSection(object):
+    """
+    View of a section of a Config instance.
+
+    The view maps the keys of the section to the values of the section and to views
+    of its subsections. It is backed by an index of the section, so iterating over
+    a section only touches its own entries.
+    """
+
+    __slots__ = ('_cfg', '_path', '_children')
+
+    def __init__(self, cfg, path):  # type: (Config, Tuple) -> None
+        """
+        :param cfg: Config instance
+        :param path: Section path (empty for the top level of the config)
+        :raise KeyError: if there is no section at the given path
+        """
+        self._cfg = cfg
+        self._path = path
+        self._children = cfg._get_children(path)
+
+    @property
+    def path(self):  # type: () -> Tuple
+        """Section path"""
+        return self._path
+
+    def _value(self, key, entry):  # type: (str, ConfigEntry) -> Any
+        if isinstance(entry, ConfigValue):
+            if _n_overrides:
+                return self._cfg._read(entry)
+            return entry._val
+        return ConfigSection(self._cfg, self._path + (key,))
+
+    def __getitem__(self, key):  # type: (str) -> Any
+        return self._value(key, self._children[key])
+
+    def __setitem__(self, key, value):  # type: (str, Any) -> None
+        """
+        Set a config value of the section (with casting and validation).
+
+        :raise KeyError: if the section has no config value with the given key
+        :raise ConstraintError: if the new value violates a constraint (the value is not changed)
+        """
+        entry = self._children[key]
+        if not isinstance(entry, ConfigValue):
+            raise KeyError(key)
+        self._cfg._set_value(entry, value)
+
+    def __contains__(self, key):  # type: (str) -> bool
+        return key in self._children
+
+    def __iter__(self):  # type: () -> Iterator[str]
+        return iter(self._children)
+
+    def __len__(self):
+        return len(self._children)
+
+    def get(self, key, default=None):  # type: (str, Any) -> Any
+        """
+        :param key: Key of a value or subsection
+        :param default: Value to be returned if the section has no entry with the given key
+        :return: Config value or section view
+        """
+        entry = self._children.get(key)
+        if entry is None:
+            return default
+        return self._value(key, entry)
+
+    def keys(self):  # type: () -> List[str]
+        return list(self._children)
+
+    def values(self):  # type: () -> List[Any]
+        return [self._value(key, entry) for key, entry in self._children.items()]
+
+    def items(self):  # type: () -> List[Tuple[str, Any]]
+        return [(key, self._value(key, entry)) for key, entry in self._children.items()]
+
+    def section(self, key):  # type: (str) -> ConfigSection
+        """
+        :param key: Key of a subsection
+        :return: View of the subsection
+        :raise KeyError: if the section has no subsection with the given key
+        """
+        if isinstance(self._children[key], ConfigValue):
+            raise KeyError(key)
+        return ConfigSection(self._cfg, self._path + (key,))
+
+    def as_dict(self):  # type: () -> Dict
+        """
+        Output the values of the section as a nested dictionary
+        (with plain Python dicts and lists).
+
+        :return: Nested dictionary
+        """
+        result = {}
+        for key, entry in self._children.items():
+            if isinstance(entry, ConfigValue):
+                result[key] = Config._plain(self._value(key, entry))
+            else:
+                result[key] = self.section(key).as_dict()
+        return result
+
+    def as_flat_dict(self):  # type: () -> Dict[str, Any]
+        """
+        Output the values of the section as a flat dictionary.
+        Keys are dot-separated paths relative to the section.
+
+        :return: Flat dictionary
+        """
+        result = {}
+        for key, entry in self._children.items():
+            if isinstance(entry, ConfigValue):
+                result[key] = Config._plain(self._value(key, entry))
+            else:
+                for sub_key, value in self.section(key).as_flat_dict().items():
+                    result[key + '.' + sub_key] = value
+        return result
+
+    def __repr__(self):
+        return '<ConfigSection %s (%d entries)>' % ('.'.join(self._path), len(self._children))
+
+
+class ConfigMapSection(ConfigSection):
+    """
+    View of a map section of a Config instance.
+
+    Additionally to the methods of :class:`ConfigSection`, entries can be added and removed.
+    Assigning a dictionary to a key sets the values of the entry (creating it if necessary).
+    """
+
+    __slots__ = ()
+
+    def add(self, key, values=None):  # type: (str, Optional[Dict]) -> ConfigSection
+        """
+        Add an entry to the map.
+
+        :param key: Key of the new entry. Must not be empty or contain dots.
+        :param values: Values of the entry (nested dictionary). Missing values are set
+                       to their default values.
+        :return: View of the new entry
+        :raise ValueError: if the key is invalid or the map already has an entry with the key
+        """
+        if key in self._children:
+            raise ValueError('Map %s already has an entry %s' % ('.'.join(self._path), key))
+
+        self._cfg._add_map_entry(self._path, key, values or {})
+        return self.section(key)
+
+    def __setitem__(self, key, values):  # type: (str, Dict) -> None
+        if key in self._children:
+            self._cfg._set_map_values(self._path + (key,), values)
+        else:
+            self.add(key, values)
+
+    def remove(self, key):  # type: (str) -> None
+        """
+        Remove an entry from the map.
+
+        :param key: Key of the entry
+        :raise KeyError: if the map has no entry with the given key
+        """
+        self._cfg._remove_map_entry(self._path, key)
+
+    __delitem__ = remove
+
+
+class ConfigStorage(object):
+    """
+    Storage backend of a config, used by :meth:`Config.load_file` and :meth:`Config.save_file`.
+
+    A storage object is used by a single config. The default backend is the
+    :class:`TomlFileStorage`; more backends can be found in :mod:`cyra.storage`.
+    """
+
+    def load(self, cfg, update=True, fail_fast=False, release_toml=False, executor=None):
+        # type: (Config, bool, bool, bool, Any) -> ErrorReport
+        """
+        Load the values of a config from the storage.
+
+        :param cfg: Config instance
+        :param update: Add config values missing in the storage with their default values
+        :param fail_fast: Strict mode: raise a :class:`ConfigValueError` on the first
+                          invalid value instead of falling back to the default value
+        :param release_toml: Do not keep the parsed TOML document in memory after loading
+                             (only used by TOML-based backends)
+        :param executor: Run validators and hooks concurrently in this executor
+        :return: Error report
+        """
+        raise NotImplementedError
+
+    def save(self, cfg, force=False):  # type: (Config, bool) -> bool
+        """
+        If modified, save the values of a config to the storage.
+
+        :param cfg: Config instance
+        :param force: Force save, even if not modified.
+        :return: True if saved successfully.
+        """
+        raise NotImplementedError
+
+
+# noinspection PyProtectedMember
+class TomlFileStorage(ConfigStorage):
+    """
+    Default storage backend: the TOML file of the config (``Config(file)``).
+
+    The whole file is read on load and written on save. Styling and comments
+    of the file are preserved.
+    """
+
+    def load(self, cfg, update=True, fail_fast=False, release_toml=False, executor=None):
+        # type: (Config, bool, bool, bool, Any) -> ErrorReport
+        report = ErrorReport(fail_fast)
+        toml_str = None
+
+        if os.path.isfile(cfg._file):
+            logging.info('Cyra is reading your config from %s' % cfg._file)
+
+            with open(cfg._file, 'r') as f:
+                toml_str = f.read()
+                report = cfg.load_toml(toml_str, fail_fast, executor)
+
+            # The file was rejected, so it must not be overwritten
+            if report.rolled_back:
+                return report
+        else:
+            cfg._modified = True
+
+            if cfg._toml is None:
+                cfg._toml = tomlkit.document()
+
+        # Write file if non existent or modified
+        digest = None
+        if update:
+            digest = self._write(cfg, digest=release_toml)
+
+        if release_toml:
+            if digest is None and toml_str is not None:
+                digest = cfg._digest(toml_str)
+
+            if digest is not None:
+                cfg._toml = None
+                cfg._toml_digest = digest
+
+        return report
+
+    def save(self, cfg, force=False):  # type: (Config, bool) -> bool
+        return self._write(cfg, force) is not None
+
+    @staticmethod
+    def _write(cfg, force=False, digest=False):  # type: (Config, bool, bool) -> Optional[str]
+        """
+        If modified, save the configuration to disk.
+        The TOML text is written chunk by chunk.
+
+        :param cfg: Config instance
+        :param force: Force save, even if not modified.
+        :param digest: Compute the digest of the written file
+        :return: Digest of the written file (None if the config was not saved
+                 or the digest was not computed)
+        """
+        if not (cfg._modified or force):
+            return None
+
+        logging.info('Cyra is writing your config to %s' % cfg._file)
+        chunks = cfg.iter_toml()
+        sha = hashlib.sha1() if digest or cfg._toml is None else None
+
+        # Write to a temporary file first, so the config file is never left truncated
+        tmp_file = '%s.%d-%d.tmp' % (cfg._file, os.getpid(), threading.current_thread().ident)
+        f = open(tmp_file, 'w')
+        try:
+            with f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    if sha is not None:
+                        sha.update(chunk.encode('utf-8'))
+            if os.path.isfile(cfg._file):
+                shutil.copymode(cfg._file, tmp_file)
+            _replace_file(tmp_file, cfg._file)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+
+        result = None
+        if sha is not None:
+            result = sha.hexdigest()
+            if cfg._toml is None:
+                cfg._toml_digest = result
+                cfg._toml_removed = []
+
+        cfg._modified = False
+        return result
+
+
+# noinspection PyProtectedMember
+class Config(object):
+    """Cyra configuration class"""
+
+    builder = ConfigBuilder()
+
+    #: Number of (path, value) pairs that are consumed at once by :meth:`ingest`
+    ingest_chunk_size = 1000
+
+    def __init__(self, file='config.toml', cfg_builder=None, storage=None):
+        # type: (str, ConfigBuilder, Optional[ConfigStorage]) -> None
+        """
+        :param file: Path of the config file
+        :param cfg_builder: Config builder (default: the ``builder`` of the Config class)
+        :param storage: Storage backend used by ``load_file()`` and ``save_file()``
+                        (default: the TOML file)
+        """
+        if cfg_builder is None:
+            cfg_builder = self.builder
+
+        # Copy builder config into the new Config object, with NEW value references
+        self._builder = cfg_builder
+        self._config = cfg_builder.build()
+
+        # Held while the config is modified or exported (shared with the autosaver)
+        self._lock = threading.RLock()
+
+        self._modified = False
+        self._file = file
+        self._storage = storage if storage is not None else TomlFileStorage()
+        self._toml = tomlkit.document()  # type: Optional[TOMLDocument]
+
+        # SHA1 digest of the config file if its TOML document was released after loading
+        self._toml_digest = None  # type: Optional[str]
+        # Paths of the map entries that were removed while the TOML document was released
+        # (deleted from the re-parsed document on export)
+        self._toml_removed = []  # type: List[Tuple]
+
+        # Dot-separated path -> ConfigValue (filled on lookup)
+        self._lookup = {}  # type: Dict[str, ConfigValue]
+
+        # Config entries in schema order (created when using the compiled schema)
+        self._entries = None  # type: Optional[Tuple[ConfigEntry, ...]]
+
+        # Background writer (see enable_autosave())
+        self._autosave = None
+
+        # Cached computed values: ComputedValue -> (Source values, Computed value)
+        self._computed = {}  # type: Dict[ComputedValue, Tuple[List[Any], Any]]
+
+        # Map section path -> Entry key -> Paths of the entry (see ConfigBuilder.push_map())
+        self._map_entries = OrderedDict((path, OrderedDict()) for path in cfg_builder._maps)
+        # type: Dict[Tuple, Dict[str, Tuple[Tuple, ...]]]
+
+        # Section path -> Key -> Entry of the section (created on the first section lookup)
+        self._sections = None  # type: Optional[Dict[Tuple, OrderedDict]]
+
+        # Content fingerprints (created by fingerprint())
+        # Value path -> (Hashed value, Value hash)
+        self._fp_values = None  # type: Optional[Dict[Tuple, Tuple[Any, int]]]
+        # Section path -> XOR of the hashes of all values in the section, () for the config
+        self._fp_sections = None  # type: Optional[Dict[Tuple, int]]
+
+    def __getattribute__(self, item):
+        obj = object.__getattribute__(self, item)
+        if isinstance(obj, ConfigValue):
+            if _n_overrides:
+                return self._read(self._config[obj._path])
+            return self._config[obj._path]._val
+        return obj
+
+    def __setattr__(self, key, value):
+        try:
+            obj = object.__getattribute__(self, key)
+        except AttributeError:
+            obj = None
+
+        if isinstance(obj, ConfigValue):
+            self._set_value(self._config[obj._path], value)
+        else:
+            object.__setattr__(self, key, value)
+
+    @_synchronized
+    def _set_value(self, entry, value):  # type: (ConfigValue, Any) -> None
+        """
+        Set a config value of this instance.
+
+        :param entry: Config value
+        :param value: New value
+        :raise ConstraintError: if the new value violates a constraint (the value is not changed)
+        """
+        constraints = self._builder._dependents.get(entry._path)
+
+        if constraints is None:
+            entry._val = value
+        else:
+            old_value = entry._val
+            entry._val = value
+
+            error = self._check_constraints((entry,))
+            if error is not None:
+                entry._restore(old_value)
+                raise error
+
+        self._value_changed(entry)
+
+    def _check_constraints(self, entries):
+        # type: (Iterable[ConfigValue]) -> Optional[ConstraintError]
+        """
+        Evaluate the constraints depending on the given (changed) config values.
+
+        :param entries: Changed config values
+        :return: Error of the first violated constraint, None if all constraints are fulfilled
+        """
+        dependents = self._builder._dependents
+        checked = set()
+
+        for entry in entries:
+            for constraint in dependents.get(entry._path, ()):
+                if constraint in checked:
+                    continue
+                checked.add(constraint)
+
+                values = [self._config[path]._val for path in constraint.sources]
+                if not constraint.evaluate(values):
+                    return ConstraintError(constraint, values)
+        return None
+
+    def _snapshot(self, entries=None, fail_fast=False):
+        # type: (Optional[Iterable[ConfigValue]], bool) -> Optional[List[Tuple[ConfigValue, Any]]]
+        """
+        Record the values of this config before applying a set of changes.
+        Only needed if the schema has constraints or the changes may be aborted
+        by an invalid value (fail-fast mode).
+
+        :param entries: Config values to be recorded (default: all values)
+        :param fail_fast: The changes are applied in fail-fast mode
+        :return: List of tuples: config value, current value. None if not needed.
+        """
+        if not (fail_fast or self._builder._dependents):
+            return None
+
+        if entries is None:
+            entries = (entry for entry in self._config.values() if isinstance(entry, ConfigValue))
+        return [(entry, entry._val) for entry in entries]
+
+    def _commit_changes(self, snapshot):
+        # type: (Optional[List[Tuple[ConfigValue, Any]]]) -> Optional[ConstraintError]
+        """
+        Check the constraints depending on the values that were changed since the snapshot
+        was taken. If a constraint is violated, all changes are rolled back.
+
+        :param snapshot: Snapshot taken before applying the changes
+        :return: Error of the violated constraint, None if the changes were committed
+        """
+        if snapshot is None:
+            return None
+
+        error = self._check_constraints(entry for entry, old in snapshot if entry._val != old)
+
+        if error is not None:
+            self._rollback(snapshot)
+        return error
+
+    @staticmethod
+    def _rollback(snapshot):  # type: (Optional[List[Tuple[ConfigValue, Any]]]) -> None
+        """
+        Restore the values recorded by a snapshot.
+
+        :param snapshot: Snapshot taken before applying the changes
+        """
+        for entry, old in snapshot or ():
+            entry._restore(old)
+
+    def _snapshot_maps(self):  # type: () -> Optional[Dict[Tuple, Set[str]]]
+        """
+        Record the keys of the map sections before applying a set of changes.
+
+        :return: Map section path -> Entry keys. None if the config has no map sections.
+        """
+        if not self._map_entries:
+            return None
+        return {path: set(entries) for path, entries in self._map_entries.items()}
+
+    def _rollback_maps(self, map_keys):  # type: (Optional[Dict[Tuple, Set[str]]]) -> None
+        """
+        Remove the map entries that were added since the keys were recorded.
+
+        :param map_keys: Map keys recorded by :meth:`_snapshot_maps`
+        """
+        for map_path, keys in (map_keys or {}).items():
+            for key in [key for key in self._map_entries[map_path] if key not in keys]:
+                self._remove_map_entry(map_path, key, False)
+
+    def _value_changed(self, entry):  # type: (ConfigValue) -> None
+        """
+        Mark the config as modified after one of its values was changed.
+
+        :param entry: Modified config value
+        """
+        self._modified = True
+
+        for computed in self._builder._computed.get(entry._path, ()):
+            self._computed.pop(computed, None)
+
+        if self._fp_values is not None:
+            self._update_fingerprint((entry,), True)
+
+        if self._autosave is not None:
+            self._autosave.notify(entry)
+
+    def _get_computed(self, computed):  # type: (ComputedValue) -> Any
+        """
+        Get a computed value, evaluating it if it is not cached.
+
+        :param computed: Computed value
+        :return: Value
+        """
+        if _n_overrides:
+            overlay = self._get_overlay()
+            if overlay is not None and any(path in overlay for path in computed.sources):
+                # Overridden values are not cached
+                return computed.func(*[overlay.get(path, self._config[path]._val)
+                                       for path in computed.sources])
+
+        cached = self._computed.get(computed)
+        if cached is not None:
+            return cached[1]
+
+        values = [self._config[path]._val for path in computed.sources]
+        result = computed.func(*values)
+        self._computed[computed] = (values, result)
+        return result
+
+    def _invalidate_computed(self):  # type: () -> None
+        """Drop the cached computed values whose sources were changed (e.g. by a load)"""
+        for computed, (values, _) in list(self._computed.items()):
+            if any(self._config[path]._val != value
+                   for path, value in zip(computed.sources, values)):
+                del self._computed[computed]
+
+    def _values_loaded(self, entries=None):  # type: (Optional[Iterable[ConfigValue]]) -> None
+        """
+        Update the cached data derived from the config values after a load
+
+        :param entries: Config values that may have been changed (default: all values)
+        """
+        self._invalidate_computed()
+
+        if self._fp_values is not None:
+            if entries is None:
+                entries = (entry for entry in self._config.values()
+                           if isinstance(entry, ConfigValue))
+            self._update_fingerprint(entries)
+
+    def _update_fingerprint(self, entries, force=False):
+        # type: (Iterable[ConfigValue], bool) -> None
+        """
+        Update the fingerprints after config values were changed.
+
+        Only values that were replaced are hashed again. The difference of the
+        value hash is applied to the config and all sections containing the value.
+
+        :param entries: Config values that may have been changed
+        :param force: Hash the values again even if they were not replaced
+        """
+        fp_values = self._fp_values
+        fp_sections = self._fp_sections
+
+        for entry in entries:
+            path = entry._path
+            value = entry._val
+            old_value, old_hash = fp_values[path]
+
+            if value is old_value and not force:
+                continue
+
+            new_hash = _value_hash(path, value)
+            fp_values[path] = (value, new_hash)
+
+            delta = old_hash ^ new_hash
+            if delta:
+                for i in range(len(path)):
+                    fp_sections[path[:i]] ^= delta
+
+    def _index_fingerprints(self, entries):  # type: (Dict[Tuple, ConfigEntry]) -> None
+        """
+        Add config entries to the fingerprints.
+
+        :param entries: Config dict of the new entries
+        """
+        values = []
+
+        for path, entry in entries.items():
+            if isinstance(entry, ConfigValue):
+                self._fp_values[path] = (_MISSING, 0)
+                values.append(entry)
+            else:
+                self._fp_sections[path] = 0
+
+        self._update_fingerprint(values)
+
+    def _unindex_fingerprints(self, entries):  # type: (Dict[Tuple, ConfigEntry]) -> None
+        """
+        Remove config entries from the fingerprints.
+
+        :param entries: Config dict of the removed entries
+        """
+        for path, entry in entries.items():
+            if isinstance(entry, ConfigValue):
+                delta = self._fp_values.pop(path)[1]
+                for i in range(len(path)):
+                    self._fp_sections[path[:i]] ^= delta
+
+        for path, entry in entries.items():
+            if not isinstance(entry, ConfigValue):
+                del self._fp_sections[path]
+
+    def fingerprint(self, section=None):  # type: (Optional[Union[str, Tuple]]) -> str
+        """
+        Return a stable hash of the current config values (the same values result in
+        the same fingerprint, even in another process).
+
+        The fingerprints of the config and all of its sections are computed on the first call
+        and updated incrementally whenever values are changed, so reading them is cheap.
+        Changes of mutable values (lists, dicts) made in place are not tracked.
+
+        :param section: Dot-separated path (for example ``'DATABASE'``) or path tuple
+                        of a section. Default: the whole config.
+        :return: Fingerprint (hex string)
+        :raise KeyError: if there is no section at the given path
+        """
+        if self._fp_sections is None:
+            self._fp_values = {}
+            self._fp_sections = {(): 0}
+            self._index_fingerprints(self._config)
+
+        path = () if section is None else parse_path(section)
+        try:
+            return '%016x' % self._fp_sections[path]
+        except KeyError:
+            raise KeyError(section)
+
+    def _get_entry(self, path, create=False):  # type: (Union[str, Tuple], bool) -> ConfigValue
+        """
+        Look up a config value by its path.
+
+        :param path: Dot-separated path or path tuple
+        :param create: Add the entry of a map section if the path belongs to a missing entry
+        :return: Config value
+        :raise KeyError: if there is no config value at the given path
+        """
+        try:
+            return self._lookup[path]
+        except KeyError:
+            entry = self._config.get(parse_path(path))
+
+            if entry is None and create and self._map_entries:
+                entry = self._get_map_value(parse_path(path))
+            elif not isinstance(entry, ConfigValue):
+                raise KeyError(path)
+
+            self._lookup[path] = entry
+            return entry
+
+    def get(self, path, default=_MISSING):  # type: (Union[str, Tuple], Any) -> Any
+        """
+        Get a config value by its path.
+
+        :param path: Dot-separated path (for example ``'DATABASE.port'``) or path tuple
+        :param default: Value to be returned if there is no config value at the given path
+        :return: Config value
+        :raise KeyError: if there is no config value at the given path and no default is given
+        """
+        try:
+            # Fast path: path was looked up before
+            entry = object.__getattribute__(self, '_lookup')[path]
+        except KeyError:
+            try:
+                entry = self._get_entry(path)
+            except KeyError:
+                if default is _MISSING:
+                    raise
+                return default
+
+        if _n_overrides:
+            return self._read(entry)
+        return entry._val
+
+    def _get_children(self, path):  # type: (Tuple) -> OrderedDict
+        """
+        Get the entries of a section from the section index.
+
+        :param path: Section path
+        :return: Key -> Config entry
+        :raise KeyError: if there is no section at the given path
+        """
+        if self._sections is None:
+            self._sections = {tuple(): OrderedDict()}
+            self._index_sections(self._config)
+        return self._sections[path]
+
+    def _index_sections(self, entries):  # type: (Dict[Tuple, ConfigEntry]) -> None
+        """
+        Add config entries to the section index.
+
+        :param entries: Config dict of the new entries
+        """
+        for path, entry in entries.items():
+            self._sections[path[:-1]][path[-1]] = entry
+            if not isinstance(entry, ConfigValue):
+                self._sections[path] = OrderedDict()
+
+    @_synchronized
+    def _add_map_entry(self, map_path, key, values=None):
+        # type: (Tuple, str, Optional[Dict]) -> OrderedDict
+        """
+        Add an entry to a map section.
+
+        :param map_path: Path of the map section
+        :param key: Key of the new entry
+        :param values: Values of the entry (nested dictionary). If given, the new entry
+                       is treated as a change of the config (e.g. it is saved by the autosaver).
+                       Otherwise the entry is created with its default values
+                       (used by load methods, which are expected to set the values).
+        :return: Config dict of the new entry
+        :raise ValueError: if the key is invalid
+        """
+        ConfigBuilder._check_key(key)
+        entries = self._builder._maps[map_path]._create(key)
+
+        self._config.update(entries)
+        self._map_entries[map_path][key] = tuple(entries)
+        self._entries = None
+
+        if self._sections is not None:
+            self._index_sections(entries)
+        if self._fp_sections is not None:
+            self._index_fingerprints(entries)
+
+        if values is not None:
+            for entry in entries.values():
+                if isinstance(entry, ConfigValue):
+                    self._value_changed(entry)
+            self._set_map_values(map_path + (key,), values)
+        return entries
+
+    @_synchronized
+    def _set_map_values(self, root, values):  # type: (Tuple, Dict) -> None
+        """
+        Set the values of a map entry (with casting and validation).
+
+        :param root: Path of the map entry
+        :param values: Nested dictionary
+        """
+        for path in self._map_entries[root[:-1]][root[-1]]:
+            entry = self._config[path]
+            if not isinstance(entry, ConfigValue):
+                continue
+
+            new_value = DictUtil.get_element(values, path[len(root):])
+            if new_value is not None:
+                self._set_value(entry, new_value)
+
+    @_synchronized
+    def _remove_map_entry(self, map_path, key, changed=True):  # type: (Tuple, str, bool) -> None
+        """
+        Remove an entry from a map section.
+
+        :param map_path: Path of the map section
+        :param key: Key of the entry
+        :param changed: Treat the removal as a change of the config. Otherwise the entry is
+                        only removed from the config (used for rolling back a load).
+        :raise KeyError: if the map has no entry with the given key
+        """
+        paths = self._map_entries[map_path].pop(key)
+        entries = OrderedDict((path, self._config.pop(path)) for path in paths)
+
+        for path, entry in entries.items():
+            if isinstance(entry, ConfigValue):
+                self._lookup.pop(path, None)
+                self._lookup.pop('.'.join(path), None)
+
+        if self._sections is not None:
+            del self._sections[map_path][key]
+            for path in paths:
+                self._sections.pop(path, None)
+        if self._fp_sections is not None:
+            self._unindex_fingerprints(entries)
+        self._entries = None
+
+        if not changed:
+            return
+
+        # Remove the entry from the TOML document, since missing entries are not deleted on export
+        if self._toml is not None:
+            self._remove_toml_entry(self._toml, map_path + (key,))
+        else:
+            self._toml_removed.append(map_path + (key,))
+
+        self._modified = True
+        if self._autosave is not None:
+            self._autosave.notify(None)
+
+    @staticmethod
+    def _remove_toml_entry(document, path):  # type: (TOMLDocument, Tuple) -> None
+        """
+        Delete the table of a map entry from a TOML document if it is present.
+
+        :param document: TOML document
+        :param path: Path of the map entry
+        """
+        table = DictUtil.get_element(document, path[:-1])
+        if table is not None and path[-1] in table:
+            del table[path[-1]]
+
+    def _sync_maps(self, cfg_dict):  # type: (Dict) -> List[Tuple[Tuple, str]]
+        """
+        Add the map entries of the dictionary to be imported and find the entries
+        that are missing in it. Maps that are missing in the dictionary are not changed.
+
+        The missing entries are not removed yet, so the import can be rolled back.
+
+        :param cfg_dict: Nested dictionary
+        :return: List of tuples: map section path, key of the entry to be removed
+        """
+        removed = []
+
+        for map_path, map_entries in self._map_entries.items():
+            map_dict = DictUtil.get_element(cfg_dict, map_path)
+            if not isinstance(map_dict, dict):
+                continue
+
+            removed.extend((map_path, key) for key in map_entries if key not in map_dict)
+
+            for key, value in map_dict.items():
+                if key not in map_entries and isinstance(value, dict):
+                    try:
+                        self._add_map_entry(map_path, key)
+                    except ValueError:
+                        pass
+
+        return removed
+
+    def _get_map_value(self, path):  # type: (Tuple) -> ConfigValue
+        """
+        Look up the value of a map entry, adding the entry if it does not exist.
+
+        :param path: Path tuple
+        :return: Config value
+        :raise KeyError: if the path does not belong to a value of a map entry
+        """
+        for map_path, map_entries in self._map_entries.items():
+            n = len(map_path)
+
+            if path[:n] == map_path and len(path) > n + 1 and path[n] not in map_entries:
+                if not isinstance(self._builder._maps[map_path]._schema.get(path[n + 1:]),
+                                  ConfigValue):
+                    break
+                try:
+                    self._add_map_entry(map_path, path[n])
+                except ValueError:
+                    break
+                return self._config[path]
+
+        raise KeyError(path)
+
+    def section(self, path=None):  # type: (Optional[Union[str, Tuple]]) -> ConfigSection
+        """
+        Create a view of a section.
+
+        :param path: Dot-separated path (for example ``'DATABASE'``) or path tuple
+                     of the section. Default: the top level of the config.
+        :return: Section view
+        :raise KeyError: if there is no section at the given path
+        """
+        try:
+            return ConfigSection(self, tuple() if path is None else parse_path(path))
+        except KeyError:
+            raise KeyError(path)
+
+    def as_dict(self):  # type: () -> Dict
+        """
+        Output the config values as a nested dictionary
+        (with plain Python dicts and lists), including the overrides of the current context.
 
-        if npath in self._config:
-            raise ValueError('Attempted to push to existing entry at ' + str(npath))
-        else:
-            self._config[npath] = ConfigEntry(self._tmp_comment, self._tmp_docstring)
+        :return: Nested dictionary
+        """
+        return self._to_dict(True, self._get_overlay())
 
-        self._tmp_comment = ''
-        self._tmp_docstring = ''
-        self._active_path = npath
+    @_synchronized
+    def as_flat_dict(self):  # type: () -> Dict[str, Any]
+        """
+        Output the config values as a flat dictionary
+        (the format accepted by :meth:`load_flat_dict`),
+        including the overrides of the current context.
 
-    def pop(self, n=1):  # type: (int) -> None
+        :return: Flat dictionary. Keys are dot-separated paths.
         """
-        Exit a config section created by ``push()``.
+        overlay = self._get_overlay() or {}
+        return {'.'.join(path): self._plain(overlay.get(path, entry._val))
+                for path, entry in self._config.items() if isinstance(entry, ConfigValue)}
 
-        :param n: Number of sections to exit (default: 1)
-        :raise ValueError: if attempted to pop
+    def accessor(self, path):  # type: (Union[str, Tuple]) -> ConfigAccessor
         """
-        if n > len(self._active_path):
-            raise ValueError('Attempted to pop %d sections when whe only had %d'
-                             % (n, len(self._active_path)))
+        Create an accessor bound to a config value.
 
-        self._active_path = self._active_path[:-n]
+        :param path: Dot-separated path (for example ``'DATABASE.port'``) or path tuple
+        :return: Config accessor
+        :raise KeyError: if there is no config value at the given path
+        """
+        return ConfigAccessor(self, self._get_entry(path))
 
-    def build(self):  # type: () -> OrderedDict
+    @contextlib.contextmanager
+    def override(self, values=None, **kwargs):
+        # type: (Optional[Dict[Union[str, Tuple], Any]], **Any) -> Iterator[Config]
         """
-        Return a copy of the built config dict
+        Override config values within a ``with`` block, for example for the current request::
+
+            with cfg.override(PORT=3306):
+                cfg.PORT  # 3306
+
+        The overrides are only visible in the current context (``contextvars``),
+        so concurrent threads and asyncio tasks keep their own values.
+        On Python versions without ``contextvars``, they are visible in the current thread.
+        Overrides can be nested.
+
+        Attributes, :meth:`get`, accessors, section views, :meth:`as_dict`,
+        :meth:`as_flat_dict` and :meth:`freeze` return the overridden values.
+        They are not saved or exported.
+
+        :param values: Overridden values: Path (dot-separated or tuple) -> Value
+        :param kwargs: Overridden values by the attribute names of the config class
+        :return: Context manager
+        :raise KeyError: if there is no config value at one of the given paths
+        :raise ConfigValueError: if an overridden value is invalid
+        :raise ConstraintError: if the overridden values violate a constraint
+        """
+        values = dict(values or {})
+        for name, value in kwargs.items():
+            obj = getattr(type(self), name, None)
+            if not isinstance(obj, ConfigValue):
+                raise KeyError(name)
+            values[obj._path] = value
+
+        overlays = _overrides.get() or {}
+        overlay = dict(overlays.get(self, {}))
+        overlay.update(self._check_overrides(values))
+        self._check_override_constraints(overlay)
+
+        new_overlays = dict(overlays)
+        new_overlays[self] = overlay
+        token = _overrides.set(new_overlays)
+        _count_overrides(1)
+        try:
+            yield self
+        finally:
+            _count_overrides(-1)
+            _overrides.reset(token)
 
-        :return: Built config
+    def _check_overrides(self, values):  # type: (Dict[Union[str, Tuple], Any]) -> Dict[Tuple, Any]
         """
-        return copy.deepcopy(self._config)
+        Cast and validate overridden values.
 
+        :param values: Path -> Value
+        :return: Path tuple -> Cast value
+        :raise ConfigValueError: if a value is invalid
+        """
+        result = {}
 
-# noinspection PyProtectedMember
-class Config(object):
-    """Cyra configuration class"""
+        for path, value in values.items():
+            entry = self._get_entry(path)
+            error, cast_val = entry._try_cast(value)
 
-    builder = ConfigBuilder()
+            if error is None:
+                valid, h_ok, cast_val = entry._check(cast_val)
+                if not (valid and h_ok):
+                    error = 'is invalid'
+            if error is not None:
+                raise ConfigValueError(entry._path, error, value, entry._default, True)
 
-    def __init__(self, file='config.toml', cfg_builder=None):  # type: (str, ConfigBuilder) -> None
-        if cfg_builder is None:
-            cfg_builder = self.builder
+            result[entry._path] = cast_val
+        return result
 
-        # Copy builder config into the new Config object, with NEW value references
-        self._config = cfg_builder.build()
+    def _check_override_constraints(self, overlay):  # type: (Dict[Tuple, Any]) -> None
+        """
+        :param overlay: Overridden values: Path -> Value
+        :raise ConstraintError: if the overridden values violate a constraint
+        """
+        dependents = self._builder._dependents
 
-        self._modified = False
-        self._file = file
-        self._toml = tomlkit.document()
+        for path in overlay:
+            for constraint in dependents.get(path, ()):
+                values = [overlay.get(source, self._config[source]._val)
+                          for source in constraint.sources]
+                if not constraint.evaluate(values):
+                    raise ConstraintError(constraint, values, True)
 
-    def __getattribute__(self, item):
-        obj = object.__getattribute__(self, item)
-        if isinstance(obj, ConfigValue):
-            return self._config[obj._path]._val
-        return obj
+    def _get_overlay(self):  # type: () -> Optional[Dict[Tuple, Any]]
+        """
+        :return: Overridden values of the current context: Path -> Value. None if not overridden.
+        """
+        overlays = _overrides.get()
+        if overlays:
+            return overlays.get(self)
+        return None
 
-    def __setattr__(self, key, value):
-        try:
-            obj = object.__getattribute__(self, key)
+    def _read(self, entry):  # type: (ConfigValue) -> Any
+        """
+        Read a config value, taking the overrides of the current context into account.
 
-            if isinstance(obj, ConfigValue):
-                self._config[obj._path]._val = value
-                self._modified = True
-            else:
-                object.__setattr__(self, key, value)
-        except AttributeError:
-            object.__setattr__(self, key, value)
+        :param entry: Config value
+        :return: Value
+        """
+        overlay = self._get_overlay()
+        if overlay is not None:
+            return overlay.get(entry._path, entry._val)
+        return entry._val
 
     @staticmethod
     def _set_toml_entry(toml, path, entry):  # type: (TOMLDocument, Tuple, ConfigEntry) -> None
@@ -389,52 +2561,260 @@ class Config(object):
 
             Config._set_toml_entry(toml[path[0]], path[1:], entry)
 
-    def _load_dict(self, cfg_dict):  # type: (Dict) -> None
+    def _get_compiled(self):  # type: () -> Optional[Any]
         """
-        Import config values from a nested dictionary
+        Get the compiled schema of the config builder if it matches this instance.
+
+        :return: Compiled schema or None
+        """
+        compiled = self._builder._compiled
+
+        # Schemas can only be extended, so the number of entries identifies the version
+        if compiled is None or compiled.size != len(self._config):
+            return None
+
+        if self._entries is None:
+            self._entries = tuple(self._config.values())
+        return compiled
+
+    @staticmethod
+    def _set_entries(items, report, executor=None):
+        # type: (List[Tuple[ConfigValue, Any]], ErrorReport, Any) -> None
+        """
+        Set multiple config values.
+
+        If an executor is given, the validators and hooks run concurrently in the executor.
+        The results are applied and errors are reported in the order of the items,
+        so the outcome is the same as without an executor.
+
+        :param items: List of tuples: config value, raw input value
+        :param report: Error report to add value errors to
+        :param executor: Executor (for example a ``concurrent.futures.ThreadPoolExecutor``)
+        """
+        if executor is None:
+            for entry, value in items:
+                entry._set(value, report)
+            return
+
+        # Casting is cheap and runs in this thread, checks are submitted to the executor
+        jobs = []
+        for entry, value in items:
+            error, cast_val = entry._try_cast(value)
+            jobs.append((entry, value, error, cast_val, entry._check_async(cast_val, executor)))
+
+        for entry, value, error, cast_val, result in jobs:
+            if error is not None:
+                entry._setter_error(error, value, report)
+            entry._commit(cast_val, result(), report)
+
+    def _import_dict(self, cfg_dict, report, executor=None, removed=()):
+        # type: (Dict, ErrorReport, Any, Iterable[Tuple[Tuple, str]]) -> Tuple[int, int]
+        """
+        Import config values from a nested dictionary (generic implementation)
 
         :param cfg_dict: Dictionary
+        :param report: Error report to add value errors to
+        :param executor: Executor for running validators and hooks concurrently
+        :param removed: Map entries to be removed after the import (see :meth:`_sync_maps`)
+        :return: Tuple: number of imported values, number of missing values
         """
-        n_values = 0
-        modified = False
+        items = []
+        n_missing = 0
+        skip = set(path for map_path, key in removed
+                   for path in self._map_entries[map_path][key])
 
         for path in self._config.keys():
             entry = self._config[path]
-            if not isinstance(entry, ConfigValue):
+            if not isinstance(entry, ConfigValue) or path in skip:
                 continue
 
             new_value = DictUtil.get_element(cfg_dict, path)
 
             # Import value if present in config dict
             if new_value is not None:
-                entry._val = new_value
-                n_values += 1
+                items.append((entry, new_value))
+            else:
+                n_missing += 1
+
+        self._set_entries(items, report, executor)
+        return len(items), n_missing
+
+    @_synchronized
+    def _load_dict(self, cfg_dict, report=None, executor=None):
+        # type: (Dict, Optional[ErrorReport], Any) -> ErrorReport
+        """
+        Import config values from a nested dictionary
+
+        :param cfg_dict: Dictionary
+        :param report: Error report to add value errors to
+        :param executor: Executor for running validators and hooks concurrently
+        :return: Error report
+        """
+        if report is None:
+            report = ErrorReport()
+
+        compiled = self._get_compiled()
+        snapshot = self._snapshot(fail_fast=report.fail_fast)
+        map_keys = self._snapshot_maps()
+        removed = self._sync_maps(cfg_dict) if map_keys else []
+
+        try:
+            if compiled is not None and executor is None:
+                n_values, n_missing = compiled.load_dict(self._entries, cfg_dict, report)
             else:
-                modified = True
+                n_values, n_missing = self._import_dict(cfg_dict, report, executor, removed)
+        except ConfigValueError:
+            self._rollback(snapshot)
+            self._rollback_maps(map_keys)
+            raise
+
+        error = self._commit_changes(snapshot)
+        if error is not None:
+            self._rollback_maps(map_keys)
+            report.add(error)
+            return report.finish()
+
+        for map_path, key in removed:
+            self._remove_map_entry(map_path, key)
+        self._values_loaded()
 
         # If the imported dict covered the config spec completely,
         # mark the config as non-modified. Otherwise there are default values
         # that can be written back to the imported file
-        self._modified = modified
+        self._modified = n_missing > 0
 
         logging.info('Cyra config loaded. %d values imported.' % n_values)
+        return report.finish()
 
-    def load_toml(self, toml_str):  # type: (str) -> None
+    @_synchronized
+    def load_toml(self, toml_str, fail_fast=False, executor=None):
+        # type: (str, bool, Any) -> ErrorReport
         """
         Import config values from a TOML string
 
         :param toml_str: TOML string
+        :param fail_fast: Strict mode: raise a :class:`ConfigValueError` on the first
+                          invalid value instead of falling back to the default value
+        :param executor: Run validators and hooks concurrently in this executor
+                         (for example a ``concurrent.futures.ThreadPoolExecutor``).
+                         Results are applied in schema order.
+        :return: Error report
         """
+        old_toml = self._toml
         self._toml = tomlkit.loads(toml_str)
-        self._load_dict(self._toml.value)
 
-    def load_flat_dict(self, flat_dict):  # type: (Dict) -> None
+        try:
+            report = self._load_dict(self._toml.value, ErrorReport(fail_fast), executor)
+        except (ConfigValueError, ConstraintError):
+            self._toml = old_toml
+            raise
+
+        if report.rolled_back:
+            self._toml = old_toml
+        else:
+            self._toml_removed = []
+        return report
+
+    def load_json(self, json_str, fail_fast=False, executor=None):
+        # type: (str, bool, Any) -> ErrorReport
+        """
+        Import config values from a JSON string.
+
+        The JSON data has the same nested structure as the TOML file.
+
+        :param json_str: JSON string
+        :param fail_fast: Strict mode: raise a :class:`ConfigValueError` on the first
+                          invalid value instead of falling back to the default value
+        :param executor: Run validators and hooks concurrently in this executor
+                         (for example a ``concurrent.futures.ThreadPoolExecutor``).
+                         Results are applied in schema order.
+        :return: Error report
+        """
+        return self._load_dict(json.loads(json_str), ErrorReport(fail_fast), executor)
+
+    def load_binary(self, data, fail_fast=False, executor=None):
+        # type: (bytes, bool, Any) -> ErrorReport
+        """
+        Import config values from the compact binary format created by ``export_binary()``.
+
+        :param data: Binary data
+        :param fail_fast: Strict mode: raise a :class:`ConfigValueError` on the first
+                          invalid value instead of falling back to the default value
+        :param executor: Run validators and hooks concurrently in this executor
+                         (for example a ``concurrent.futures.ThreadPoolExecutor``).
+                         Results are applied in schema order.
+        :return: Error report
+        :raise ValueError: if the data is not in Cyra's binary format
+        """
+        cfg_dict = None
+
+        if data[:len(BINARY_HEADER)] == BINARY_HEADER:
+            try:
+                cfg_dict = marshal.loads(data[len(BINARY_HEADER):])
+            except (EOFError, ValueError, TypeError):
+                pass
+
+        if not isinstance(cfg_dict, dict):
+            raise ValueError('Data is not in the Cyra binary format')
+
+        return self._load_dict(cfg_dict, ErrorReport(fail_fast), executor)
+
+    @_synchronized
+    def load_flat_dict(self, flat_dict, fail_fast=False, executor=None):
+        # type: (Dict, bool, Any) -> ErrorReport
         """
         Import config values from a flat dictionary.
 
         :param flat_dict: Flat dictionary.
                           Keys are either tuples or strings with dots as separators.
+        :param fail_fast: Strict mode: raise a :class:`ConfigValueError` on the first
+                          invalid value instead of falling back to the default value
+        :param executor: Run validators and hooks concurrently in this executor
+                         (for example a ``concurrent.futures.ThreadPoolExecutor``).
+                         Results are applied in schema order.
+        :return: Error report
+        """
+        report = ErrorReport(fail_fast)
+        compiled = self._get_compiled()
+        snapshot = self._snapshot(fail_fast=fail_fast)
+        map_keys = self._snapshot_maps()
+
+        try:
+            if compiled is not None and executor is None:
+                compiled.load_flat_dict(self._entries, flat_dict, report)
+            else:
+                self._import_flat_dict(flat_dict, report, executor)
+        except ConfigValueError:
+            self._rollback(snapshot)
+            self._rollback_maps(map_keys)
+            raise
+
+        error = self._commit_changes(snapshot)
+        if error is not None:
+            self._rollback_maps(map_keys)
+            report.add(error)
+        else:
+            self._values_loaded()
+        return report.finish()
+
+    def _import_flat_dict(self, flat_dict, report, executor=None):
+        # type: (Dict, ErrorReport, Any) -> None
         """
+        Import config values from a flat dictionary (generic implementation)
+
+        :param flat_dict: Flat dictionary
+        :param report: Error report to add value errors to
+        :param executor: Executor for running validators and hooks concurrently
+        """
+        # Add the map entries of the input
+        if self._map_entries:
+            for key in flat_dict:
+                try:
+                    self._get_entry(key, True)
+                except (KeyError, TypeError, AttributeError):
+                    pass
+
+        items = []
         for path in self._config.keys():
             entry = self._config[path]
             if not isinstance(entry, ConfigValue):
@@ -446,7 +2826,94 @@ class Config(object):
                 new_value = flat_dict.get('.'.join(path))
 
             if new_value is not None:
-                entry._val = new_value
+                items.append((entry, new_value))
+
+        self._set_entries(items, report, executor)
+
+    @_synchronized
+    def ingest(self, items, fail_fast=False, executor=None):
+        # type: (Union[Dict, Iterable[Tuple[Any, Any]]], bool, Any) -> ErrorReport
+        """
+        Import config values from an iterable of (path, value) pairs
+        (for example a generator yielding database rows).
+
+        The pairs are consumed in chunks, so the input does not have to fit into memory.
+        Each path is resolved through the path index of the config, so the cost depends
+        on the size of the input and not on the size of the schema.
+        Paths that are not config values are collected in ``report.unknown_keys``
+        and logged in a single message.
+
+        :param items: Iterable of tuples: path (dot-separated or tuple), value.
+                      Dictionaries are accepted as well.
+        :param fail_fast: Strict mode: raise a :class:`ConfigValueError` on the first
+                          invalid value instead of falling back to the default value
+        :param executor: Run validators and hooks concurrently in this executor
+                         (for example a ``concurrent.futures.ThreadPoolExecutor``).
+                         Results are applied in input order.
+        :return: Error report
+        """
+        if isinstance(items, dict):
+            items = items.items()
+
+        report = ErrorReport(fail_fast)
+
+        # Imported config values -> Value before the ingest
+        changed = OrderedDict()  # type: Dict[ConfigValue, Any]
+        map_keys = self._snapshot_maps()
+
+        try:
+            n_values = self._ingest_items(items, report, executor, changed)
+        except ConfigValueError:
+            self._rollback(list(changed.items()))
+            self._rollback_maps(map_keys)
+            raise
+
+        snapshot = list(changed.items()) if self._builder._dependents else None
+        error = self._commit_changes(snapshot)
+        self._values_loaded(changed)
+
+        if error is not None:
+            self._rollback_maps(map_keys)
+            report.add(error)
+            return report.finish()
+
+        logging.info('Cyra config loaded. %d values imported.' % n_values)
+        return report.finish()
+
+    def _ingest_items(self, items, report, executor, changed):
+        # type: (Iterable[Tuple[Any, Any]], ErrorReport, Any, Dict[ConfigValue, Any]) -> int
+        """
+        Set the config values of an iterable of (path, value) pairs, chunk by chunk.
+
+        :param items: Iterable of tuples: path, value
+        :param report: Error report to add value errors and unknown keys to
+        :param executor: Executor for running validators and hooks concurrently
+        :param changed: Dictionary to record the imported config values
+                        and their previous values in
+        :return: Number of imported values
+        """
+        lookup = self._lookup
+        chunk = []
+        n_values = 0
+
+        for path, value in items:
+            try:
+                entry = lookup.get(path) or self._get_entry(path, True)
+            except (KeyError, TypeError, AttributeError):
+                report.unknown_keys.append(path)
+                continue
+
+            if entry not in changed:
+                changed[entry] = entry._val
+
+            chunk.append((entry, value))
+            if len(chunk) >= self.ingest_chunk_size:
+                self._set_entries(chunk, report, executor)
+                n_values += len(chunk)
+                chunk = []
+
+        self._set_entries(chunk, report, executor)
+        return n_values + len(chunk)
 
     @staticmethod
     def _config_to_toml(config, document):  # type: (Dict[Tuple, ConfigEntry], TOMLDocument) -> str
@@ -458,6 +2925,17 @@ class Config(object):
         :param document: TOMLDocument
         :return: TOML string
         """
+        Config._update_toml(config, document)
+        return tomlkit.dumps(document)
+
+    @staticmethod
+    def _update_toml(config, document):  # type: (Dict[Tuple, ConfigEntry], TOMLDocument) -> None
+        """
+        Write the configuration dict to a TOMLDocument.
+
+        :param config: Config dict
+        :param document: TOMLDocument
+        """
         # For all config keys, check if they are already present in the config file
         # If not, add them
         for path in config.keys():
@@ -469,8 +2947,23 @@ class Config(object):
                (isinstance(entry, ConfigValue) and entry._val != target_value):
                 Config._set_toml_entry(document, path, entry)
 
-        return tomlkit.dumps(document)
+    @staticmethod
+    def _config_to_new_toml(config):  # type: (Dict[Tuple, ConfigEntry]) -> str
+        """
+        Output the configuration dict as a toml-formatted string.
+
+        Uses the :class:`TomlEmitter` if possible, since there is no existing
+        styling to preserve.
 
+        :param config: Config dict
+        :return: TOML string
+        """
+        try:
+            return TomlEmitter(config).dumps()
+        except ValueError:
+            return Config._config_to_toml(config, tomlkit.document())
+
+    @_synchronized
     def export_toml(self):  # type: () -> str
         """
         Export the configuration as a toml-formatted string.
@@ -478,44 +2971,180 @@ class Config(object):
 
         :return: TOML string
         """
-        return self._config_to_toml(self._config, self._toml)
+        return ''.join(self.iter_toml())
 
-    def load_file(self, update=True):  # type: (bool) -> None
+    def iter_toml(self):  # type: () -> Iterator[str]
         """
-        Load the configuration from the file.
+        Export the configuration as TOML, yielding the text in chunks.
+        Styling and comments of the imported toml file are preserved.
 
-        :param update: If set to true, config values missing in the file will be added automatically
-                       with their default values and comments.
+        New config files are rendered one line at a time, imported TOML documents
+        one top-level table at a time, so the complete TOML string is never held in memory.
+        The config must not be modified while the iterator is consumed
+        (export_toml(), write_toml() and save_file() hold the lock of the config).
+
+        :return: Iterator over the chunks of the TOML string
+        :raise ConfigFileChangedError: if the config was loaded with ``release_toml=True``
+                                       and the file was modified in the meantime
         """
-        if os.path.isfile(self._file):
-            logging.info('Cyra is reading your config from %s' % self._file)
+        toml = self._get_toml()
+
+        # Entries of map sections are added in any order, so they are exported with tomlkit
+        if not toml.body and not self._map_entries:
+            try:
+                return iter(TomlEmitter(self._config))
+            except ValueError:
+                toml = tomlkit.document()
+
+        compiled = self._get_compiled()
+        if compiled is not None:
+            return compiled.export(self._entries, toml, _iter_document)
+
+        self._update_toml(self._config, toml)
+        return _iter_document(toml)
+
+    @_synchronized
+    def write_toml(self, f):  # type: (Any) -> None
+        """
+        Write the configuration as TOML to a file object, chunk by chunk (see :meth:`iter_toml`).
+
+        :param f: Writable text file object
+        :raise ConfigFileChangedError: if the config was loaded with ``release_toml=True``
+                                       and the file was modified in the meantime
+        """
+        for chunk in self.iter_toml():
+            f.write(chunk)
+
+    def _get_toml(self):  # type: () -> TOMLDocument
+        """
+        Get the TOML document of the config file.
+
+        If the document was released after loading, the file is read and parsed again
+        and the map entries removed in the meantime are deleted from it.
+        The re-parsed document is not retained.
 
+        :return: TOML document
+        :raise ConfigFileChangedError: if the file was modified since it was loaded
+        """
+        if self._toml is not None:
+            return self._toml
+
+        toml_str = None
+        if os.path.isfile(self._file):
             with open(self._file, 'r') as f:
                 toml_str = f.read()
-                self.load_toml(toml_str)
-        else:
-            self._modified = True
 
-        # Write file if non existent or modified
-        if update:
-            self.save_file()
+        if toml_str is None or self._digest(toml_str) != self._toml_digest:
+            raise ConfigFileChangedError('Cyra config file %s was modified after it was loaded'
+                                         % self._file)
+
+        toml = tomlkit.loads(toml_str)
+        for path in self._toml_removed:
+            self._remove_toml_entry(toml, path)
+        return toml
+
+    @staticmethod
+    def _digest(toml_str):  # type: (str) -> str
+        return hashlib.sha1(toml_str.encode('utf-8')).hexdigest()
+
+    @_synchronized
+    def _to_dict(self, plain=False, overlay=None):
+        # type: (bool, Optional[Dict[Tuple, Any]]) -> Dict
+        """
+        Output the config values as a nested dictionary.
+
+        :param plain: Use plain dicts instead of OrderedDicts
+                      (also converts dict/list subclasses within the values).
+        :param overlay: Overridden values: Path -> Value (default: the stored values)
+        :return: Nested dictionary
+        """
+        dict_type = dict if plain else OrderedDict
+        result = dict_type()
+        tables = {tuple(): result}
+        overlay = overlay or {}
+
+        for path, entry in self._config.items():
+            parent = tables[path[:-1]]
+
+            if isinstance(entry, ConfigValue):
+                value = overlay.get(path, entry._val)
+                parent[path[-1]] = self._plain(value) if plain else value
+            else:
+                parent[path[-1]] = tables[path] = dict_type()
+
+        return result
+
+    @staticmethod
+    def _plain(value):  # type: (Any) -> Any
+        """
+        Convert dict and list subclasses to plain dicts and lists and scalar subclasses
+        (e.g. the items of a TOML document) to their builtin types
+        """
+        if isinstance(value, dict):
+            return {k: Config._plain(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [Config._plain(v) for v in value]
+        if type(value) in _PLAIN_TYPES:
+            return value
+
+        for base in _PLAIN_TYPES:
+            if isinstance(value, base):
+                return _to_base_type(value, base)
+        return value
+
+    def export_json(self, indent=None):  # type: (Optional[int]) -> str
+        """
+        Export the configuration as a JSON string.
+        Dates and times are written as ISO 8601 strings.
+
+        :param indent: Indentation level for pretty-printing (default: compact output)
+        :return: JSON string
+        """
+        return json.dumps(self._to_dict(), indent=indent, default=_json_default)
+
+    def export_binary(self):  # type: () -> bytes
+        """
+        Export the configuration in a compact binary format (based on the ``marshal`` module).
+
+        The format is intended for exchanging configs between tools running on the same
+        Python version. Only load binary configs from trusted sources.
+
+        :return: Binary data
+        :raise ValueError: if the config contains values that cannot be serialized
+                           (e.g. dates and times)
+        """
+        return BINARY_HEADER + marshal.dumps(self._to_dict(True), 2)
+
+    @_synchronized
+    def load_file(self, update=True, fail_fast=False, release_toml=False, executor=None):
+        # type: (bool, bool, bool, Any) -> ErrorReport
+        """
+        Load the configuration from the file (or the storage backend of the config).
+
+        :param update: If set to true, config values missing in the file will be added automatically
+                       with their default values and comments.
+        :param fail_fast: Strict mode: raise a :class:`ConfigValueError` on the first
+                          invalid value instead of falling back to the default value
+        :param release_toml: Do not keep the parsed TOML document in memory after loading.
+                             The file is read again if the config is exported or saved later.
+        :param executor: Run validators and hooks concurrently in this executor
+                         (for example a ``concurrent.futures.ThreadPoolExecutor``).
+                         Results are applied in schema order.
+        :return: Error report
+        """
+        return self._storage.load(self, update, fail_fast, release_toml, executor)
 
+    @_synchronized
     def save_file(self, force=False):  # type: (bool) -> bool
         """
-        If modified, save the configuration to disk.
+        If modified, save the configuration to disk (or the storage backend of the config).
 
         :param force: Force save, even if not modified.
         :return: True if saved successfully.
+        :raise ConfigFileChangedError: if the config was loaded with ``release_toml=True``
+                                       and the file was modified in the meantime
         """
-        if self._modified or force:
-            logging.info('Cyra is writing your config to %s' % self._file)
-
-            with open(self._file, 'w') as f:
-                f.write(self.export_toml())
-
-            self._modified = False
-            return True
-        return False
+        return self._storage.save(self, force)
 
     def get_docblocks(self):  # type: () -> List[Tuple[str, str]]
         """
@@ -529,12 +3158,244 @@ class Config(object):
 
         for path, entry in self._config.items():
             if entry._docstring:
-                result.append((docstring, self._config_to_toml(buffer, tomlkit.document())))
+                result.append((docstring, self._config_to_new_toml(buffer)))
 
                 docstring = entry._docstring
                 buffer = OrderedDict()
 
             buffer[path] = entry
 
-        result.append((docstring, self._config_to_toml(buffer, tomlkit.document())))
+        result.append((docstring, self._config_to_new_toml(buffer)))
+        return result
+
+    def diff(self, other):  # type: (Config) -> ConfigDiff
+        """
+        Compute the changes from this config to another config with the same schema.
+
+        Map section entries that only exist in one of the configs are expressed
+        as changes of all their values, with None as the new value of removed entries
+        and as the old value of added entries.
+
+        :param other: Config
+        :return: Config diff. Applying it to this config results in the values of ``other``.
+        """
+        result = ConfigDiff()
+
+        for path, entry in self._config.items():
+            if not isinstance(entry, ConfigValue):
+                continue
+
+            other_entry = other._config.get(path)
+            if other_entry is None:
+                result.append(ConfigChange(path, entry._val, None))
+            elif entry._val != other_entry._val:
+                result.append(ConfigChange(path, entry._val, other_entry._val))
+
+        if self._map_entries:
+            for path, other_entry in other._config.items():
+                if isinstance(other_entry, ConfigValue) and path not in self._config:
+                    result.append(ConfigChange(path, None, other_entry._val))
+
         return result
+
+    def diff_file(self, file=None):  # type: (Optional[str]) -> ConfigDiff
+        """
+        Compute the changes from the current config values to the values stored in a file.
+
+        :param file: Config file (default: the file of this config)
+        :return: Config diff. Applying it to this config results in the values of the file.
+        """
+        other = Config(self._file if file is None else file, self._builder)
+        other.load_file(False)
+        return self.diff(other)
+
+    @_synchronized
+    def apply_diff(self, diff, verify=False, fail_fast=False):
+        # type: (List[ConfigChange], bool, bool) -> ErrorReport
+        """
+        Apply a config diff. Only the changed config values and the
+        respective items of the TOML document are updated.
+
+        Map section entries are added for changes without an old value
+        and removed for changes without a new value.
+
+        :param diff: Config diff
+        :param verify: Check if the current values match the old values of the diff
+        :param fail_fast: Strict mode: raise a :class:`ConfigValueError` on the first
+                          invalid value instead of falling back to the default value
+        :return: Error report
+        :raise KeyError: if the diff contains a path that is not a config value
+                         (or a map entry value to be added or removed)
+        :raise ValueError: if verification is enabled and a current value does not match
+        :raise ConstraintError: if fail-fast mode is enabled and the diff violates a constraint
+        """
+        map_keys = self._snapshot_maps()
+
+        try:
+            entries, removed = self._resolve_diff(diff, verify, map_keys)
+        except (KeyError, ValueError):
+            self._rollback_maps(map_keys)
+            raise
+
+        report = ErrorReport(fail_fast)
+        snapshot = self._snapshot((entry for entry, _ in entries), fail_fast)
+
+        try:
+            for entry, new_value in entries:
+                entry._set(new_value, report)
+        except ConfigValueError:
+            self._rollback(snapshot)
+            self._rollback_maps(map_keys)
+            raise
+
+        error = self._commit_changes(snapshot)
+        if error is not None:
+            self._rollback_maps(map_keys)
+            report.add(error)
+            return report.finish()
+
+        for map_path, key in removed:
+            self._remove_map_entry(map_path, key)
+
+        for entry, _ in entries:
+            self._value_changed(entry)
+
+            # Update the value if it is present in the TOML document.
+            # Missing values are added with their comments on export.
+            if self._toml is not None and \
+                    DictUtil.get_element(self._toml, entry._path) is not None:
+                self._set_toml_entry(self._toml, entry._path, entry)
+
+        return report.finish()
+
+    def _resolve_diff(self, diff, verify, map_keys):
+        # type: (List[ConfigChange], bool, Optional[Dict[Tuple, Set[str]]]) -> Tuple[List, List]
+        """
+        Look up the config values changed by a diff, adding the map entries of the diff.
+
+        :param diff: Config diff
+        :param verify: Check if the current values match the old values of the diff
+                       (None for the values of added map entries)
+        :param map_keys: Map keys before applying the diff (see :meth:`_snapshot_maps`)
+        :return: Tuple: list of tuples (config value, new value),
+                 list of tuples (map section path, key of the entry to be removed)
+        :raise KeyError: if the diff contains a path that is not a config value
+        :raise ValueError: if verification is enabled and a current value does not match
+        """
+        entries = []
+        removed = []
+
+        for change in diff:
+            path = tuple(change.path)
+            entry = self._config.get(path)
+
+            if entry is None and change.old is None and change.new is not None:
+                try:
+                    entry = self._get_map_value(path)
+                except KeyError:
+                    pass
+            if not isinstance(entry, ConfigValue):
+                raise KeyError('Config has no value at %s' % '.'.join(path))
+
+            map_entry = self._find_map_entry(path)
+            added = map_entry is not None and map_entry[1] not in map_keys[map_entry[0]]
+            if verify and (None if added else entry._val) != change.old:
+                raise ValueError('Config value at %s does not match the diff' % '.'.join(path))
+
+            if change.new is not None:
+                entries.append((entry, change.new))
+                continue
+
+            if map_entry is None:
+                raise KeyError('Config value at %s cannot be removed' % '.'.join(path))
+            if map_entry not in removed:
+                removed.append(map_entry)
+
+        return entries, removed
+
+    def _find_map_entry(self, path):  # type: (Tuple) -> Optional[Tuple[Tuple, str]]
+        """
+        Find the map entry containing a path.
+
+        :param path: Path tuple
+        :return: Tuple: map section path, key of the entry. None if the path does not belong
+                 to an entry of a map section.
+        """
+        for map_path, map_entries in self._map_entries.items():
+            n = len(map_path)
+            if len(path) > n and path[:n] == map_path and path[n] in map_entries:
+                return map_path, path[n]
+        return None
+
+    @_synchronized
+    def freeze(self):  # type: () -> Any
+        """
+        Create an immutable snapshot of the current config values.
+
+        The snapshot is an object with plain attributes: the attributes of your Config class
+        (including computed values), and the top-level keys of the config with nested objects
+        for the sections (for example ``frozen.DATABASE.port``). Lists are converted to tuples
+        and dicts to read-only dicts, so the snapshot can be shared between threads
+        without locking. The snapshot types are generated once per Config class and schema.
+
+        :return: Frozen config (:class:`cyra.frozen.FrozenConfig`)
+        """
+        from cyra.frozen import FrozenSchema
+
+        schema = self._builder._frozen.get(type(self))
+        if schema is None or schema.layout != FrozenSchema.get_layout(self):
+            schema = self._builder._frozen[type(self)] = FrozenSchema(self)
+        return schema.freeze(self)
+
+    def enable_autosave(self, delay=1.0, journal=None, compact_every=100):
+        # type: (float, Optional[str], int) -> Any
+        """
+        Save the config to its file in the background whenever its values are modified.
+        All changes within the debounce delay are written at once.
+
+        If a journal file is given, every change is appended to it immediately and
+        changes that were not written to the config file yet (e.g. after a crash)
+        are replayed.
+
+        :param delay: Debounce delay in seconds
+        :param journal: Path of the journal file (default: no journal)
+        :param compact_every: Write the config file after this number of journal records,
+                              even if the debounce delay has not expired yet
+        :return: Autosaver (:class:`cyra.autosave.AutoSaver`)
+        """
+        from cyra.autosave import AutoSaver
+
+        self.disable_autosave()
+        self._autosave = AutoSaver(self, delay, journal, compact_every)
+        return self._autosave
+
+    def disable_autosave(self):  # type: () -> None
+        """Write pending changes and stop saving the config automatically."""
+        if self._autosave is not None:
+            self._autosave.close()
+            self._autosave = None
+
+
+def import_config_class(cfg_path):  # type: (str) -> type
+    """
+    Import a Config class by its path.
+
+    :param cfg_path: Class path with the format ``<Module>.<Class>``
+    :return: Config class
+    :raise ValueError: if the path does not have the format ``<Module>.<Class>``
+    :raise ImportError: if the module could not be imported
+    :raise AttributeError: if the module does not contain the class
+    :raise TypeError: if the class is not a Config class
+    """
+    split_path = cfg_path.rsplit('.', 1)
+
+    if len(split_path) != 2:
+        raise ValueError('Path must have the format <Module>.<Class>')
+
+    modname, clsname = split_path
+    config_cls = getattr(importlib.import_module(modname), clsname)
+
+    if not (isinstance(config_cls, type) and issubclass(config_cls, Config)):
+        raise TypeError('Class %s is not a Config class' % cfg_path)
+
+    return config_cls
@@ -1,16 +1,36 @@
-from typing import List
-import importlib
+from typing import List, Dict, Tuple, Optional
+import hashlib
+import inspect
 
 from sphinx.application import Sphinx
+from sphinx.environment import BuildEnvironment
 from sphinx.util import logging
 from docutils import nodes
 from docutils.parsers.rst import Directive, directives
 from docutils.statemachine import StringList
 
 import cyra
+from cyra.core import import_config_class
 
 logger = logging.getLogger(__name__)
 
+# Increase if the format of the data stored in the build environment changes
+ENV_VERSION = 1
+
+
+def schema_fingerprint(config_cls):  # type: (type) -> str
+    """
+    Return the fingerprint of the documentation generated from a Config class.
+
+    :param config_cls: Config class
+    :return: Fingerprint (hex string)
+    """
+    sha = hashlib.sha1()
+    for part in (config_cls.__module__, config_cls.__name__, inspect.getdoc(config_cls) or '',
+                 config_cls.builder.fingerprint()):
+        sha.update(part.encode('utf-8'))
+    return sha.hexdigest()
+
 
 class CyradocDirective(Directive):
     required_arguments = 1
@@ -20,32 +40,19 @@ class CyradocDirective(Directive):
 
     @staticmethod
     def _get_class(cfg_path, location):
-        split_path = cfg_path.rsplit('.', 1)
-
-        if len(split_path) != 2:
-            logger.error('Cyradoc path must have the format <Module>.<Class>', location=location)
-            return None
-
-        modname, clsname = split_path
-
         try:
-            mod = importlib.import_module(modname)
+            return import_config_class(cfg_path)
+        except ValueError:
+            logger.error('Cyradoc path must have the format <Module>.<Class>', location=location)
         except ImportError:
-            logger.error('Cyradoc could not find module %s' % modname, location=location)
-            return None
-
-        try:
-            config_cls = getattr(mod, clsname)
+            logger.error('Cyradoc could not find module %s' % cfg_path.rsplit('.', 1)[0],
+                         location=location)
         except AttributeError:
             logger.error('Cyradoc could not find class %s in module %s'
-                         % (clsname, modname), location=location)
-            return None
-
-        if not issubclass(config_cls, cyra.Config):
+                         % tuple(reversed(cfg_path.rsplit('.', 1))), location=location)
+        except TypeError:
             logger.error('Class %s is not a Cyradoc class' % cfg_path, location=location)
-            return None
-
-        return config_cls
+        return None
 
     @staticmethod
     def _new_toml_block(toml):
@@ -53,6 +60,35 @@ class CyradocDirective(Directive):
         literal['language'] = 'toml'
         return literal
 
+    @staticmethod
+    def _render_blocks(config_cls, no_docstrings):
+        # type: (type, bool) -> List[Tuple[Optional[str], str]]
+        config = config_cls('')
+
+        if no_docstrings:
+            return [(None, config.export_toml())]
+        return config.get_docblocks()
+
+    def _get_blocks(self, cfg_path, config_cls, no_docstrings):
+        # type: (str, type, bool) -> List[Tuple[Optional[str], str]]
+        """
+        Get the rendered docstrings and TOML blocks of a Config class.
+        Blocks are cached in the build environment until the schema of the class changes.
+        """
+        env = self.state.document.settings.env
+        fingerprint = schema_fingerprint(config_cls)
+
+        env.cyradoc_schemas.setdefault(env.docname, {})[cfg_path] = fingerprint
+
+        key = (cfg_path, no_docstrings)
+        cached = env.cyradoc_blocks.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        blocks = self._render_blocks(config_cls, no_docstrings)
+        env.cyradoc_blocks[key] = (fingerprint, blocks)
+        return blocks
+
     def run(self):  # type: () -> List[nodes.Node]
         location = self.state_machine.get_source_and_line(self.lineno)
         cfg_path = self.arguments[0]
@@ -61,14 +97,14 @@ class CyradocDirective(Directive):
         if config_cls is None:
             return []
 
-        config = config_cls('')
+        no_docstrings = 'no-docstrings' in self.options
         result = []
 
-        if 'no-docstrings' in self.options:
-            toml = config.export_toml()
+        if no_docstrings:
+            toml = self._get_blocks(cfg_path, config_cls, True)[0][1]
             result.append(self._new_toml_block(toml))
         else:
-            for docstring, toml in config.get_docblocks():
+            for docstring, toml in self._get_blocks(cfg_path, config_cls, False):
                 if docstring:
                     rst = StringList(docstring.split('\n'))
                     # Create a node.
@@ -85,5 +121,65 @@ class CyradocDirective(Directive):
         return result
 
 
-def setup(app):  # type: (Sphinx) -> None
+def _init_env(env):  # type: (BuildEnvironment) -> None
+    # Docname -> {Config class path -> schema fingerprint}
+    if not hasattr(env, 'cyradoc_schemas'):
+        env.cyradoc_schemas = {}  # type: Dict[str, Dict[str, str]]
+    # (Config class path, no-docstrings) -> (schema fingerprint, rendered blocks)
+    if not hasattr(env, 'cyradoc_blocks'):
+        env.cyradoc_blocks = {}  # type: Dict[Tuple[str, bool], Tuple[str, List]]
+
+
+def builder_inited(app):  # type: (Sphinx) -> None
+    _init_env(app.env)
+
+
+def env_purge_doc(app, env, docname):  # type: (Sphinx, BuildEnvironment, str) -> None
+    _init_env(env)
+    env.cyradoc_schemas.pop(docname, None)
+
+
+def env_merge_info(app, env, docnames, other):
+    # type: (Sphinx, BuildEnvironment, List[str], BuildEnvironment) -> None
+    _init_env(env)
+    _init_env(other)
+
+    for docname in docnames:
+        if docname in other.cyradoc_schemas:
+            env.cyradoc_schemas[docname] = other.cyradoc_schemas[docname]
+    env.cyradoc_blocks.update(other.cyradoc_blocks)
+
+
+def env_get_outdated(app, env, added, changed, removed):
+    # type: (Sphinx, BuildEnvironment, set, set, set) -> List[str]
+    """Return all documents containing Config classes whose schema has changed"""
+    _init_env(env)
+    fingerprints = {}
+
+    def _fingerprint(cfg_path):
+        if cfg_path not in fingerprints:
+            try:
+                fingerprints[cfg_path] = schema_fingerprint(import_config_class(cfg_path))
+            except (ValueError, ImportError, AttributeError, TypeError):
+                fingerprints[cfg_path] = None
+        return fingerprints[cfg_path]
+
+    return [docname for docname, schemas in env.cyradoc_schemas.items()
+            if docname not in removed and
+            any(_fingerprint(path) != fp for path, fp in schemas.items())]
+
+
+def setup(app):  # type: (Sphinx) -> Dict
     app.add_directive('cyradoc', CyradocDirective)
+
+    app.connect('builder-inited', builder_inited)
+    app.connect('env-purge-doc', env_purge_doc)
+    app.connect('env-merge-info', env_merge_info)
+    app.connect('env-get-outdated', env_get_outdated)
+
+    return {
+        'version': cyra.__version__,
+        'env_version': ENV_VERSION,
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -0,0 +1,219 @@
+"""
+Immutable snapshots of configs.
+
+Use :meth:`cyra.Config.freeze` to create a :class:`FrozenConfig`.
+"""
+from typing import Any, Dict, List, Tuple  # noqa: F401
+from collections import OrderedDict
+import re
+
+from cyra.core import Config, ConfigValue, ComputedValue  # noqa: F401
+
+# Keys that can be used as attribute names of frozen sections
+_ATTR_NAME = re.compile(r'^[A-Za-z][A-Za-z0-9_]*$')
+
+
+class FrozenDict(dict):
+    """Dictionary that cannot be modified"""
+
+    _frozen = False
+
+    def __init__(self, *args, **kwargs):
+        if self._frozen:
+            self._readonly()
+
+        super(FrozenDict, self).__init__(*args, **kwargs)
+        self._frozen = True
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('Frozen config values cannot be modified')
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+def freeze_value(value):  # type: (Any) -> Any
+    """
+    Convert a config value into an immutable value
+    (dicts to :class:`FrozenDict` objects, lists to tuples).
+
+    :param value: Config value
+    :return: Immutable value
+    """
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze_value(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_value(v) for v in value)
+    return value
+
+
+class FrozenSection(object):
+    """
+    Immutable section of a frozen config.
+
+    Config values and subsections are plain attributes named after their keys
+    (keys that are not valid attribute names are only available as items).
+    Frozen sections can be shared between threads without locking.
+    """
+    __slots__ = ('_items',)
+
+    # Keys that are attributes
+    _fields = ()  # type: Tuple[str, ...]
+
+    def __init__(self, items, attrs=None):  # type: (Dict[str, Any], Dict[str, Any]) -> None
+        """
+        :param items: Key -> Frozen value or section
+        :param attrs: Additional attributes
+        """
+        set_attr = object.__setattr__
+        set_attr(self, '_items', FrozenDict(items))
+
+        for name in self._fields:
+            set_attr(self, name, items[name])
+        for name, value in (attrs or {}).items():
+            set_attr(self, name, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('Frozen configs cannot be modified')
+
+    def __delattr__(self, key):
+        raise AttributeError('Frozen configs cannot be modified')
+
+    def __getitem__(self, key):  # type: (str) -> Any
+        return self._items[key]
+
+    def __contains__(self, key):  # type: (str) -> bool
+        return key in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__,
+                           ', '.join('%s=%r' % item for item in self._items.items()))
+
+
+class FrozenConfig(FrozenSection):
+    """
+    Immutable snapshot of a config.
+
+    Additionally to the keys of the top-level values and sections, the snapshot
+    has the same attributes as the Config class it was created from
+    (for example ``frozen.PORT``), including computed values.
+    """
+    __slots__ = ('_flat',)
+
+    def __init__(self, items, attrs, flat):
+        # type: (Dict[str, Any], Dict[str, Any], Dict[str, Any]) -> None
+        """
+        :param items: Key -> Frozen value or section
+        :param attrs: Config class attribute name -> Frozen value
+        :param flat: Dot-separated path -> Frozen value
+        """
+        super(FrozenConfig, self).__init__(items, attrs)
+        object.__setattr__(self, '_flat', FrozenDict(flat))
+
+    def get(self, path, default=None):  # type: (str, Any) -> Any
+        """
+        Get a config value by its dot-separated path (for example ``'DATABASE.port'``).
+
+        :param path: Dot-separated path
+        :param default: Value to be returned if there is no config value at the given path
+        :return: Config value
+        """
+        return self._flat.get(path, default)
+
+
+class FrozenSchema(object):
+    """Generated frozen section types for the schema of a Config class"""
+
+    def __init__(self, cfg):  # type: (Config) -> None
+        """
+        :param cfg: Config instance
+        """
+        self.layout = self.get_layout(cfg)
+
+        # Config class attribute name -> config value path or computed value
+        self.attrs = []  # type: List[Tuple[str, Any]]
+        for name in dir(type(cfg)):
+            if name.startswith('__'):
+                continue
+            obj = getattr(type(cfg), name, None)
+            if isinstance(obj, ConfigValue):
+                self.attrs.append((name, obj._path))
+            elif isinstance(obj, ComputedValue):
+                self.attrs.append((name, obj))
+
+        # Section path -> Frozen section type
+        self.types = {}  # type: Dict[Tuple, type]
+        children = OrderedDict([((), [])])  # type: Dict[Tuple, List[str]]
+
+        for path, entry in cfg._config.items():
+            children[path[:-1]].append(path[-1])
+            if not isinstance(entry, ConfigValue):
+                children[path] = []
+
+        attr_names = tuple(name for name, _ in self.attrs)
+        for path, keys in children.items():
+            # Config class attributes take precedence over top-level keys
+            fields = tuple(key for key in keys if _ATTR_NAME.match(key)
+                           and (path or key not in attr_names))
+            name = '.'.join(('Frozen' + type(cfg).__name__,) + path)
+
+            if path:
+                namespace = {'__slots__': fields, '_fields': fields}
+                self.types[path] = type(name, (FrozenSection,), namespace)
+            else:
+                namespace = {'__slots__': fields + attr_names, '_fields': fields}
+                self.types[path] = type(name, (FrozenConfig,), namespace)
+
+    @staticmethod
+    def get_layout(cfg):  # type: (Config) -> Tuple
+        """
+        Get the layout of a config, which determines its frozen types: the number of entries
+        in the schema and the keys of the entries of its map sections.
+
+        :param cfg: Config instance
+        :return: Layout
+        """
+        return (len(cfg._config),) + tuple(tuple(entries) for entries in cfg._map_entries.values())
+
+    def freeze(self, cfg):  # type: (Config) -> FrozenConfig
+        """
+        Create a snapshot of the current values of a config
+        (including the overrides of the current context).
+
+        :param cfg: Config instance
+        :return: Frozen config
+        """
+        items = OrderedDict([((), OrderedDict())])  # type: Dict[Tuple, Dict[str, Any]]
+        flat = {}
+        overlay = cfg._get_overlay() or {}
+
+        for path, entry in cfg._config.items():
+            if isinstance(entry, ConfigValue):
+                value = overlay.get(path, entry._val)
+                items[path[:-1]][path[-1]] = flat['.'.join(path)] = freeze_value(value)
+            else:
+                items[path[:-1]][path[-1]] = None
+                items[path] = OrderedDict()
+
+        # Create the sections bottom-up, so subsections exist when creating their parent
+        for path in sorted(items, key=len, reverse=True):
+            if path:
+                items[path[:-1]][path[-1]] = self.types[path](items[path])
+
+        attrs = {}
+        for name, source in self.attrs:
+            if isinstance(source, ComputedValue):
+                attrs[name] = freeze_value(cfg._get_computed(source))
+            else:
+                attrs[name] = flat['.'.join(source)]
+
+        return self.types[()](items[()], attrs, flat)
@@ -0,0 +1,128 @@
+"""
+Export of config schemas as `JSON Schema <https://json-schema.org>`_ documents.
+
+Editors and validators can use the JSON Schema to check config files
+without importing the application that defines the config.
+Validators and hooks cannot be expressed in JSON Schema, so they are not included.
+
+The type of a value is taken from its default value. Cyra casts the values of
+non-strict fields (e.g. ``"8080"`` for an integer), the JSON Schema does not,
+so it is stricter than Cyra itself: it describes the values Cyra would write.
+"""
+from typing import Any, Dict, Optional  # noqa: F401
+import copy
+import datetime
+
+from cyra.core import ConfigBuilder, ConfigEntry, ConfigValue, ConfigMap, LRUCache  # noqa: F401
+
+JSON_SCHEMA_DRAFT = 'http://json-schema.org/draft-07/schema#'
+
+# Generated JSON schemas: Schema fingerprint -> JSON schema
+_cache = LRUCache(32)
+
+
+def _value_type(value):  # type: (Any) -> Dict[str, str]
+    """
+    :param value: Default value
+    :return: JSON schema keywords for the type of the value
+    """
+    # bool is a subclass of int, datetime a subclass of date
+    if isinstance(value, bool):
+        return {'type': 'boolean'}
+    if isinstance(value, int):
+        return {'type': 'integer'}
+    if isinstance(value, float):
+        return {'type': 'number'}
+    if isinstance(value, str):
+        return {'type': 'string'}
+    if isinstance(value, list):
+        return {'type': 'array'}
+    if isinstance(value, dict):
+        return {'type': 'object'}
+    if isinstance(value, datetime.datetime):
+        return {'type': 'string', 'format': 'date-time'}
+    if isinstance(value, datetime.date):
+        return {'type': 'string', 'format': 'date'}
+    if isinstance(value, datetime.time):
+        return {'type': 'string', 'format': 'time'}
+    return {}
+
+
+def _json_value(value):  # type: (Any) -> Any
+    """Convert a default value to JSON data"""
+    if isinstance(value, dict):
+        return {k: _json_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_json_value(v) for v in value]
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def _object_schema(comment=''):  # type: (str) -> Dict[str, Any]
+    schema = {'type': 'object', 'properties': {}}  # type: Dict[str, Any]
+    if comment:
+        schema['description'] = comment
+    return schema
+
+
+def _entry_schema(entry):  # type: (ConfigEntry) -> Dict[str, Any]
+    """
+    :param entry: Config value or section
+    :return: JSON schema of the entry (the properties of sections are added by the caller)
+    """
+    if isinstance(entry, ConfigValue):
+        schema = _value_type(entry._default)
+        schema['default'] = _json_value(entry._default)
+        if entry._comment:
+            schema['description'] = entry._comment
+        return schema
+
+    schema = _object_schema(entry._comment)
+
+    if isinstance(entry, ConfigMap):
+        schema['additionalProperties'] = _tree_schema(entry._schema, _object_schema())
+        del schema['properties']
+    return schema
+
+
+def _tree_schema(config, root):  # type: (Dict[tuple, ConfigEntry], Dict[str, Any]) -> Dict
+    """
+    Add the entries of a config dict to a JSON schema.
+
+    :param config: Config dict: Path -> Config entry (in schema order)
+    :param root: JSON schema of the top-level object
+    :return: JSON schema of the top-level object
+    """
+    objects = {tuple(): root}
+
+    for path, entry in config.items():
+        schema = objects[path] = _entry_schema(entry)
+        objects[path[:-1]]['properties'][path[-1]] = schema
+    return root
+
+
+def json_schema(builder, title=None):  # type: (ConfigBuilder, Optional[str]) -> Dict[str, Any]
+    """
+    Generate a JSON schema for the config files of a config schema.
+
+    Values are described by the type and the value of their default value and by their comment,
+    sections and map sections by objects. The result is cached by the schema fingerprint.
+
+    :param builder: Config builder
+    :param title: Title of the JSON schema (for example the name of the config class)
+    :return: JSON schema (a new copy that may be modified by the caller)
+    """
+    key = (builder.fingerprint(), title)
+    schema = _cache.get(key)
+
+    if schema is None:
+        schema = {'$schema': JSON_SCHEMA_DRAFT}
+        if title:
+            schema['title'] = title
+        schema.update(_object_schema())
+
+        _tree_schema(builder._config, schema)
+        _cache.put(key, schema)
+
+    return copy.deepcopy(schema)
@@ -0,0 +1,305 @@
+"""
+Storage backends for configs.
+
+By default, a config is stored in its TOML file (:class:`TomlFileStorage`).
+For large configs that are edited concurrently by several tools, the :class:`SqliteStorage`
+stores every config value in its own row of a SQLite database::
+
+    cfg = MyConfig(storage=SqliteStorage('config.db'))
+    cfg.load_file()
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union  # noqa: F401
+import json
+import logging
+import datetime
+import sqlite3
+import threading
+import tomlkit
+
+from cyra.core import Config, ConfigValue, ConfigStorage, TomlFileStorage, ErrorReport  # noqa: F401
+from cyra.core import parse_path, _to_base_type
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cyra_values '
+    '(path TEXT PRIMARY KEY, value TEXT, seq INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cyra_values_seq ON cyra_values (seq)',
+    'CREATE TABLE IF NOT EXISTS cyra_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+    "INSERT OR IGNORE INTO cyra_meta (name, value) VALUES ('seq', 0)",
+)
+
+# Tags of the JSON objects storing dates and times (datetime is a subclass of date)
+_DATE_TAGS = (('$datetime', datetime.datetime), ('$date', datetime.date), ('$time', datetime.time))
+
+
+def _encode_default(value):  # type: (Any) -> Dict[str, str]
+    """Encode dates and times as tagged ISO 8601 strings, e.g. ``{"$date": "2020-01-01"}``"""
+    for tag, base in _DATE_TAGS:
+        if isinstance(value, base):
+            return {tag: value.isoformat()}
+    raise TypeError('Object of type %s is not JSON serializable' % type(value).__name__)
+
+
+def _decode_object(obj):  # type: (Dict[str, Any]) -> Any
+    """Decode the dates and times encoded by :func:`_encode_default`"""
+    if len(obj) == 1:
+        for tag, base in _DATE_TAGS:
+            if tag in obj:
+                # ISO 8601 dates and times are valid TOML values
+                return _to_base_type(tomlkit.parse('v = ' + obj[tag])['v'], base)
+    return obj
+
+
+def _encode(value):  # type: (Any) -> str
+    return json.dumps(value, default=_encode_default)
+
+
+def _decode(text):  # type: (str) -> Any
+    return json.loads(text, object_hook=_decode_object)
+
+
+# noinspection PyProtectedMember
+class SqliteStorage(ConfigStorage):
+    """
+    Storage backend that keeps every config value in its own row of a SQLite database.
+
+    Values are stored as JSON (dates and times as tagged ISO 8601 strings,
+    e.g. ``{"$date": "2020-01-01"}``), so they can be read and written individually:
+
+    - :meth:`read` reads a single value without loading the config.
+    - :meth:`load_section` loads the values of one section.
+    - :meth:`Config.save_file` writes only the values that were changed since they were
+      loaded or saved, in a single transaction.
+    - Every write increments the change sequence number of the database.
+      :meth:`reload` compares it to the last sequence number seen by the config
+      and only loads the values that were changed since.
+
+    Removed map section entries are kept as rows without value, so other configs
+    using the database can remove them on reload.
+    Comments and docstrings are not stored.
+    """
+
+    def __init__(self, file):  # type: (str) -> None
+        """
+        :param file: Path of the database file (created if necessary)
+        """
+        self.file = file
+        self._conn = sqlite3.connect(file, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        # Change sequence number of the last load or save
+        self._seq = 0
+        # Dot-separated path -> (Config value, JSON) of the stored value, JSON None if removed
+        self._stored = {}  # type: Dict[str, Tuple[Any, Optional[str]]]
+
+        with self._lock, self._conn:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+
+    def close(self):  # type: () -> None
+        """Close the database connection"""
+        self._conn.close()
+
+    def sequence(self):  # type: () -> int
+        """
+        :return: Change sequence number of the database
+        """
+        with self._lock:
+            return self._sequence()
+
+    def _sequence(self):  # type: () -> int
+        return self._conn.execute("SELECT value FROM cyra_meta WHERE name = 'seq'").fetchone()[0]
+
+    def changed(self):  # type: () -> bool
+        """
+        Check if the database was written since the config was loaded or saved
+        (a single lookup, independent of the size of the config).
+
+        :return: True if the database was changed
+        """
+        return self.sequence() != self._seq
+
+    def read(self, path):  # type: (Union[str, Tuple]) -> Any
+        """
+        Read a single stored config value.
+
+        :param path: Path of the config value (dot-separated or tuple)
+        :return: Stored value
+        :raise KeyError: if the value is not stored in the database
+        """
+        key = '.'.join(parse_path(path))
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM cyra_values WHERE path = ?',
+                                     (key,)).fetchone()
+
+        if row is None or row[0] is None:
+            raise KeyError(key)
+        return _decode(row[0])
+
+    def _query(self, cfg, sql, params, fail_fast, executor):
+        # type: (Config, str, Tuple, bool, Any) -> ErrorReport
+        """
+        Load the values returned by a query into a config.
+
+        :param cfg: Config instance
+        :param sql: Query selecting the path and the JSON value of the rows
+        :param params: Query parameters
+        :return: Error report
+        """
+        with self._lock:
+            seq = self._sequence()
+            rows = self._conn.execute(sql, params).fetchall()
+
+        removed = []
+        items = []
+        stored = {}
+        for key, text in rows:
+            if text is None:
+                removed.append(key)
+            else:
+                value = _decode(text)
+                items.append((key, value))
+                stored[key] = (value, text)
+
+        logging.info('Cyra is reading %d values from %s' % (len(rows), self.file))
+        report = cfg.ingest(items, fail_fast, executor)
+
+        # Unknown keys are kept in the database
+        for key in report.unknown_keys:
+            stored.pop(key, None)
+        self._stored.update(stored)
+
+        for key in removed:
+            self._stored[key] = (None, None)
+        self._remove_entries(cfg, removed)
+        self._seq = max(self._seq, seq)
+        return report
+
+    @staticmethod
+    def _remove_entries(cfg, keys):  # type: (Config, Iterable[str]) -> None
+        """Remove the map section entries of removed values from a config"""
+        for key in keys:
+            map_entry = cfg._find_map_entry(parse_path(key))
+            if map_entry is not None:
+                cfg._remove_map_entry(*map_entry)
+
+    def load(self, cfg, update=True, fail_fast=False, release_toml=False, executor=None):
+        # type: (Config, bool, bool, bool, Any) -> ErrorReport
+        report = self._query(cfg, 'SELECT path, value FROM cyra_values', (), fail_fast, executor)
+
+        if update and not report.rolled_back:
+            self.save(cfg, True)
+        return report
+
+    def load_section(self, cfg, section, fail_fast=False, executor=None):
+        # type: (Config, Union[str, Tuple], bool, Any) -> ErrorReport
+        """
+        Load the stored values of a section (using the primary key index of the database).
+
+        :param cfg: Config instance
+        :param section: Path of the section (dot-separated or tuple)
+        :param fail_fast: Strict mode: raise a :class:`ConfigValueError` on the first
+                          invalid value instead of falling back to the default value
+        :param executor: Run validators and hooks concurrently in this executor
+        :return: Error report
+        """
+        prefix = '.'.join(parse_path(section))
+        # All paths starting with 'prefix.' ('/' follows '.' in the ASCII table)
+        return self._query(cfg, 'SELECT path, value FROM cyra_values WHERE path >= ? AND path < ?',
+                           (prefix + '.', prefix + '/'), fail_fast, executor)
+
+    def reload(self, cfg, fail_fast=False, executor=None):
+        # type: (Config, bool, Any) -> Optional[ErrorReport]
+        """
+        Load the values that were written to the database since the config
+        was loaded or saved.
+
+        :param cfg: Config instance
+        :param fail_fast: Strict mode: raise a :class:`ConfigValueError` on the first
+                          invalid value instead of falling back to the default value
+        :param executor: Run validators and hooks concurrently in this executor
+        :return: Error report, None if the database was not changed
+        """
+        if not self.changed():
+            return None
+        return self._query(cfg, 'SELECT path, value FROM cyra_values WHERE seq > ? ORDER BY seq',
+                           (self._seq,), fail_fast, executor)
+
+    def _get_changes(self, cfg):  # type: (Config) -> Tuple[List, List, Dict]
+        """
+        Compare the config values to the stored values.
+
+        Values that were not loaded are only written if they are missing in the database
+        or differ from their default value, so a partially loaded config does not
+        overwrite the values of other sections.
+
+        :param cfg: Config instance
+        :return: Rows to be replaced, rows to be inserted if missing
+                 (tuples: dot-separated path, JSON value), updates of the stored values
+                 (applied once the rows were written)
+        """
+        replace = []
+        insert = []
+        updates = {}  # type: Dict[str, Tuple[Any, Optional[str]]]
+        keys = set()  # type: Set[str]
+
+        for entry in cfg._config.values():
+            if not isinstance(entry, ConfigValue):
+                continue
+
+            key = '.'.join(entry._path)
+            keys.add(key)
+            value = entry._val
+            stored = self._stored.get(key)
+
+            if stored is not None and stored[0] is value:
+                continue
+
+            text = _encode(value)
+            if stored is not None:
+                if stored[1] != text:
+                    replace.append((key, text))
+            elif value == entry._default:
+                insert.append((key, text))
+            else:
+                replace.append((key, text))
+
+            updates[key] = (value, text)
+
+        for key, (_, text) in self._stored.items():
+            if text is not None and key not in keys:
+                replace.append((key, None))
+                updates[key] = (None, None)
+
+        return replace, insert, updates
+
+    def save(self, cfg, force=False):  # type: (Config, bool) -> bool
+        if not (cfg._modified or force):
+            return False
+
+        replace, insert, updates = self._get_changes(cfg)
+        if not replace and not insert:
+            self._stored.update(updates)
+            cfg._modified = False
+            return True
+
+        logging.info('Cyra is writing %d values to %s' % (len(replace) + len(insert), self.file))
+
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE cyra_meta SET value = value + 1 WHERE name = 'seq'")
+            seq = self._sequence()
+
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO cyra_values (path, value, seq) VALUES (?, ?, ?)',
+                [(key, text, seq) for key, text in replace])
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO cyra_values (path, value, seq) VALUES (?, ?, ?)',
+                [(key, text, seq) for key, text in insert])
+
+        # The changes are only marked as saved once the transaction was committed
+        self._stored.update(updates)
+        cfg._modified = False
+
+        # Changes of other writers since the last load are picked up by the next reload
+        if self._seq == seq - 1:
+            self._seq = seq
+        return True
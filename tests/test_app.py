@@ -3,8 +3,11 @@ import os
 import shutil
 from collections import OrderedDict
 
+import tomlkit
+
 import tests
 import cyra
+import cyra.core
 
 
 def hook_function(val):
@@ -94,6 +97,14 @@ class TestApplication(unittest.TestCase):
         cfg.load_file()
         tests.assert_files_equal(self, os.path.join(tests.DIR_TESTFILES, 'appcfg.toml'), self.cfg_file)
 
+    def test_emitter(self):
+        cfg = Cfg('')
+        cfg.msg = 'I am Cyra'
+        cfg.users_a = ['ThetaDev', 'Clary', 'Cyra']
+
+        exp_res = cyra.Config._config_to_toml(cfg._config, tomlkit.document())
+        self.assertEqual(exp_res, cyra.core.TomlEmitter(cfg._config).dumps())
+
     def test_load_config(self):
         shutil.copyfile(os.path.join(tests.DIR_TESTFILES, 'appcfg_import.toml'), self.cfg_file)
 
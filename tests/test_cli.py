@@ -0,0 +1,147 @@
+import unittest
+import os
+import json
+import shutil
+import runpy
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import tests
+import cyra.cli
+from tests.test_core import Cfg
+
+CFG_PATH = 'tests.test_core.Cfg'
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tests.tmpdir()
+        self.valid_file = os.path.join(self.tmpdir.name, 'valid.toml')
+        self.invalid_file = os.path.join(self.tmpdir.name, 'invalid.toml')
+
+        shutil.copyfile(os.path.join(tests.DIR_TESTFILES, 'testcfg_import.toml'), self.valid_file)
+        with open(self.invalid_file, 'w') as f:
+            f.write('[DATABASE]\nport = "not a number"\n')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_cli(self, *args):
+        with patch('sys.stdout', new_callable=StringIO) as stdout, \
+                patch('sys.stderr', new_callable=StringIO) as stderr:
+            code = cyra.cli.main(list(args))
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def test_validate(self):
+        code, out, _ = self.run_cli('validate', CFG_PATH, self.valid_file, '-j', '1')
+        self.assertEqual(0, code)
+        self.assertEqual('OK   %s\n1 files, 0 failed\n' % self.valid_file, out)
+
+        code, out, _ = self.run_cli('validate', CFG_PATH, self.valid_file, self.invalid_file,
+                                    os.path.join(self.tmpdir.name, 'missing.toml'), '--timing')
+        self.assertEqual(1, code)
+        lines = out.splitlines()
+        self.assertTrue(lines[0].startswith('OK   %s (' % self.valid_file))
+        self.assertTrue(lines[1].startswith('FAIL %s (' % self.invalid_file))
+        self.assertIn("value 'not a number' for field [DATABASE.port]", lines[2])
+        self.assertIn('No such file', lines[4])
+        self.assertEqual('3 files, 2 failed', lines[-1])
+
+    def test_unknown_extension(self):
+        # Files with unknown extensions are read as TOML
+        cfg_file = os.path.join(self.tmpdir.name, 'valid.cfg')
+        shutil.copyfile(self.valid_file, cfg_file)
+
+        code, out, _ = self.run_cli('validate', CFG_PATH, cfg_file, '-j', '1')
+        self.assertEqual(0, code)
+        self.assertEqual('OK   %s\n1 files, 0 failed\n' % cfg_file, out)
+
+    def test_main(self):
+        # Importing the module does not run the CLI
+        runpy.run_module('cyra')
+
+        with patch('sys.argv', ['cyra', 'validate', CFG_PATH, self.valid_file, '-j', '1']), \
+                patch('sys.stdout', new_callable=StringIO) as stdout:
+            with self.assertRaises(SystemExit) as ctx:
+                runpy.run_module('cyra', run_name='__main__')
+        self.assertEqual(0, ctx.exception.code)
+        self.assertIn('1 files, 0 failed', stdout.getvalue())
+
+    def test_json_report(self):
+        code, out, _ = self.run_cli('validate', CFG_PATH, self.invalid_file, self.valid_file,
+                                    '--json', '-j', '2')
+        self.assertEqual(1, code)
+
+        report = json.loads(out)
+        self.assertEqual(CFG_PATH, report['config'])
+        self.assertEqual('validate', report['command'])
+        self.assertEqual(2, report['n_files'])
+        self.assertEqual(1, report['n_failed'])
+        self.assertEqual([self.invalid_file, self.valid_file],
+                         [res['file'] for res in report['files']])
+        self.assertEqual(1, len(report['files'][0]['errors']))
+        self.assertTrue(report['files'][1]['ok'])
+
+    def test_normalize(self):
+        code, _, _ = self.run_cli('normalize', CFG_PATH, self.valid_file, self.invalid_file)
+        self.assertEqual(1, code)
+
+        tests.assert_files_equal(self, os.path.join(tests.DIR_TESTFILES, 'testcfg_writeback.toml'),
+                                 self.valid_file)
+
+        # Invalid files are not written
+        with open(self.invalid_file, 'r') as f:
+            self.assertEqual('[DATABASE]\nport = "not a number"\n', f.read())
+
+    def test_convert(self):
+        out_dir = os.path.join(self.tmpdir.name, 'out')
+        os.mkdir(out_dir)
+
+        code, out, _ = self.run_cli('convert', CFG_PATH, self.valid_file, '--to', 'json',
+                                    '-o', out_dir)
+        self.assertEqual(0, code)
+        json_file = os.path.join(out_dir, 'valid.json')
+        self.assertIn('-> ' + json_file, out)
+
+        code, _, _ = self.run_cli('convert', CFG_PATH, json_file, '--to', 'binary')
+        self.assertEqual(0, code)
+
+        code, _, _ = self.run_cli('convert', CFG_PATH, os.path.join(out_dir, 'valid.bin'),
+                                  '--to', 'toml')
+        self.assertEqual(0, code)
+
+        cfg = Cfg(os.path.join(out_dir, 'valid.toml'))
+        cfg.load_file(False)
+        self.assertEqual('Okay? Okay.', cfg.MSG)
+        self.assertEqual('very_secret_password', cfg.PASSWORD)
+
+    def test_schema(self):
+        code, out, _ = self.run_cli('schema', CFG_PATH)
+        self.assertEqual(0, code)
+
+        schema = json.loads(out)
+        self.assertEqual('Cfg', schema['title'])
+        self.assertEqual(1443, schema['properties']['DATABASE']['properties']['port']['default'])
+
+        schema_file = os.path.join(self.tmpdir.name, 'schema.json')
+        code, out, _ = self.run_cli('schema', CFG_PATH, '-o', schema_file)
+        self.assertEqual(0, code)
+        self.assertEqual('', out)
+        with open(schema_file, 'r') as f:
+            self.assertEqual(schema, json.load(f))
+
+    def test_bad_class(self):
+        for cfg_path in ('Cfg', 'tests.nothing.Cfg', 'tests.test_core.Nothing',
+                         'tests.test_core.TestConfig'):
+            code, out, err = self.run_cli('validate', cfg_path, self.valid_file)
+            self.assertEqual(2, code)
+            self.assertEqual('', out)
+            self.assertTrue(err.startswith('Could not import config class %s' % cfg_path))
@@ -1,14 +1,31 @@
 import unittest
 import copy
+import json
+import pickle
 from collections import OrderedDict
 
+try:
+    from unittest.mock import patch, Mock
+except ImportError:
+    from mock import patch, Mock
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
 import tomlkit
 import os
+import time
 import shutil
+import datetime
 
 import tests
 import cyra
 import cyra.core
+import cyra.autosave
 
 
 class TestDictUtil(unittest.TestCase):
@@ -185,6 +202,244 @@ keyB2 = ["VB2a", "VB2b"]
         cfg = cyra.Config('', builder)
         self.assertEqual(exp_res, cfg.export_toml())
 
+    def test_fingerprint(self):
+        def make_builder(default):
+            builder = cyra.core.ConfigBuilder()
+            builder.comment('Cyra says hello')
+            builder.define('msg', 'Hello World')
+            builder.push('DATABASE')
+            builder.define('port', default)
+            return builder
+
+        builder = make_builder(1443)
+        fingerprint = builder.fingerprint()
+
+        self.assertEqual(fingerprint, make_builder(1443).fingerprint())
+        self.assertNotEqual(fingerprint, make_builder(1444).fingerprint())
+        self.assertNotEqual(fingerprint, make_builder('1443').fingerprint())
+
+        builder.define('user', 'admin')
+        self.assertNotEqual(fingerprint, builder.fingerprint())
+
+    def test_build_shared(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.comment('Section')
+        builder.push('SECTION')
+        builder.comment('List value')
+        builder.define('list', ['a', 'b'])
+        builder.pop()
+
+        config1 = builder.build()
+        config2 = builder.build()
+
+        # Sections are shared with the schema
+        self.assertIs(builder._config[('SECTION',)], config1[('SECTION',)])
+
+        # Values share the schema data, but hold their own value
+        val1 = config1[('SECTION', 'list')]
+        val2 = config2[('SECTION', 'list')]
+        self.assertIsNot(val1, val2)
+        self.assertIs(val1._comment, val2._comment)
+        self.assertIs(val1._path, val2._path)
+        self.assertIsNot(val1._val, val2._val)
+
+        val1._val.append('c')
+        self.assertEqual(['a', 'b'], val2._val)
+        self.assertEqual(['a', 'b'], val1._default)
+
+        # Fallback values are copies of the default value
+        val1._val = 5
+        val1._val.append('c')
+        self.assertEqual(['a', 'b'], val1._default)
+
+        self.assertFalse(hasattr(val1, '__dict__'))
+
+    def test_interned_keys(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.push(''.join(['SEC', 'TION']))
+        builder.comment(''.join(['Com', 'ment']))
+        val = builder.define(''.join(['val', 'ue']), 1)
+
+        self.assertIs('SECTION', val._path[0])
+        self.assertIs('value', val._path[1])
+        self.assertIs('Comment', val._comment)
+
+    def test_compile(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.define('msg', 'Hello World')
+        builder.push('DATABASE')
+        builder.define('port', 1443)
+
+        compiled = builder.compile()
+        self.assertIs(compiled, builder.compile())
+        self.assertEqual(3, compiled.size)
+        self.assertIn("e[2]._set(v, report)", compiled.source)
+
+        # Modifying the schema invalidates the compiled schema
+        cfg = cyra.Config('', builder)
+        builder.define('user', 'admin')
+        self.assertIsNone(builder._compiled)
+        self.assertIsNot(compiled, builder.compile())
+
+        # Instances built from an older version of the schema use the generic implementation
+        self.assertIsNone(cfg._get_compiled())
+
+        with patch('cyra.codegen.compile', create=True, side_effect=SyntaxError('too deep')):
+            builder.define('x', 1)
+            self.assertRaises(ValueError, builder.compile)
+
+    def test_constraint(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.push('POOL')
+        builder.define('min', 1)
+        builder.define('max', 10)
+        builder.pop()
+
+        constraint = builder.constraint(['POOL.min', ('POOL', 'max')], lambda lo, hi: lo <= hi)
+        self.assertEqual((('POOL', 'min'), ('POOL', 'max')), constraint.sources)
+        self.assertEqual([constraint], builder._dependents[('POOL', 'min')])
+        self.assertEqual([constraint], builder._dependents[('POOL', 'max')])
+
+        # Sources must be config values
+        self.assertRaises(ValueError, builder.constraint, ['POOL'], bool)
+        self.assertRaises(ValueError, builder.constraint, ['POOL.nothing'], bool)
+
+        # Default values must fulfill the constraint
+        self.assertRaises(ValueError, builder.constraint, ['POOL.min', 'POOL.max'],
+                          lambda lo, hi: lo > hi)
+        self.assertRaises(ValueError, builder.constraint, ['POOL.min'], lambda lo: 1 / 0)
+
+    def test_push_map(self):
+        builder = cyra.core.ConfigBuilder()
+        hosts = builder.push_map('HOSTS')
+        builder.define('ip', '0.0.0.0')
+        builder.push('AUTH')
+        builder.define('user', 'admin')
+        self.assertRaises(ValueError, builder.push_map, 'MAP')
+        builder.pop(2)
+        builder.define('msg', 'Hello')
+
+        self.assertIs(hosts, builder._maps[('HOSTS',)])
+        self.assertEqual([('HOSTS',), ('msg',)], list(builder._config))
+        self.assertEqual([('ip',), ('AUTH',), ('AUTH', 'user')], list(hosts._schema))
+        self.assertEqual(('HOSTS', '*', 'AUTH', 'user'), hosts._schema[('AUTH', 'user')]._path)
+
+        # Map entries are part of the schema fingerprint
+        fingerprint = builder.fingerprint()
+        builder.push_map('MAP')
+        builder.define('val', 1)
+        self.assertNotEqual(fingerprint, builder.fingerprint())
+
+        self.assertRaises(ValueError, builder.push_map, 'HOSTS')
+        builder.pop()
+        self.assertRaises(ValueError, builder.push_map, 'msg')
+        self.assertRaises(ValueError, builder.compile)
+
+        cfg = cyra.Config('', builder)
+        report = cfg.ingest([('MAP.a.val', 2), ('HOSTS.b.AUTH.user', 'root'), ('other.c.val', 1)])
+        self.assertEqual(['other.c.val'], report.unknown_keys)
+        self.assertEqual(2, cfg.get('MAP.a.val'))
+        self.assertEqual('root', cfg.get('HOSTS.b.AUTH.user'))
+
+    def test_include(self):
+        template = cyra.core.ConfigBuilder()
+        template.comment('Server address')
+        server = template.define('server', 'localhost')
+        template.push('AUTH')
+        template.define('port', 1443, validator=is_positive, memoize=True)
+        template.pop()
+
+        builder = cyra.core.ConfigBuilder()
+        builder.comment('Main database')
+        main = builder.include('MAIN', template)
+        backup = builder.include('BACKUP', template)
+        builder.push_map('HOSTS')
+        builder.include('DB', template)
+        builder.pop()
+
+        self.assertEqual(['server', 'AUTH.port'], list(main))
+        self.assertEqual(('BACKUP', 'AUTH', 'port'), backup['AUTH.port']._path)
+        self.assertEqual('Main database', builder._config[('MAIN',)]._comment)
+        self.assertEqual([('MAIN',), ('MAIN', 'server'), ('MAIN', 'AUTH'), ('MAIN', 'AUTH', 'port'),
+                          ('BACKUP',), ('BACKUP', 'server'), ('BACKUP', 'AUTH'),
+                          ('BACKUP', 'AUTH', 'port'), ('HOSTS',)], list(builder._config))
+        self.assertEqual([('DB',), ('DB', 'server'), ('DB', 'AUTH'), ('DB', 'AUTH', 'port')],
+                         list(builder._maps[('HOSTS',)]._schema))
+
+        # Comments, validators and caches are shared with the template
+        self.assertIs(server._comment, backup['server']._comment)
+        self.assertIs(main['AUTH.port']._validator, backup['AUTH.port']._validator)
+        self.assertIs(main['AUTH.port']._memo, backup['AUTH.port']._memo)
+
+        cfg = cyra.Config('', builder)
+        cfg.section('BACKUP.AUTH')['port'] = -1
+        self.assertEqual(1443, cfg.get('BACKUP.AUTH.port'))
+        cfg.section('MAIN.AUTH')['port'] = 3306
+        self.assertEqual(3306, cfg.get('MAIN.AUTH.port'))
+        self.assertEqual(1443, cfg.get('BACKUP.AUTH.port'))
+
+        self.assertRaises(ValueError, builder.include, 'MAIN', template)
+        template.push_map('MAP')
+        self.assertRaises(ValueError, builder.include, 'OTHER', template)
+
+    def test_json_schema(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.comment('Cyra says hello')
+        builder.define('msg', 'Hello World')
+        builder.push('DATABASE')
+        builder.define('port', 1443)
+        builder.define('timeout', 1.5)
+        builder.define('enable', True)
+        builder.define('users', ['admin'])
+        builder.define('created', datetime.date(2020, 1, 1), strict=True)
+        builder.define('updated', datetime.datetime(2020, 1, 1, 12, 30), strict=True)
+        builder.define('backup', datetime.time(3, 0), strict=True)
+        builder.define('options', {'retry': {'count': 3}}, strict=True)
+        builder.define('version', (1, 0), strict=True)
+        builder.pop()
+        builder.push_map('HOSTS')
+        builder.define('ip', '0.0.0.0')
+        builder.pop()
+
+        schema = builder.json_schema('Cfg')
+        self.assertEqual('http://json-schema.org/draft-07/schema#', schema['$schema'])
+        self.assertEqual('Cfg', schema['title'])
+        self.assertEqual('object', schema['type'])
+        self.assertEqual(['msg', 'DATABASE', 'HOSTS'], list(schema['properties']))
+        self.assertEqual({'type': 'string', 'default': 'Hello World',
+                          'description': 'Cyra says hello'}, schema['properties']['msg'])
+
+        db = schema['properties']['DATABASE']['properties']
+        self.assertEqual({'type': 'integer', 'default': 1443}, db['port'])
+        self.assertEqual('number', db['timeout']['type'])
+        self.assertEqual('boolean', db['enable']['type'])
+        self.assertEqual({'type': 'array', 'default': ['admin']}, db['users'])
+        self.assertEqual({'type': 'string', 'format': 'date', 'default': '2020-01-01'},
+                         db['created'])
+        self.assertEqual({'type': 'string', 'format': 'date-time',
+                          'default': '2020-01-01T12:30:00'}, db['updated'])
+        self.assertEqual({'type': 'string', 'format': 'time', 'default': '03:00:00'},
+                         db['backup'])
+        self.assertEqual({'type': 'object', 'default': {'retry': {'count': 3}}}, db['options'])
+        # Values of other types only have a default value
+        self.assertEqual({'default': (1, 0)}, db['version'])
+
+        hosts = schema['properties']['HOSTS']
+        self.assertNotIn('properties', hosts)
+        self.assertEqual({'ip': {'type': 'string', 'default': '0.0.0.0'}},
+                         hosts['additionalProperties']['properties'])
+
+        # The schema is cached, returned schemas can be modified
+        schema['properties'].clear()
+        with patch('cyra.schema._tree_schema') as tree_schema:
+            self.assertEqual(['msg', 'DATABASE', 'HOSTS'],
+                             list(builder.json_schema('Cfg')['properties']))
+        tree_schema.assert_not_called()
+
+        builder.define('msg2', 'Bye')
+        self.assertIn('msg2', builder.json_schema('Cfg')['properties'])
+        self.assertNotIn('title', builder.json_schema())
+
     def test_build_faulty_config(self):
         builder = cyra.core.ConfigBuilder()
         builder.define('key1', 'val1')
@@ -256,6 +511,125 @@ class TestConfigValue(unittest.TestCase):
         hookval._val = 'forbidden'
         self.assertEqual('dval', hookval._val)
 
+    def test_error_report(self):
+        intval = cyra.core.ConfigValue(default=16, path=('DATABASE', 'port'))
+        report = cyra.core.ErrorReport()
+
+        intval._set('hello', report)
+        self.assertEqual(16, intval._val)
+
+        self.assertEqual(1, len(report))
+        error = report.errors[0]
+        self.assertEqual(('DATABASE', 'port'), error.path)
+        self.assertEqual('could not be cast to (int)', error.reason)
+        self.assertEqual('hello', error.value)
+        self.assertEqual("Cyra config value 'hello' for field [DATABASE.port] could not be cast "
+                         "to (int). Falling back to default value 16.", str(error))
+
+    def test_error_value_truncated(self):
+        listval = cyra.core.ConfigValue(default=['a'], path=('users',),
+                                        validator=lambda x: len(x) < 100)
+        report = cyra.core.ErrorReport()
+
+        listval._set(['user%d' % i for i in range(1000)], report)
+        self.assertEqual(['a'], listval._val)
+
+        error = report.errors[0]
+        self.assertEqual(1000, len(error.value))
+        self.assertEqual("['user0', 'user1', 'user2', 'user3', 'user4', ...]", error.value_repr)
+        self.assertLess(len(str(error)), 200)
+
+    def test_error_fail_fast(self):
+        report = cyra.core.ErrorReport(fail_fast=True)
+
+        with self.assertRaises(cyra.ConfigValueError) as ctx:
+            self.cval._set('forbidden', report)
+
+        self.assertEqual('is invalid', ctx.exception.reason)
+        self.assertEqual('val1', self.cval._val)
+
+    def test_memoize(self):
+        calls = []
+
+        def hook_function(val):
+            calls.append(val)
+            return val.upper()
+
+        builder = cyra.core.ConfigBuilder()
+        builder.define('key', 'dval', hook=hook_function, memoize=True)
+        cfg1 = cyra.Config('', builder)
+        cfg2 = cyra.Config('', builder)
+
+        cfg1._config[('key',)]._val = 'v1'
+        cfg2._config[('key',)]._val = 'v1'
+        cfg2._config[('key',)]._val = 'v2'
+
+        self.assertEqual('V1', cfg1._config[('key',)]._val)
+        self.assertEqual('V2', cfg2._config[('key',)]._val)
+        # Default value check + v1 + v2
+        self.assertEqual(['dval', 'v1', 'v2'], calls)
+
+    def test_memoize_invalid(self):
+        calls = []
+
+        def validator(val):
+            calls.append(val)
+            return val != 'forbidden'
+
+        memoval = cyra.core.ConfigValue(default='dval', validator=validator, memoize=True)
+        report = cyra.core.ErrorReport()
+
+        memoval._set('forbidden', report)
+        memoval._set('forbidden', report)
+
+        self.assertEqual('dval', memoval._val)
+        self.assertEqual(2, len(report))
+        self.assertEqual(['dval', 'forbidden'], calls)
+
+    def test_memoize_eviction(self):
+        calls = []
+
+        def validator(val):
+            calls.append(val)
+            return True
+
+        memoval = cyra.core.ConfigValue(default=0, validator=validator, memoize=2)
+
+        for v in (1, 2, 1, 3, 1, 2):
+            memoval._val = v
+
+        # 2 is evicted when 3 is added since 1 was used more recently
+        self.assertEqual([0, 1, 2, 3, 2], calls)
+        self.assertEqual(2, len(memoval._memo))
+
+        memoval._memo.clear()
+        self.assertEqual(0, len(memoval._memo))
+        memoval._val = 1
+        self.assertEqual([0, 1, 2, 3, 2, 1], calls)
+
+    def test_memoize_containers(self):
+        calls = []
+
+        def hook_function(val):
+            calls.append(val)
+            return val
+
+        memoval = cyra.core.ConfigValue(default={'a': [1]}, hook=hook_function, memoize=True)
+
+        memoval._val = {'a': [1, 2]}
+        res1 = memoval._val
+        memoval._val = {'a': [1, 2]}
+        res2 = memoval._val
+
+        self.assertEqual(2, len(calls))
+        self.assertEqual(res1, res2)
+        self.assertIsNot(res1, res2)
+
+        # Unhashable values are not cached
+        setval = cyra.core.ConfigValue(default={1}, hook=hook_function, memoize=True)
+        setval._val = {2}
+        self.assertEqual(0, len(setval._memo))
+
     def test_bad_hook(self):
         def hook_function(val):
             if val == 'forbidden':
@@ -266,6 +640,74 @@ class TestConfigValue(unittest.TestCase):
                           default='forbidden', hook=hook_function)
 
 
+def is_positive(value):
+    return value > 0
+
+
+def normalize_name(value):
+    if not value:
+        raise ValueError('Empty name')
+    return value.lower()
+
+
+class CheckedCfg(cyra.Config):
+    builder = cyra.core.ConfigBuilder()
+
+    builder.push('A')
+    PORT = builder.define('port', 1443, validator=is_positive)
+    NAME = builder.define('name', 'cyra', hook=normalize_name, memoize=True)
+    builder.pop()
+    LIST = builder.define('list', [1, 2], hook=sorted, memoize=True)
+    PLAIN = builder.define('plain', 'value')
+
+
+def make_dsn(server, port, username):
+    return 'sql://%s@%s:%d' % (username, server, port)
+
+
+class ComputedCfg(cyra.Config):
+    builder = cyra.core.ConfigBuilder()
+
+    builder.push('DATABASE')
+    SERVER = builder.define('server', '192.168.1.1')
+    PORT = builder.define('port', 1443)
+    USERNAME = builder.define('username', 'admin')
+    builder.pop()
+    NAME = builder.define('name', 'cyra')
+
+    DSN = builder.computed(['DATABASE.server', 'DATABASE.port', 'DATABASE.username'],
+                           Mock(side_effect=make_dsn))
+
+
+class PoolCfg(cyra.Config):
+    builder = cyra.core.ConfigBuilder()
+
+    builder.push('POOL')
+    MIN = builder.define('min', 1)
+    MAX = builder.define('max', 10)
+    builder.pop()
+    builder.push('TLS')
+    CERT = builder.define('cert', '')
+    KEY = builder.define('key', '')
+    builder.pop()
+    NAME = builder.define('name', 'pool')
+
+    builder.constraint(['POOL.min', 'POOL.max'], lambda lo, hi: lo <= hi, 'min <= max')
+    builder.constraint(['TLS.cert', 'TLS.key'], lambda cert, key: bool(cert) == bool(key),
+                       'cert and key required together')
+
+
+class MapCfg(cyra.Config):
+    builder = cyra.core.ConfigBuilder()
+
+    NAME = builder.define('name', 'monitor')
+    builder.comment('Monitored hosts')
+    HOSTS = builder.push_map('HOSTS')
+    builder.define('ip', '0.0.0.0')
+    builder.define('port', 80, validator=is_positive)
+    builder.pop()
+
+
 class Cfg(cyra.Config):
     """DSTRING: Begin"""
 
@@ -318,6 +760,52 @@ class TestConfig(unittest.TestCase):
         self.assertRaises(ValueError, cyra.core.Config._set_toml_entry, toml, tuple(),
                           cyra.core.ConfigValue('Comment1', 'val1'))
 
+    def test_emitter(self):
+        builder = cyra.core.ConfigBuilder()
+
+        builder.comment('Section defined first')
+        builder.push('SECTION')
+        builder.push('SUBSECTION')
+        builder.define('sub_val', 1.5)
+        builder.pop()
+        builder.comment('# Value defined after a subsection')
+        builder.define('val', [1, 2, 3])
+        builder.pop()
+
+        builder.comment('Value defined after a section')
+        builder.define('key with spaces', 'Quotes "" and \\ backslashes')
+        builder.define('DICT', OrderedDict([('sub', {'key': 'v'}), ('key', 'v'), ('empty', {})]))
+        builder.push('EMPTY')
+        builder.pop()
+
+        config = cyra.Config('', builder)._config
+        exp_res = cyra.Config._config_to_toml(config, tomlkit.document())
+
+        self.assertEqual(exp_res, cyra.core.TomlEmitter(config).dumps())
+
+        # Blocks without their section entry
+        partial = OrderedDict((p, e) for p, e in config.items() if len(p) > 1)
+        exp_res = cyra.Config._config_to_toml(partial, tomlkit.document())
+
+        self.assertEqual(exp_res, cyra.core.TomlEmitter(partial).dumps())
+
+    def test_emitter_aot(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.define('servers', [{'ip': '10.0.0.1'}, {'ip': '10.0.0.2'}])
+        config = cyra.Config('', builder)
+
+        self.assertRaises(ValueError, cyra.core.TomlEmitter, config._config)
+        self.assertEqual('[[servers]]\nip = "10.0.0.1"\n\n[[servers]]\nip = "10.0.0.2"\n',
+                         config.export_toml())
+
+        # Docblocks fall back to tomlkit as well
+        builder.docstring('Servers')
+        builder.define('msg', 'Hello')
+        doc_blocks = cyra.Config('', builder).get_docblocks()
+        self.assertEqual('[[servers]]\nip = "10.0.0.1"\n\n[[servers]]\nip = "10.0.0.2"\n',
+                         doc_blocks[0][1])
+        self.assertEqual(('Servers', 'msg = "Hello"\n'), doc_blocks[1])
+
     def test_load_dict(self):
         dic = {
             'msg': 'Okay? Okay.',
@@ -331,6 +819,23 @@ class TestConfig(unittest.TestCase):
         self.assertEqual('Okay? Okay.', self.cfg.MSG)
         self.assertEqual('very_secret_password', self.cfg.PASSWORD)
 
+    def test_iter_toml(self):
+        # New config: one chunk per table header and value
+        chunks = list(self.cfg.iter_toml())
+        self.assertEqual(8, len(chunks))
+        self.assertEqual('msg = "Hello World" # Cyra says hello\n', chunks[0])
+        self.assertEqual(self.cfg.export_toml(), ''.join(chunks))
+
+        # Imported document: one chunk per top-level item
+        self.cfg.load_toml('# Header\nmsg = "Okay? Okay."\n\n[DATABASE]\nport = 1234\n')
+        chunks = list(self.cfg.iter_toml())
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(tomlkit.dumps(self.cfg._toml), ''.join(chunks))
+
+        f = StringIO()
+        self.cfg.write_toml(f)
+        self.assertEqual(self.cfg.export_toml(), f.getvalue())
+
     def test_load_export_toml(self):
         toml_str = """
 msg = "Okay? Okay." # Are we ok?
@@ -358,6 +863,316 @@ enable = true # DB connection enabled
 
         self.assertEqual(exp_res, self.cfg.export_toml())
 
+    def test_load_toml_errors(self):
+        toml_str = """
+msg = "Okay? Okay."
+
+[DATABASE]
+port = "not a number"
+"""
+        report = self.cfg.load_toml(toml_str)
+
+        self.assertEqual('Okay? Okay.', self.cfg.MSG)
+        self.assertEqual(1443, self.cfg.PORT)
+        self.assertEqual([('DATABASE', 'port')], [e.path for e in report])
+        self.assertTrue(report)
+
+        report = self.cfg.load_toml('msg = "Fine"')
+        self.assertFalse(report)
+
+    def test_load_toml_fail_fast(self):
+        toml_str = """
+[DATABASE]
+port = "not a number"
+"""
+        self.assertRaises(cyra.ConfigValueError, self.cfg.load_toml, toml_str, True)
+
+    def test_fail_fast_rollback(self):
+        self.cfg.load_toml('msg = "Old"\n')
+        old_toml = self.cfg._toml
+
+        # Values imported before the invalid value are restored
+        toml_str = 'msg = "New"\n\n[DATABASE]\nport = "not a number"\n'
+        self.assertRaises(cyra.ConfigValueError, self.cfg.load_toml, toml_str, True)
+        self.assertEqual('Old', self.cfg.MSG)
+        self.assertIs(old_toml, self.cfg._toml)
+
+        flat_dict = {'msg': 'New', 'DATABASE.port': 'not a number'}
+        self.assertRaises(cyra.ConfigValueError, self.cfg.load_flat_dict, flat_dict, True)
+        self.assertEqual('Old', self.cfg.MSG)
+
+        items = [('msg', 'New'), ('DATABASE.port', 'not a number')]
+        self.assertRaises(cyra.ConfigValueError, self.cfg.ingest, items, True)
+        self.assertEqual('Old', self.cfg.MSG)
+
+        diff = [cyra.ConfigChange(('msg',), 'Old', 'New'),
+                cyra.ConfigChange(('DATABASE', 'port'), 1443, 'not a number')]
+        self.assertRaises(cyra.ConfigValueError, self.cfg.apply_diff, diff, fail_fast=True)
+        self.assertEqual('Old', self.cfg.MSG)
+        self.assertEqual(1443, self.cfg.PORT)
+
+    def test_error_log_limit(self):
+        report = cyra.core.ErrorReport()
+        intval = cyra.core.ConfigValue(default=0)
+
+        with patch('cyra.core.logging.error') as mock_logger:
+            for _ in range(25):
+                intval._set('nan', report)
+            report.finish()
+
+        self.assertEqual(25, len(report))
+        self.assertEqual(report.log_limit + 1, mock_logger.call_count)
+        self.assertEqual(('Cyra suppressed %d more config value errors.', 15),
+                         mock_logger.call_args[0])
+
+    def test_load_export_json(self):
+        json_str = '{"msg": "Okay? Okay.", "DATABASE": {"port": "1234", "enable": false}}'
+
+        report = self.cfg.load_json(json_str)
+
+        self.assertFalse(report)
+        self.assertEqual('Okay? Okay.', self.cfg.MSG)
+        self.assertEqual(1234, self.cfg.PORT)
+        self.assertFalse(self.cfg.ENABLE)
+
+        exp_res = '{"msg": "Okay? Okay.", "DATABASE": {"server": "192.168.1.1", "port": 1234, ' \
+                  '"username": "admin", "password": "my_secret_password", "enable": false}, ' \
+                  '"msg2": "Bye bye, World"}'
+        self.assertEqual(exp_res, self.cfg.export_json())
+
+        cfg2 = Cfg('')
+        cfg2.load_json(self.cfg.export_json(indent=2))
+        self.assertEqual(self.cfg.export_toml(), cfg2.export_toml())
+
+    def test_load_export_binary(self):
+        self.cfg.MSG = 'Okay? Okay.'
+        self.cfg.PORT = 1234
+        data = self.cfg.export_binary()
+
+        cfg2 = Cfg('')
+        report = cfg2.load_binary(data)
+
+        self.assertFalse(report)
+        self.assertFalse(cfg2._modified)
+        self.assertEqual('Okay? Okay.', cfg2.MSG)
+        self.assertEqual(1234, cfg2.PORT)
+
+        self.assertRaises(ValueError, cfg2.load_binary, b'no config')
+        self.assertRaises(ValueError, cfg2.load_binary, data[:-5])
+        self.assertRaises(ValueError, cfg2.load_binary, cyra.core.BINARY_HEADER + b'N')
+
+    def test_export_binary_nested(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.define('DICT', OrderedDict([('keyA', OrderedDict([('keyA1', 'VA1')]))]))
+        builder.define('list', [1, 2])
+        cfg = cyra.Config('', builder)
+
+        cfg2 = cyra.Config('', builder)
+        cfg2.load_binary(cfg.export_binary())
+        self.assertEqual(cfg.export_toml(), cfg2.export_toml())
+
+    def test_load_toml_export_binary(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.define('list', [1, 2])
+        builder.define('dict', {'a': ['x']})
+        builder.define('name', 'cyra', strict=True)
+        builder.define('ratio', 0.5, strict=True)
+        cfg = cyra.Config('', builder)
+        cfg.load_toml('list = [3, 1.5, "a", true]\nname = "other"\nratio = 1.5\n\n'
+                      '[dict]\na = ["y", 2]\n')
+
+        # Values of the TOML document are converted to builtin types
+        cfg2 = cyra.Config('', builder)
+        cfg2.load_binary(cfg.export_binary())
+        self.assertEqual([3, 1.5, 'a', True], cfg2.accessor('list').get())
+        self.assertEqual({'a': ['y', 2]}, cfg2.accessor('dict').get())
+        self.assertEqual(['int', 'float', 'str', 'bool'],
+                         [type(v).__name__ for v in cfg.as_dict()['list']])
+        self.assertIs(str, type(cfg.as_flat_dict()['name']))
+        self.assertIs(float, type(cfg.as_flat_dict()['ratio']))
+        self.assertEqual((1, 2), cyra.Config._plain((1, 2)))
+
+    def test_export_dates(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.define('date', datetime.date(2020, 1, 1), strict=True)
+        builder.define('times', [datetime.time(3, 0)])
+        cfg = cyra.Config('', builder)
+        cfg.load_toml('date = 2021-02-03\ntimes = [04:05:06, 1979-05-27T07:32:00]\n')
+
+        # Dates and times are exported as ISO 8601 strings
+        self.assertEqual('{"date": "2021-02-03", "times": ["04:05:06", "1979-05-27T07:32:00"]}',
+                         cfg.export_json())
+        self.assertEqual([datetime.time(4, 5, 6), datetime.datetime(1979, 5, 27, 7, 32)],
+                         cfg.as_dict()['times'])
+        self.assertIs(datetime.date, type(cfg.as_dict()['date']))
+        self.assertRaises(ValueError, cfg.export_binary)
+
+        diff = cyra.Config('', builder).diff(cfg)
+        self.assertEqual(['date', '2020-01-01', '2021-02-03'], json.loads(diff.dumps())[0])
+        self.assertRaises(TypeError, cyra.core._json_default, object())
+
+    def test_diff(self):
+        cfg2 = Cfg('')
+        cfg2.MSG = 'Okay? Okay.'
+        cfg2.PORT = 1234
+
+        diff = self.cfg.diff(cfg2)
+        self.assertEqual([
+            cyra.ConfigChange(('msg',), 'Hello World', 'Okay? Okay.'),
+            cyra.ConfigChange(('DATABASE', 'port'), 1443, 1234),
+        ], diff)
+        self.assertEqual([], cfg2.diff(cfg2))
+
+        diff_str = diff.dumps()
+        self.assertEqual('[["msg","Hello World","Okay? Okay."],["DATABASE.port",1443,1234]]',
+                         diff_str)
+        self.assertEqual(diff, cyra.ConfigDiff.loads(diff_str))
+
+    def test_diff_file(self):
+        self.tmpdir = tests.tmpdir()
+        cfg_file = os.path.join(self.tmpdir.name, 'testcfg.toml')
+        shutil.copyfile(os.path.join(tests.DIR_TESTFILES, 'testcfg_import.toml'), cfg_file)
+
+        self.cfg._file = cfg_file
+        diff = self.cfg.diff_file()
+
+        self.assertEqual([
+            cyra.ConfigChange(('msg',), 'Hello World', 'Okay? Okay.'),
+            cyra.ConfigChange(('DATABASE', 'password'), 'my_secret_password',
+                              'very_secret_password'),
+        ], diff)
+
+        self.cfg.apply_diff(diff)
+        self.assertEqual([], self.cfg.diff_file(cfg_file))
+
+    def test_apply_diff(self):
+        toml_str = """
+msg = "I am Cyra" # Hello, I am here
+"""
+        exp_res = """
+msg = "Okay? Okay." # Hello, I am here
+msg2 = "Bye bye, World" # Cyra says goodbye
+
+[DATABASE] # SQL Database settings
+server = "192.168.1.1" # DB server address
+port = 1443 # SQL port (default: 1443)
+username = "admin" # Credentials
+password = "my_secret_password"
+enable = true # DB connection enabled
+"""
+        self.cfg.load_toml(toml_str)
+        self.cfg._modified = False
+
+        diff = cyra.ConfigDiff.loads('[["msg","I am Cyra","Okay? Okay."],["DATABASE.port",1443,"x"]]')
+        report = self.cfg.apply_diff(diff, verify=True)
+
+        self.assertTrue(self.cfg._modified)
+        self.assertEqual('Okay? Okay.', self.cfg.MSG)
+        self.assertEqual([('DATABASE', 'port')], [e.path for e in report])
+        self.assertEqual('\nmsg = "Okay? Okay." # Hello, I am here\n', self.cfg._toml.as_string())
+        self.assertEqual(exp_res, self.cfg.export_toml())
+
+    def test_apply_diff_errors(self):
+        diff = cyra.ConfigDiff([cyra.ConfigChange(('DATABASE',), {}, {'port': 1})])
+        self.assertRaises(KeyError, self.cfg.apply_diff, diff)
+
+        diff = cyra.ConfigDiff([cyra.ConfigChange(('msg',), 'Hi', 'Bye'),
+                                cyra.ConfigChange(('msg2',), 'Hi', 'Bye')])
+        self.assertRaises(ValueError, self.cfg.apply_diff, diff, True)
+        self.assertEqual('Hello World', self.cfg.MSG)
+
+        self.cfg.apply_diff(diff)
+        self.assertEqual('Bye', self.cfg.MSG2)
+
+    def test_get(self):
+        self.cfg.PORT = 1234
+
+        self.assertEqual(1234, self.cfg.get('DATABASE.port'))
+        self.assertEqual(1234, self.cfg.get(('DATABASE', 'port')))
+        self.assertEqual('Hello World', self.cfg.get('msg'))
+
+        self.assertRaises(KeyError, self.cfg.get, 'DATABASE')
+        self.assertRaises(KeyError, self.cfg.get, 'DATABASE.nothing')
+        self.assertIsNone(self.cfg.get('DATABASE.nothing', None))
+
+        self.assertEqual(('DATABASE', 'port'), cyra.core.parse_path('DATABASE.port'))
+        self.assertIs(cyra.core.parse_path('DATABASE.port'), cyra.core.parse_path('DATABASE.port'))
+
+        # The cache is cleared when it is full
+        with patch('cyra.core._PATH_CACHE_SIZE', 1):
+            cyra.core.parse_path('CACHE.first')
+            self.assertEqual(('CACHE', 'second'), cyra.core.parse_path('CACHE.second'))
+            self.assertEqual(['CACHE.second'], list(cyra.core._path_cache))
+
+    def test_accessor(self):
+        accessor = self.cfg.accessor('DATABASE.port')
+
+        self.assertEqual(('DATABASE', 'port'), accessor.path)
+        self.assertEqual(1443, accessor.get())
+
+        self.cfg.PORT = 1234
+        self.assertEqual(1234, accessor())
+
+        self.cfg._modified = False
+        accessor.set('1111')
+        self.assertEqual(1111, self.cfg.PORT)
+        self.assertTrue(self.cfg._modified)
+        self.assertEqual('<ConfigAccessor DATABASE.port = 1111>', repr(accessor))
+
+        self.assertRaises(KeyError, self.cfg.accessor, 'nothing')
+
+    def test_section(self):
+        section = self.cfg.section('DATABASE')
+
+        self.assertEqual(('DATABASE',), section.path)
+        self.assertEqual(['server', 'port', 'username', 'password', 'enable'], list(section))
+        self.assertEqual(5, len(section))
+        self.assertEqual(1443, section['port'])
+        self.assertEqual(1443, section.get('port'))
+        self.assertIsNone(section.get('nothing'))
+        self.assertIn('port', section)
+        self.assertEqual(('port', 1443), section.items()[1])
+        self.assertEqual('<ConfigSection DATABASE (5 entries)>', repr(section))
+
+        section['port'] = '1234'
+        self.assertEqual(1234, self.cfg.PORT)
+        self.assertEqual(1234, section.values()[1])
+
+        root = self.cfg.section()
+        self.assertEqual(['msg', 'DATABASE', 'msg2'], root.keys())
+        self.assertEqual(1234, root['DATABASE']['port'])
+        self.assertEqual(('DATABASE',), root.section('DATABASE').path)
+
+        self.assertRaises(KeyError, self.cfg.section, 'nothing')
+        self.assertRaises(KeyError, self.cfg.section, 'DATABASE.port')
+        self.assertRaises(KeyError, root.section, 'msg')
+        self.assertRaises(KeyError, root.__setitem__, 'DATABASE', 1)
+
+    def test_as_dict(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.define('msg', 'Hello')
+        builder.push('A')
+        builder.define('list', [1, 2])
+        builder.push('B')
+        builder.define('dict', {'x': 1})
+        builder.pop(2)
+        cfg = cyra.Config('', builder)
+
+        exp_dict = {'msg': 'Hello', 'A': {'list': [1, 2], 'B': {'dict': {'x': 1}}}}
+        exp_flat = {'msg': 'Hello', 'A.list': [1, 2], 'A.B.dict': {'x': 1}}
+        self.assertEqual(exp_dict, cfg.as_dict())
+        self.assertEqual(exp_flat, cfg.as_flat_dict())
+        self.assertEqual(exp_dict['A'], cfg.section('A').as_dict())
+        self.assertEqual({'list': [1, 2], 'B.dict': {'x': 1}}, cfg.section('A').as_flat_dict())
+
+        # Exported containers are copies
+        cfg.as_dict()['A']['list'].append(3)
+        self.assertEqual([1, 2], cfg.get('A.list'))
+
+        cfg2 = cyra.Config('', builder)
+        cfg2.load_flat_dict(dict(exp_flat, msg='Bye'))
+        self.assertEqual(dict(exp_flat, msg='Bye'), cfg2.as_flat_dict())
+
     def test_load_flat_dict(self):
         flat_dict = {
             ('msg',): 'Okay? Okay.',
@@ -369,6 +1184,642 @@ enable = true # DB connection enabled
         self.assertEqual('Okay? Okay.', self.cfg.MSG)
         self.assertEqual('very_secret_password', self.cfg.PASSWORD)
 
+    def test_ingest(self):
+        fingerprint = self.cfg.fingerprint('DATABASE')
+        self.cfg.ingest_chunk_size = 2
+
+        def rows():
+            yield 'msg', 'Okay? Okay.'
+            yield ('DATABASE', 'port'), '1234'
+            yield 'DATABASE.nothing', 1
+            yield 'DATABASE.username', 'cyra'
+            yield 'DATABASE.port', 'not a number'
+            yield 5, 'x'
+
+        report = self.cfg.ingest(rows())
+        self.assertEqual(['DATABASE.nothing', 5], report.unknown_keys)
+        self.assertEqual(1, len(report))
+        self.assertEqual('Okay? Okay.', self.cfg.MSG)
+        self.assertEqual('cyra', self.cfg.USERNAME)
+        self.assertEqual(1443, self.cfg.PORT)
+        self.assertNotEqual(fingerprint, self.cfg.fingerprint('DATABASE'))
+
+        self.cfg.ingest({'DATABASE.username': 'admin'})
+        self.assertEqual(fingerprint, self.cfg.fingerprint('DATABASE'))
+
+        with ThreadPoolExecutor(2) as executor:
+            report = self.cfg.ingest([('DATABASE.port', 1111), ('msg2', 'Bye')], executor=executor)
+        self.assertFalse(report)
+        self.assertEqual(1111, self.cfg.PORT)
+        self.assertEqual('Bye', self.cfg.MSG2)
+
+    def test_ingest_constraint(self):
+        cfg = PoolCfg('')
+        cfg.ingest_chunk_size = 1
+
+        report = cfg.ingest([('name', 'first'), ('POOL.max', 2), ('POOL.min', 3), ('POOL.max', 5)])
+        self.assertFalse(report.rolled_back)
+        self.assertEqual((3, 5), (cfg.MIN, cfg.MAX))
+
+        report = cfg.ingest([('name', 'second'), ('POOL.max', 2), ('POOL.max', 1)])
+        self.assertTrue(report.rolled_back)
+        self.assertEqual('first', cfg.NAME)
+        self.assertEqual(5, cfg.MAX)
+
+    def test_override(self):
+        with self.cfg.override({'DATABASE.server': 'localhost'}, PORT='3306') as cfg:
+            self.assertIs(self.cfg, cfg)
+            self.assertEqual(3306, cfg.PORT)
+            self.assertEqual('localhost', cfg.get('DATABASE.server'))
+            self.assertEqual('localhost', cfg.section('DATABASE')['server'])
+            self.assertEqual(3306, cfg.accessor('DATABASE.port')())
+            self.assertEqual('Hello World', cfg.MSG)
+
+            with cfg.override(PORT=1234, MSG='Hi'):
+                self.assertEqual(1234, cfg.PORT)
+                self.assertEqual('Hi', cfg.MSG)
+                self.assertEqual('localhost', cfg.SERVER)
+            self.assertEqual(3306, cfg.PORT)
+
+            # Section views, dicts and snapshots include the overrides
+            self.assertEqual(3306, cfg.section('DATABASE').as_dict()['port'])
+            self.assertEqual('localhost', cfg.section().as_flat_dict()['DATABASE.server'])
+            self.assertEqual(cfg.section().as_dict(), cfg.as_dict())
+            self.assertEqual(cfg.section().as_flat_dict(), cfg.as_flat_dict())
+            self.assertEqual(3306, cfg.as_dict()['DATABASE']['port'])
+            self.assertEqual(3306, cfg.freeze().PORT)
+            self.assertEqual('localhost', cfg.freeze().get('DATABASE.server'))
+
+            # Other configs and the stored values are not affected
+            self.assertEqual(1443, Cfg('').PORT)
+            self.assertEqual(1443, json.loads(cfg.export_json())['DATABASE']['port'])
+
+            # Other threads do not see the overrides
+            with ThreadPoolExecutor(1) as executor:
+                self.assertEqual(1443, executor.submit(lambda: cfg.PORT).result())
+
+        self.assertEqual(1443, self.cfg.PORT)
+        self.assertEqual(0, cyra.core._n_overrides)
+
+        self.assertRaises(KeyError, self.cfg.override(NOTHING=1).__enter__)
+        self.assertRaises(KeyError, self.cfg.override({'DATABASE.nothing': 1}).__enter__)
+        with self.assertRaises(cyra.ConfigValueError) as ctx:
+            self.cfg.override(PORT='abc').__enter__()
+        self.assertTrue(ctx.exception.override)
+        self.assertEqual("Cyra config override 'abc' for field [DATABASE.port] could not be cast "
+                         "to (int). The override was rejected.", str(ctx.exception))
+        self.assertEqual(1443, self.cfg.freeze().PORT)
+
+        # Values are rejected if their hook fails
+        cfg = CheckedCfg('')
+        with patch.object(cfg.accessor('A.name')._entry, '_hook', side_effect=ValueError):
+            with self.assertRaises(cyra.ConfigValueError) as ctx:
+                cfg.override(NAME='Other').__enter__()
+        self.assertEqual('is invalid', ctx.exception.reason)
+        self.assertEqual('cyra', cfg.NAME)
+
+    def test_override_thread_local(self):
+        # Fallback without contextvars
+        with patch('cyra.core._overrides', cyra.core._LocalVar('cyra_overrides')):
+            with self.cfg.override(PORT=3306):
+                self.assertEqual(3306, self.cfg.PORT)
+                with self.cfg.override(PORT=1234):
+                    self.assertEqual(1234, self.cfg.PORT)
+                self.assertEqual(3306, self.cfg.PORT)
+
+                with ThreadPoolExecutor(1) as executor:
+                    self.assertEqual(1443, executor.submit(lambda: self.cfg.PORT).result())
+            self.assertEqual(1443, self.cfg.PORT)
+
+    def test_override_computed(self):
+        cfg = ComputedCfg('')
+        self.assertEqual('sql://admin@192.168.1.1:1443', cfg.DSN)
+
+        with cfg.override(PORT=3306):
+            self.assertEqual('sql://admin@192.168.1.1:3306', cfg.DSN)
+        self.assertEqual('sql://admin@192.168.1.1:1443', cfg.DSN)
+
+        # Overrides of other values use the cached value
+        with cfg.override(NAME='other'):
+            self.assertEqual('sql://admin@192.168.1.1:1443', cfg.DSN)
+
+        cfg = PoolCfg('')
+        with cfg.override({'POOL.max': 5}):
+            with self.assertRaises(cyra.ConstraintError) as ctx:
+                cfg.override({'POOL.min': 8}).__enter__()
+            self.assertEqual('Cyra config constraint (min <= max) on fields [POOL.min, POOL.max] '
+                             'is violated by overridden values (8, 5). The override was rejected.',
+                             str(ctx.exception))
+            self.assertEqual(5, cfg.MAX)
+
+    def test_map(self):
+        cfg = MapCfg('')
+        fingerprint = cfg.fingerprint()
+        self.assertEqual([], list(cfg.HOSTS))
+
+        alpha = cfg.HOSTS.add('alpha', {'ip': '10.0.0.1'})
+        cfg.HOSTS['beta'] = {'port': '8080'}
+        self.assertEqual(('HOSTS', 'alpha'), alpha.path)
+        self.assertEqual(['alpha', 'beta'], cfg.HOSTS.keys())
+        self.assertEqual({'ip': '10.0.0.1', 'port': 80}, cfg.HOSTS['alpha'].as_dict())
+        self.assertEqual(8080, cfg.get('HOSTS.beta.port'))
+        self.assertNotEqual(fingerprint, cfg.fingerprint())
+
+        # Values of an entry are validated individually (invalid values fall back to the default)
+        cfg.HOSTS['beta'] = {'port': -1}
+        cfg.HOSTS['beta']['ip'] = '10.0.0.2'
+        self.assertEqual({'ip': '10.0.0.2', 'port': 80}, cfg.HOSTS['beta'].as_dict())
+
+        self.assertRaises(ValueError, cfg.HOSTS.add, 'alpha')
+        self.assertRaises(ValueError, cfg.HOSTS.add, 'a.b')
+        with self.assertRaises(AttributeError):
+            cfg.HOSTS = {}
+
+        # Entries are exported like regular sections
+        toml_str = cfg.export_toml()
+        self.assertIn('[HOSTS.alpha]\nip = "10.0.0.1"\nport = 80\n', toml_str)
+
+        other = MapCfg('')
+        other.load_toml(toml_str)
+        self.assertEqual(cfg.as_dict(), other.as_dict())
+        self.assertEqual(cfg.fingerprint(), other.fingerprint())
+        self.assertEqual('10.0.0.1', other.freeze().HOSTS.alpha.ip)
+
+        del cfg.HOSTS['alpha']
+        cfg.HOSTS.remove('beta')
+        self.assertRaises(KeyError, cfg.HOSTS.remove, 'beta')
+        self.assertRaises(KeyError, cfg.get, 'HOSTS.beta.port')
+        self.assertEqual(fingerprint, cfg.fingerprint())
+        self.assertNotIn('alpha', cfg.export_toml())
+
+    def test_map_load(self):
+        cfg = MapCfg('')
+        cfg.load_toml('[HOSTS.alpha]\nport = 81\n[HOSTS.beta]\nip = "10.0.0.2"\n')
+        self.assertEqual(['alpha', 'beta'], list(cfg.HOSTS))
+
+        # Loading a nested dict replaces the entries of the map
+        cfg.load_json('{"HOSTS": {"gamma": {"port": 82}, "beta": {}}}')
+        self.assertEqual(['beta', 'gamma'], list(cfg.HOSTS))
+        self.assertEqual(80, cfg.get('HOSTS.beta.port'))
+        self.assertEqual(82, cfg.get('HOSTS.gamma.port'))
+
+        cfg.load_json('{"name": "other"}')
+        self.assertEqual(['beta', 'gamma'], list(cfg.HOSTS))
+
+        # Flat dicts and ingested values only add entries
+        cfg.load_flat_dict({'HOSTS.delta.port': 83, ('HOSTS', 'eps', 'ip'): '10.0.0.5',
+                            'nothing': 1})
+        report = cfg.ingest([('HOSTS.zeta.port', 84), ('HOSTS.eta.nothing', 1)])
+        self.assertEqual(['HOSTS.eta.nothing'], report.unknown_keys)
+        self.assertEqual(['beta', 'gamma', 'delta', 'eps', 'zeta'], list(cfg.HOSTS))
+        self.assertEqual(84, cfg.HOSTS['zeta']['port'])
+        self.assertEqual('10.0.0.5', cfg.HOSTS['eps']['ip'])
+
+        # Entries with invalid keys are skipped
+        cfg.load_json('{"HOSTS": {"beta": {}, "a.b": {"port": 1}, "": {}}}')
+        report = cfg.ingest([('HOSTS..port', 1)])
+        self.assertEqual(['HOSTS..port'], report.unknown_keys)
+        self.assertEqual(['beta'], list(cfg.HOSTS))
+
+    def test_map_rollback(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.push('POOL')
+        builder.define('min', 0)
+        builder.define('max', 1)
+        builder.pop()
+        builder.constraint(['POOL.min', 'POOL.max'], lambda lo, hi: lo <= hi, 'min <= max')
+        builder.push_map('HOSTS')
+        builder.define('port', 80, validator=is_positive)
+        builder.pop()
+
+        cfg = cyra.Config('', builder)
+        cfg.load_toml('[HOSTS.alpha]\nport = 81\n')
+        toml = cfg._toml
+        fingerprint = cfg.fingerprint()
+
+        # Added and removed map entries are rolled back with the values
+        report = cfg.load_toml('[POOL]\nmin = 5\n\n[HOSTS.beta]\nport = 82\n')
+        self.assertTrue(report.rolled_back)
+        self.assertEqual(['alpha'], list(cfg._map_entries[('HOSTS',)]))
+        self.assertEqual(81, cfg.get('HOSTS.alpha.port'))
+        self.assertIsNone(cfg.get('HOSTS.beta.port', None))
+        self.assertIs(toml, cfg._toml)
+
+        self.assertRaises(cyra.ConfigValueError, cfg.load_toml,
+                          '[HOSTS.beta]\nport = "not a number"\n', True)
+        self.assertTrue(cfg.load_flat_dict({'HOSTS.beta.port': 82, 'POOL.min': 5}).rolled_back)
+        self.assertTrue(cfg.ingest([('HOSTS.beta.port', 82), ('POOL.min', 5)]).rolled_back)
+        self.assertRaises(cyra.ConfigValueError, cfg.ingest,
+                          [('HOSTS.beta.port', 82), ('HOSTS.gamma.port', 'x')], True)
+
+        diff = [cyra.ConfigChange(('HOSTS', 'beta', 'port'), None, 82),
+                cyra.ConfigChange(('POOL', 'min'), 0, 5)]
+        self.assertTrue(cfg.apply_diff(diff).rolled_back)
+        self.assertRaises(cyra.ConstraintError, cfg.apply_diff, diff, fail_fast=True)
+
+        self.assertEqual(['alpha'], list(cfg._map_entries[('HOSTS',)]))
+        self.assertEqual(fingerprint, cfg.fingerprint())
+        self.assertNotIn('beta', cfg.export_toml())
+
+    def test_map_diff(self):
+        cfg = MapCfg('')
+        cfg.HOSTS.add('alpha', {'ip': '10.0.0.1'})
+        other = MapCfg('')
+        other.NAME = 'other'
+        other.HOSTS.add('beta', {'port': 8080})
+
+        # Entries that exist in only one config are added / removed
+        diff = cfg.diff(other)
+        self.assertEqual([
+            cyra.ConfigChange(('name',), 'monitor', 'other'),
+            cyra.ConfigChange(('HOSTS', 'alpha', 'ip'), '10.0.0.1', None),
+            cyra.ConfigChange(('HOSTS', 'alpha', 'port'), 80, None),
+            cyra.ConfigChange(('HOSTS', 'beta', 'ip'), None, '0.0.0.0'),
+            cyra.ConfigChange(('HOSTS', 'beta', 'port'), None, 8080),
+        ], diff)
+
+        report = cfg.apply_diff(cyra.ConfigDiff.loads(diff.dumps()), verify=True)
+        self.assertFalse(report.errors)
+        self.assertEqual(['beta'], cfg.HOSTS.keys())
+        self.assertEqual(other.as_dict(), cfg.as_dict())
+        self.assertEqual([], cfg.diff(other))
+
+        # Diffs that cannot be applied are rejected without adding entries
+        self.assertRaises(KeyError, cfg.apply_diff, [cyra.ConfigChange(('name',), 'other', None)])
+        self.assertRaises(KeyError, cfg.apply_diff,
+                          [cyra.ConfigChange(('HOSTS', 'gamma', 'nothing'), None, 1)])
+        self.assertRaises(ValueError, cfg.apply_diff,
+                          [cyra.ConfigChange(('HOSTS', 'gamma', 'port'), None, 1),
+                           cyra.ConfigChange(('name',), 'monitor', 'x')], True)
+        self.assertEqual(['beta'], cfg.HOSTS.keys())
+
+    def test_compiled(self):
+        def make_builder():
+            builder = cyra.core.ConfigBuilder()
+            builder.comment('Cyra says hello')
+            builder.define('msg', 'Hello World')
+            builder.push('DATABASE')
+            builder.define('port', 1443, validator=lambda x: x > 0)
+            builder.define('timeout', 1.5, strict=True)
+            builder.push('USER')
+            builder.define('name', 'admin', hook=str.upper)
+            builder.define('enable', True)
+            builder.pop()
+            builder.push('EMPTY')
+            builder.pop(2)
+            builder.define('list', [1, 2])
+            builder.define('msg2', 'Bye bye, World')
+            return builder
+
+        builder = make_builder()
+        builder.compile()
+        cfg_gen = cyra.Config('', make_builder())
+        cfg_comp = cyra.Config('', builder)
+
+        toml_str = """
+msg = 5 # Number
+
+[DATABASE]
+port = -1
+timeout = "1.5"
+
+[DATABASE.USER]
+name = "cyra"
+"""
+        for cfg in (cfg_gen, cfg_comp):
+            report = cfg.load_toml(toml_str)
+            self.assertEqual(['is invalid', 'is not of type (%s)' % float],
+                             [e.reason for e in report])
+            self.assertTrue(cfg._modified)
+
+        self.assertIsNotNone(cfg_comp._get_compiled())
+        self.assertEqual('5', cfg_comp.get('msg'))
+        self.assertEqual('CYRA', cfg_comp.get('DATABASE.USER.name'))
+        self.assertEqual(cfg_gen.export_toml(), cfg_comp.export_toml())
+        self.assertEqual(cfg_gen.export_json(), cfg_comp.export_json())
+
+        flat_dict = {
+            ('msg',): 'Okay? Okay.',
+            'DATABASE.port': 1111,
+            'DATABASE.USER.enable': 0,
+            'list': (3, 4),
+        }
+        for cfg in (cfg_gen, cfg_comp):
+            cfg.load_flat_dict(flat_dict)
+            cfg.accessor('DATABASE.timeout').set(2.5)
+        self.assertEqual(cfg_gen.export_toml(), cfg_comp.export_toml())
+        self.assertEqual(cfg_gen.export_json(), cfg_comp.export_json())
+        self.assertIs(False, cfg_comp.get('DATABASE.USER.enable'))
+        self.assertEqual([3, 4], cfg_comp.get('list'))
+
+        # Complete dict
+        for cfg in (cfg_gen, cfg_comp):
+            cfg.load_json(cfg_gen.export_json())
+            self.assertFalse(cfg._modified)
+
+    def test_load_parallel(self):
+        toml_str = """
+list = [3, 1, 2]
+plain = 5
+
+[A]
+port = -1
+name = ""
+"""
+        exp_reasons = ['is invalid', 'is invalid (hook)', 'could not be cast to (list)']
+
+        cfg = CheckedCfg('')
+        report = cfg.load_toml(toml_str.replace('[3, 1, 2]', '5'))
+        self.assertEqual(exp_reasons, [e.reason for e in report])
+
+        with ThreadPoolExecutor(4) as executor:
+            for _ in range(2):
+                cfg = CheckedCfg('')
+                report = cfg.load_toml(toml_str.replace('[3, 1, 2]', '5'), executor=executor)
+                self.assertEqual(exp_reasons, [e.reason for e in report])
+
+            # Results are taken from the memoization cache
+            for _ in range(2):
+                cfg = CheckedCfg('')
+                cfg.load_toml(toml_str, executor=executor)
+                self.assertEqual([1, 2, 3], cfg.LIST)
+                cfg.LIST.append(4)
+
+            cfg.load_flat_dict({'A.name': 'CYRA', 'A.port': 1}, executor=executor)
+            self.assertEqual('cyra', cfg.NAME)
+            self.assertEqual(1, cfg.PORT)
+
+            self.assertRaises(cyra.ConfigValueError, cfg.load_toml, toml_str,
+                              fail_fast=True, executor=executor)
+
+        with ProcessPoolExecutor(2) as executor:
+            cfg = CheckedCfg('')
+            report = cfg.load_json('{"A": {"port": -1, "name": "CyRa"}, "plain": 5}',
+                                   executor=executor)
+            self.assertEqual(['is invalid'], [e.reason for e in report])
+            self.assertEqual('cyra', cfg.NAME)
+            self.assertEqual('5', cfg.PLAIN)
+
+            # Lambdas cannot be pickled, the checks run in the calling thread
+            builder = cyra.core.ConfigBuilder()
+            builder.define('port', 1443, validator=lambda x: x > 0)
+            builder.define('name', 'cyra', hook=lambda x: x.lower())
+            cfg = cyra.Config('', builder)
+            report = cfg.load_json('{"port": -1, "name": "CyRa"}', executor=executor)
+            self.assertEqual(['is invalid'], [e.reason for e in report])
+            self.assertEqual(1443, cfg.accessor('port').get())
+            self.assertEqual('cyra', cfg.accessor('name').get())
+
+        # Executors that cannot accept jobs
+        executor = ThreadPoolExecutor(1)
+        executor.shutdown()
+        cfg = CheckedCfg('')
+        cfg.load_json('{"A": {"port": -1, "name": "CyRa"}}', executor=executor)
+        self.assertEqual(1443, cfg.PORT)
+        self.assertEqual('cyra', cfg.NAME)
+
+    def test_constraint_set(self):
+        cfg = PoolCfg('')
+        cfg.MIN = 5
+        self.assertTrue(cfg._modified)
+        cfg._modified = False
+
+        with self.assertRaises(cyra.ConstraintError) as ctx:
+            cfg.MAX = 4
+        self.assertEqual(10, cfg.MAX)
+        self.assertEqual([5, 4], ctx.exception.values)
+        self.assertFalse(cfg._modified)
+        self.assertEqual('Cyra config constraint (min <= max) on fields [POOL.min, POOL.max] '
+                         'is violated by values (5, 4). Changes were rolled back.',
+                         str(ctx.exception))
+
+        self.assertRaises(cyra.ConstraintError, cfg.accessor('TLS.cert').set, 'cert.pem')
+        self.assertEqual('', cfg.CERT)
+
+        # Unconstrained values
+        cfg.NAME = 'other'
+        self.assertEqual('other', cfg.NAME)
+
+    def test_constraint_incremental(self):
+        check = Mock(return_value=True)
+        builder = cyra.core.ConfigBuilder()
+        builder.define('a', 1)
+        builder.define('b', 2)
+        builder.define('c', 3)
+        builder.constraint(['a', 'b'], check)
+        check.reset_mock()
+
+        cfg = cyra.Config('', builder)
+        cfg.load_flat_dict({'c': 4})
+        check.assert_not_called()
+
+        cfg.load_flat_dict({'a': 1, 'c': 5})
+        check.assert_not_called()
+
+        cfg.load_flat_dict({'a': 5, 'b': 6})
+        check.assert_called_once_with(5, 6)
+
+    def test_constraint_load(self):
+        cfg = PoolCfg('')
+        cfg.load_toml('name = "first"\n[POOL]\nmin = 2\n')
+        toml = cfg._toml
+
+        # The whole load is rolled back
+        report = cfg.load_toml('name = "second"\n[POOL]\nmin = 20\n[TLS]\ncert = "c"\nkey = "k"\n')
+        self.assertTrue(report.rolled_back)
+        self.assertEqual(['min <= max'], [e.constraint.message for e in report])
+        self.assertEqual('first', cfg.NAME)
+        self.assertEqual(2, cfg.MIN)
+        self.assertEqual('', cfg.CERT)
+        self.assertIs(toml, cfg._toml)
+
+        report = cfg.load_flat_dict({'TLS.cert': 'cert.pem', 'name': 'third'})
+        self.assertTrue(report.rolled_back)
+        self.assertEqual('first', cfg.NAME)
+
+        self.assertRaises(cyra.ConstraintError, cfg.load_json, '{"POOL": {"max": 0}}',
+                          fail_fast=True)
+        self.assertEqual(10, cfg.MAX)
+        self.assertIs(toml, cfg._toml)
+
+        self.assertRaises(cyra.ConstraintError, cfg.load_toml, '[POOL]\nmax = 0\n',
+                          fail_fast=True)
+        self.assertEqual(10, cfg.MAX)
+        self.assertIs(toml, cfg._toml)
+
+        report = cfg.load_json('{"POOL": {"min": 3, "max": 3}, "name": "fourth"}')
+        self.assertFalse(report.rolled_back)
+        self.assertEqual(3, cfg.MAX)
+        self.assertEqual('fourth', cfg.NAME)
+
+    def test_constraint_load_file(self):
+        self.tmpdir = tests.tmpdir()
+        cfg_file = os.path.join(self.tmpdir.name, 'testcfg.toml')
+        toml_str = '[POOL]\nmin = 20\n'
+        with open(cfg_file, 'w') as f:
+            f.write(toml_str)
+
+        cfg = PoolCfg(cfg_file)
+        report = cfg.load_file()
+        self.assertTrue(report.rolled_back)
+
+        # The rejected file is not overwritten
+        with open(cfg_file, 'r') as f:
+            self.assertEqual(toml_str, f.read())
+
+    def test_constraint_apply_diff(self):
+        cfg = PoolCfg('')
+        cfg.load_toml('[POOL]\nmin = 2\n')
+
+        diff = [cyra.ConfigChange(('TLS', 'cert'), '', 'cert.pem'),
+                cyra.ConfigChange(('POOL', 'min'), 2, 3)]
+        report = cfg.apply_diff(diff)
+        self.assertTrue(report.rolled_back)
+        self.assertEqual(2, cfg.MIN)
+        self.assertNotIn('cert.pem', cfg.export_toml())
+        self.assertRaises(cyra.ConstraintError, cfg.apply_diff, diff, fail_fast=True)
+
+        diff.append(cyra.ConfigChange(('TLS', 'key'), '', 'key.pem'))
+        self.assertFalse(cfg.apply_diff(diff))
+        self.assertEqual(3, cfg.MIN)
+        self.assertEqual('key.pem', cfg.KEY)
+        self.assertIn('min = 3', cfg.export_toml())
+
+    def test_computed(self):
+        func = ComputedCfg.DSN.func
+        func.reset_mock()
+        cfg = ComputedCfg('')
+
+        self.assertEqual('sql://admin@192.168.1.1:1443', cfg.DSN)
+        self.assertEqual('sql://admin@192.168.1.1:1443', cfg.DSN)
+        self.assertEqual(1, func.call_count)
+
+        # Instances have their own cache
+        self.assertEqual('sql://admin@192.168.1.1:1443', ComputedCfg('').DSN)
+        self.assertEqual(2, func.call_count)
+
+        # Changing other values does not invalidate the cache
+        cfg.NAME = 'other'
+        cfg.load_flat_dict({'name': 'third', 'DATABASE.port': 1443})
+        self.assertEqual('sql://admin@192.168.1.1:1443', cfg.DSN)
+        self.assertEqual(2, func.call_count)
+
+        cfg.PORT = 1111
+        self.assertEqual('sql://admin@192.168.1.1:1111', cfg.DSN)
+        cfg.load_toml('[DATABASE]\nusername = "cyra"\n')
+        self.assertEqual('sql://cyra@192.168.1.1:1111', cfg.DSN)
+        cfg.apply_diff([cyra.ConfigChange(('DATABASE', 'server'), None, 'localhost')])
+        self.assertEqual('sql://cyra@localhost:1111', cfg.DSN)
+        self.assertEqual(5, func.call_count)
+
+        with self.assertRaises(AttributeError):
+            cfg.DSN = 'sql://'
+        self.assertIsInstance(ComputedCfg.DSN, cyra.core.ComputedValue)
+        self.assertRaises(ValueError, ComputedCfg.builder.computed, ['DATABASE'], str)
+
+    def test_fingerprint(self):
+        fingerprint = self.cfg.fingerprint()
+        db_fingerprint = self.cfg.fingerprint('DATABASE')
+        self.assertEqual(16, len(fingerprint))
+        self.assertEqual(fingerprint, Cfg('').fingerprint())
+        self.assertEqual(db_fingerprint, self.cfg.fingerprint(('DATABASE',)))
+        self.assertNotEqual(fingerprint, db_fingerprint)
+
+        # Changes are applied to the config and the affected sections
+        self.cfg.MSG = 'Hi'
+        self.assertNotEqual(fingerprint, self.cfg.fingerprint())
+        self.assertEqual(db_fingerprint, self.cfg.fingerprint('DATABASE'))
+
+        self.cfg.PORT = 1111
+        self.assertNotEqual(db_fingerprint, self.cfg.fingerprint('DATABASE'))
+
+        self.cfg.MSG = 'Hello World'
+        self.cfg.accessor('DATABASE.port').set(1443)
+        self.assertEqual(fingerprint, self.cfg.fingerprint())
+        self.assertEqual(db_fingerprint, self.cfg.fingerprint('DATABASE'))
+
+        # Loaded values
+        self.cfg.load_toml('msg = "Okay? Okay."\n[DATABASE]\nport = 1234\n')
+        other = Cfg('')
+        other.load_flat_dict({'msg': 'Okay? Okay.', 'DATABASE.port': 1234})
+        self.assertEqual(other.fingerprint(), self.cfg.fingerprint())
+        self.assertEqual(other.fingerprint('DATABASE'), self.cfg.fingerprint('DATABASE'))
+        self.assertNotEqual(fingerprint, self.cfg.fingerprint())
+
+        self.cfg.apply_diff([cyra.ConfigChange(('msg',), None, 'Hello World'),
+                             cyra.ConfigChange(('DATABASE', 'port'), None, 1443)])
+        self.assertEqual(fingerprint, self.cfg.fingerprint())
+
+        self.assertRaises(KeyError, self.cfg.fingerprint, 'NOTHING')
+        self.assertRaises(KeyError, self.cfg.fingerprint, 'DATABASE.port')
+
+    def test_freeze(self):
+        self.cfg.PORT = 1234
+        frozen = self.cfg.freeze()
+
+        self.assertEqual('Hello World', frozen.MSG)
+        self.assertEqual('Hello World', frozen.msg)
+        self.assertEqual(1234, frozen.PORT)
+        self.assertEqual(1234, frozen.DATABASE.port)
+        self.assertEqual(1234, frozen['DATABASE']['port'])
+        self.assertEqual(1234, frozen.get('DATABASE.port'))
+        self.assertIsNone(frozen.get('DATABASE.nothing'))
+        self.assertEqual(['msg', 'DATABASE', 'msg2'], list(frozen))
+        self.assertEqual(['server', 'port', 'username', 'password', 'enable'],
+                         list(frozen.DATABASE))
+
+        # Snapshots are immutable and independent of the config
+        self.cfg.PORT = 1443
+        self.assertEqual(1234, frozen.PORT)
+
+        with self.assertRaises(AttributeError):
+            frozen.PORT = 1
+        with self.assertRaises(AttributeError):
+            frozen.DATABASE.port = 1
+        with self.assertRaises(AttributeError):
+            frozen.DATABASE.nothing = 1
+        with self.assertRaises(AttributeError):
+            del frozen.DATABASE.port
+
+        self.assertIn('port', frozen.DATABASE)
+        self.assertNotIn('nothing', frozen.DATABASE)
+        self.assertEqual("FrozenCfg.DATABASE(server='192.168.1.1', port=1234, username='admin', "
+                         "password='my_secret_password', enable=True)", repr(frozen.DATABASE))
+
+        # Frozen types are generated once per schema
+        self.assertIs(type(frozen), type(self.cfg.freeze()))
+        self.assertIs(type(frozen.DATABASE), type(Cfg('').freeze().DATABASE))
+
+    def test_freeze_containers(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.define('list', [1, [2, 3]])
+        builder.define('dict', {'a': {'b': [1]}})
+        builder.push('SECTION')
+        builder.define('not-an-attribute', 1)
+        builder.pop()
+
+        frozen = cyra.Config('', builder).freeze()
+        self.assertEqual((1, (2, 3)), frozen.list)
+        self.assertEqual({'a': {'b': (1,)}}, frozen.dict)
+        self.assertEqual(1, frozen.SECTION['not-an-attribute'])
+
+        self.assertRaises(TypeError, frozen.dict.__setitem__, 'a', 1)
+        self.assertRaises(TypeError, frozen.dict['a'].update, {})
+        self.assertRaises(TypeError, frozen.dict.__init__, {'x': 1})
+        with self.assertRaises(TypeError):
+            frozen.dict['a'] |= {'x': 1}
+        self.assertEqual({'a': {'b': (1,)}}, frozen.dict)
+        self.assertIsInstance(frozen.list, tuple)
+
+        # Frozen dicts stay frozen when they are copied
+        for copied in (copy.deepcopy(frozen.dict), pickle.loads(pickle.dumps(frozen.dict))):
+            self.assertIsInstance(copied, cyra.frozen.FrozenDict)
+            self.assertEqual(frozen.dict, copied)
+            self.assertRaises(TypeError, copied.__setitem__, 'a', 1)
+
+        # Computed values are evaluated
+        self.assertEqual('sql://admin@192.168.1.1:1443', ComputedCfg('').freeze().DSN)
+
     def test_load_file(self):
         # Copy fresh config file into tmp folder
         self.tmpdir = tests.tmpdir()
@@ -383,6 +1834,108 @@ enable = true # DB connection enabled
 
         tests.assert_files_equal(self, os.path.join(tests.DIR_TESTFILES, 'testcfg_writeback.toml'), cfg_file)
 
+    def test_load_file_release_toml(self):
+        self.tmpdir = tests.tmpdir()
+        cfg_file = os.path.join(self.tmpdir.name, 'testcfg.toml')
+        shutil.copyfile(os.path.join(tests.DIR_TESTFILES, 'testcfg_import.toml'), cfg_file)
+
+        self.cfg._file = cfg_file
+        self.cfg.load_file(release_toml=True)
+
+        self.assertIsNone(self.cfg._toml)
+        self.assertEqual('Okay? Okay.', self.cfg.MSG)
+        tests.assert_files_equal(self, os.path.join(tests.DIR_TESTFILES, 'testcfg_writeback.toml'), cfg_file)
+
+        # Export re-reads the file
+        with open(cfg_file, 'r') as f:
+            self.assertEqual(f.read(), self.cfg.export_toml())
+
+        self.cfg.PORT = 1234
+        self.assertTrue(self.cfg.save_file())
+        self.assertIsNone(self.cfg._toml)
+
+        self.cfg.PORT = 1235
+        self.assertTrue(self.cfg.save_file())
+
+        cfg2 = Cfg(cfg_file)
+        cfg2.load_file()
+        self.assertEqual(1235, cfg2.PORT)
+        self.assertEqual('very_secret_password', cfg2.PASSWORD)
+
+        # File modified by someone else
+        with open(cfg_file, 'a') as f:
+            f.write('# New comment\n')
+
+        self.cfg.PORT = 1236
+        self.assertRaises(cyra.ConfigFileChangedError, self.cfg.save_file)
+
+        os.remove(cfg_file)
+        self.assertRaises(cyra.ConfigFileChangedError, self.cfg.export_toml)
+
+        # Loading the file again resets the document
+        self.cfg.load_file()
+        self.assertIsNotNone(self.cfg._toml)
+
+    def test_load_file_release_toml_no_update(self):
+        self.tmpdir = tests.tmpdir()
+        cfg_file = os.path.join(self.tmpdir.name, 'testcfg.toml')
+        shutil.copyfile(os.path.join(tests.DIR_TESTFILES, 'testcfg_import.toml'), cfg_file)
+
+        # The digest is computed from the read file
+        self.cfg._file = cfg_file
+        self.cfg.load_file(False, release_toml=True)
+        self.assertIsNone(self.cfg._toml)
+        tests.assert_files_equal(self, os.path.join(tests.DIR_TESTFILES, 'testcfg_import.toml'),
+                                 cfg_file)
+        self.assertIn('password = "very_secret_password"', self.cfg.export_toml())
+
+        # Without a file, the document cannot be released
+        cfg = Cfg(os.path.join(self.tmpdir.name, 'missing.toml'))
+        cfg.load_file(False, release_toml=True)
+        self.assertIsNotNone(cfg._toml)
+        self.assertTrue(cfg._modified)
+
+    def test_map_release_toml(self):
+        self.tmpdir = tests.tmpdir()
+        cfg_file = os.path.join(self.tmpdir.name, 'testcfg.toml')
+        with open(cfg_file, 'w') as f:
+            f.write('name = "monitor"\n\n[HOSTS.alpha]\nport = 81\n\n[HOSTS.beta]\nport = 82\n')
+
+        cfg = MapCfg(cfg_file)
+        cfg.load_file(release_toml=True)
+        self.assertIsNone(cfg._toml)
+
+        # Removed entries are deleted from the re-read document
+        cfg.HOSTS.remove('alpha')
+        self.assertNotIn('alpha', cfg.export_toml())
+        self.assertTrue(cfg.save_file())
+        self.assertEqual([], cfg._toml_removed)
+
+        cfg2 = MapCfg(cfg_file)
+        cfg2.load_file()
+        self.assertEqual(['beta'], cfg2.HOSTS.keys())
+
+    def test_storage_base(self):
+        storage = cyra.core.ConfigStorage()
+        self.assertRaises(NotImplementedError, storage.load, self.cfg)
+        self.assertRaises(NotImplementedError, storage.save, self.cfg)
+
+    def test_gen_file_release_toml(self):
+        self.tmpdir = tests.tmpdir()
+        cfg_file = os.path.join(self.tmpdir.name, 'testcfg.toml')
+
+        self.cfg._file = cfg_file
+        self.cfg.load_file(release_toml=True)
+
+        self.assertIsNone(self.cfg._toml)
+        tests.assert_files_equal(self, os.path.join(tests.DIR_TESTFILES, 'testcfg.toml'), cfg_file)
+
+        # Diffs do not need the document
+        self.cfg.apply_diff([cyra.ConfigChange(('msg',), 'Hello World', 'Bye')])
+        self.cfg.save_file()
+        self.assertEqual('Bye', self.cfg.MSG)
+        self.assertEqual([], self.cfg.diff_file())
+
     def test_gen_file(self):
         self.tmpdir = tests.tmpdir()
         cfg_file = os.path.join(self.tmpdir.name, 'testcfg.toml')
@@ -450,3 +2003,209 @@ enable = true # DB connection enabled
         for i, b in enumerate(doc_blocks):
             self.assertEqual(docstrings[i], b[0])
             self.assertEqual(tomlstrings[i].strip(), b[1].strip())
+
+
+class TestAutoSave(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tests.tmpdir()
+        self.cfg_file = os.path.join(self.tmpdir.name, 'testcfg.toml')
+        self.journal = os.path.join(self.tmpdir.name, 'testcfg.journal')
+
+        self.cfg = Cfg(self.cfg_file)
+        self.cfg.load_file()
+
+    def tearDown(self):
+        self.cfg.disable_autosave()
+        self.tmpdir.cleanup()
+
+    def load_cfg(self):
+        cfg = Cfg(self.cfg_file)
+        cfg.load_file(False)
+        return cfg
+
+    def test_coalesce(self):
+        saver = self.cfg.enable_autosave(60)
+
+        with patch.object(self.cfg, 'save_file', wraps=self.cfg.save_file) as save_file:
+            self.cfg.MSG = 'Okay? Okay.'
+            self.cfg.PORT = 1111
+            self.cfg.accessor('DATABASE.enable').set(False)
+            save_file.assert_not_called()
+
+            saver.flush()
+            save_file.assert_called_once_with(True)
+
+            # Nothing pending
+            saver.flush()
+            save_file.assert_called_once_with(True)
+
+        cfg = self.load_cfg()
+        self.assertEqual('Okay? Okay.', cfg.MSG)
+        self.assertEqual(1111, cfg.PORT)
+        self.assertFalse(cfg.ENABLE)
+
+    def test_timer(self):
+        self.cfg.enable_autosave(0.01)
+        self.cfg.PORT = 1111
+
+        for _ in range(500):
+            if self.load_cfg().PORT == 1111:
+                break
+            time.sleep(0.01)
+        self.assertEqual(1111, self.load_cfg().PORT)
+
+    def test_disable(self):
+        self.cfg.enable_autosave(60)
+        self.cfg.PORT = 1111
+        self.assertEqual(1443, self.load_cfg().PORT)
+
+        self.cfg.disable_autosave()
+        self.assertEqual(1111, self.load_cfg().PORT)
+
+        self.cfg.PORT = 2222
+        self.assertEqual(1111, self.load_cfg().PORT)
+
+    def test_shutdown(self):
+        self.cfg.enable_autosave(60)
+        self.cfg.PORT = 1111
+
+        cyra.autosave._close_all()
+        self.assertEqual(1111, self.load_cfg().PORT)
+
+    def test_journal(self):
+        self.cfg.enable_autosave(60, self.journal)
+        self.cfg.PORT = 1111
+        self.cfg.apply_diff([cyra.ConfigChange(('msg',), None, 'Okay? Okay.')])
+
+        with open(self.journal, 'r') as f:
+            self.assertEqual('["DATABASE.port",1111]\n["msg","Okay? Okay."]\n', f.read())
+        self.assertEqual(1443, self.load_cfg().PORT)
+
+        # Simulate a crash: replay the journal with a new config
+        with open(self.journal, 'a') as f:
+            f.write('["unknown",1]\n["DATABASE.port",22')
+
+        cfg = self.load_cfg()
+        saver = cfg.enable_autosave(60, self.journal)
+        self.assertEqual(2, saver.n_replayed)
+        cfg.disable_autosave()
+
+        self.assertEqual(1111, self.load_cfg().PORT)
+        self.assertEqual('Okay? Okay.', self.load_cfg().MSG)
+        self.assertEqual(0, os.path.getsize(self.journal))
+
+    def test_journal_invalid(self):
+        with open(self.journal, 'w') as f:
+            f.write('["unknown",1]\n["DATABASE.port",22')
+
+        with patch.object(self.cfg, 'save_file') as save_file:
+            saver = self.cfg.enable_autosave(60, self.journal)
+            self.assertEqual(0, saver.n_replayed)
+            save_file.assert_not_called()
+
+    def test_journal_constraint(self):
+        cfg = PoolCfg(self.cfg_file)
+        cfg.load_file()
+
+        with open(self.journal, 'w') as f:
+            f.write('["POOL.min",50]\n')
+
+        # Changes violating a constraint are rolled back and the journal is discarded
+        with self.assertLogs(level='ERROR') as logs:
+            saver = cfg.enable_autosave(60, self.journal)
+        self.assertIn('constraint (min <= max)', logs.output[0])
+        self.assertEqual(0, saver.n_replayed)
+        self.assertEqual(0, os.path.getsize(self.journal))
+        cfg.disable_autosave()
+
+        cfg2 = PoolCfg(self.cfg_file)
+        cfg2.load_file(False)
+        self.assertEqual(1, cfg.MIN)
+        self.assertEqual(1, cfg2.MIN)
+
+    def test_journal_compact(self):
+        saver = self.cfg.enable_autosave(60, self.journal, compact_every=2)
+        self.cfg.PORT = 1111
+        self.assertEqual(1443, self.load_cfg().PORT)
+
+        self.cfg.PORT = 2222
+        self.assertEqual(2222, self.load_cfg().PORT)
+        self.assertEqual(0, os.path.getsize(self.journal))
+
+    def test_journal_unsupported_value(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.define('date', datetime.date(2020, 1, 1), strict=True)
+        cfg = cyra.Config(self.cfg_file, builder)
+        cfg.enable_autosave(60, self.journal)
+
+        # Values that cannot be stored in the journal are written immediately
+        cfg.accessor('date').set(datetime.date(2021, 1, 1))
+        cfg.disable_autosave()
+
+        self.assertEqual(0, os.path.getsize(self.journal))
+        with open(self.cfg_file, 'r') as f:
+            self.assertEqual('date = 2021-01-01\n', f.read())
+
+    def test_journal_removed_entry(self):
+        cfg = MapCfg(self.cfg_file)
+        cfg.load_file()
+        cfg.HOSTS.add('web', {'ip': '10.0.0.1'})
+        cfg.save_file()
+        cfg.enable_autosave(60, self.journal)
+
+        # Removed map entries cannot be journaled and are written immediately
+        cfg.HOSTS.remove('web')
+        self.assertEqual(0, os.path.getsize(self.journal))
+
+        cfg2 = MapCfg(self.cfg_file)
+        cfg2.load_file(False)
+        self.assertEqual([], cfg2.HOSTS.keys())
+        cfg.disable_autosave()
+
+    def test_concurrent_modification(self):
+        cfg = MapCfg(self.cfg_file)
+        cfg.load_file()
+        saver = cfg.enable_autosave(0.001)
+        self.assertIs(cfg._lock, saver._lock)
+
+        # Background saves must not see the config in the middle of a modification
+        with patch('cyra.autosave.logging') as log:
+            for i in range(200):
+                cfg.HOSTS.add('web%d' % i, {'ip': '10.0.0.%d' % (i % 256)})
+                if i % 2:
+                    cfg.HOSTS.remove('web%d' % (i - 1))
+            cfg.disable_autosave()
+        log.exception.assert_not_called()
+
+        cfg2 = MapCfg(self.cfg_file)
+        cfg2.load_file(False)
+        self.assertEqual(cfg.HOSTS.keys(), cfg2.HOSTS.keys())
+
+    def test_write_error(self):
+        self.cfg.PORT = 1111
+        self.cfg.save_file()
+        self.cfg.PORT = 2222
+
+        # A failed write leaves the previous config file intact
+        with patch.object(self.cfg, 'iter_toml', return_value=iter(['[DATABASE]\n', None])):
+            self.assertRaises(TypeError, self.cfg.save_file)
+        self.assertEqual(1111, self.load_cfg().PORT)
+        self.assertEqual(['testcfg.toml'], os.listdir(self.tmpdir.name))
+
+    def test_timer_error(self):
+        saver = self.cfg.enable_autosave(60)
+        self.cfg.PORT = 1111
+
+        with patch.object(self.cfg, 'save_file', side_effect=IOError('disk full')), \
+                self.assertLogs(level='ERROR') as logs:
+            saver._on_timer()
+        self.assertIn('Cyra could not save your config to', logs.output[0])
+
+    def test_shutdown_error(self):
+        self.cfg.enable_autosave(60)
+        self.cfg.PORT = 1111
+
+        with patch.object(self.cfg, 'save_file', side_effect=IOError('disk full')), \
+                self.assertLogs(level='ERROR') as logs:
+            cyra.autosave._close_all()
+        self.assertIn('Cyra could not save your config on shutdown', logs.output[0])
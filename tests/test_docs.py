@@ -3,9 +3,9 @@ import unittest
 import shutil
 
 try:
-    from unittest.mock import patch
+    from unittest.mock import patch, Mock
 except ImportError:
-    from mock import patch
+    from mock import patch, Mock
 
 from bs4 import BeautifulSoup
 from sphinx.testing.util import SphinxTestApp
@@ -14,6 +14,7 @@ from sphinx.testing.util import path as sphinx_path
 import tests
 from tests.test_core import Cfg
 import cyra
+import cyra.cyradoc
 
 
 class CfgEmptyDocblocks(cyra.Config):
@@ -32,6 +33,7 @@ class TestDocs(unittest.TestCase):
     input_dir = None
     output_dir = None
     mock_logger = None
+    mock_docblocks = None
 
     @classmethod
     def setUpClass(cls):
@@ -42,7 +44,9 @@ class TestDocs(unittest.TestCase):
         cls.app = SphinxTestApp(srcdir=sphinx_path(cls.input_dir))
         cls.output_dir = os.path.join(cls.input_dir, '_build', 'html')
 
-        with patch('cyra.cyradoc.logger.error') as cls.mock_logger:
+        with patch('cyra.cyradoc.logger.error') as cls.mock_logger, \
+                patch.object(Cfg, 'get_docblocks', autospec=True,
+                             side_effect=Cfg.get_docblocks) as cls.mock_docblocks:
             cls.app.build()
 
     @classmethod
@@ -123,3 +127,50 @@ enable = true # DB connection enabled''',
 
         self.assertEqual(exp_docstrings, docstrings)
         self.assertEqual(exp_blocks, blocks)
+
+    def test_cached(self):
+        # Cfg is documented 3 times, but the blocks are only rendered once
+        self.assertEqual(1, self.mock_docblocks.call_count)
+
+        body = self.parse_file('cached.html')
+        docstrings, blocks = self.parse_body(body)
+        self.assertEqual(6, len(blocks))
+
+    def test_outdated(self):
+        env = self.app.env
+        self.assertEqual({'tests.test_core.Cfg': cyra.cyradoc.schema_fingerprint(Cfg)},
+                         env.cyradoc_schemas['index'])
+
+        self.assertEqual([], cyra.cyradoc.env_get_outdated(self.app, env, set(), set(), set()))
+
+        # Simulate a schema change
+        fingerprint = env.cyradoc_schemas['cached']['tests.test_core.Cfg']
+        env.cyradoc_schemas['cached']['tests.test_core.Cfg'] = 'outdated'
+        env.cyradoc_schemas['errors'] = {'nomodule.Cfg': 'outdated'}
+        try:
+            self.assertEqual(['cached', 'errors'], sorted(
+                cyra.cyradoc.env_get_outdated(self.app, env, set(), set(), set())))
+        finally:
+            env.cyradoc_schemas['cached']['tests.test_core.Cfg'] = fingerprint
+            del env.cyradoc_schemas['errors']
+
+    def test_merge_info(self):
+        env = type('Env', (object,), {})()
+        other = type('Env', (object,), {})()
+        other.cyradoc_schemas = {'doc1': {'a.Cfg': 'fp1'}, 'doc2': {'b.Cfg': 'fp2'}}
+        other.cyradoc_blocks = {('a.Cfg', False): ('fp1', [])}
+
+        cyra.cyradoc.env_merge_info(self.app, env, ['doc1', 'doc3'], other)
+        self.assertEqual({'doc1': {'a.Cfg': 'fp1'}}, env.cyradoc_schemas)
+        self.assertEqual(other.cyradoc_blocks, env.cyradoc_blocks)
+
+        cyra.cyradoc.env_purge_doc(self.app, env, 'doc1')
+        self.assertEqual({}, env.cyradoc_schemas)
+
+    def test_setup(self):
+        app = Mock()
+        metadata = cyra.cyradoc.setup(app)
+
+        app.add_directive.assert_called_once_with('cyradoc', cyra.cyradoc.CyradocDirective)
+        self.assertTrue(metadata['parallel_read_safe'])
+        self.assertTrue(metadata['parallel_write_safe'])
@@ -0,0 +1,193 @@
+import unittest
+import os
+import sqlite3
+import datetime
+
+import tests
+import cyra
+import cyra.storage
+from cyra.storage import SqliteStorage
+from tests.test_core import Cfg, MapCfg
+
+
+class TestSqliteStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tests.tmpdir()
+        self.db_file = os.path.join(self.tmpdir.name, 'config.db')
+        self.storages = []
+
+    def tearDown(self):
+        for storage in self.storages:
+            storage.close()
+        self.tmpdir.cleanup()
+
+    def new_cfg(self, cfg_class=Cfg):
+        storage = SqliteStorage(self.db_file)
+        self.storages.append(storage)
+        return cfg_class(storage=storage), storage
+
+    def test_load_save(self):
+        cfg, storage = self.new_cfg()
+        cfg.load_file()
+
+        # Missing values are written with their default values
+        self.assertEqual(1, storage.sequence())
+        self.assertEqual(1443, storage.read('DATABASE.port'))
+        self.assertRaises(KeyError, storage.read, 'DATABASE.nothing')
+
+        cfg.PORT = 3306
+        self.assertTrue(cfg.save_file())
+        self.assertEqual(2, storage.sequence())
+        self.assertEqual(3306, storage.read(('DATABASE', 'port')))
+
+        # Unchanged configs are not written
+        self.assertTrue(cfg.save_file(True))
+        self.assertEqual(2, storage.sequence())
+
+        cfg2, _ = self.new_cfg()
+        cfg2.load_file()
+        self.assertEqual(3306, cfg2.PORT)
+        self.assertEqual('Hello World', cfg2.MSG)
+
+    def test_save_unchanged(self):
+        cfg, storage = self.new_cfg()
+        cfg.load_file(False)
+        self.assertEqual(0, storage.sequence())
+        self.assertFalse(cfg.save_file())
+
+        cfg.save_file(True)
+        self.assertEqual(1, storage.sequence())
+
+        # Values equal to the stored values are not written
+        cfg.MSG = ''.join(['Hello', ' World'])
+        self.assertTrue(cfg.save_file())
+        self.assertEqual(1, storage.sequence())
+
+    def test_unknown_keys(self):
+        cfg, storage = self.new_cfg()
+        cfg.load_file()
+        with storage._conn:
+            storage._conn.execute("INSERT INTO cyra_values (path, value, seq) "
+                                  "VALUES ('removed.key', '1', 1)")
+
+        # Values of other schema versions are kept in the database
+        report = storage.load(cfg)
+        self.assertEqual(['removed.key'], report.unknown_keys)
+        cfg.PORT = 3306
+        cfg.save_file()
+        self.assertEqual(1, storage.read('removed.key'))
+
+    def test_load_section(self):
+        cfg, _ = self.new_cfg()
+        cfg.PORT = 3306
+        cfg.MSG = 'Hi'
+        cfg.save_file()
+
+        cfg2, storage2 = self.new_cfg()
+        storage2.load_section(cfg2, 'DATABASE')
+        self.assertEqual(3306, cfg2.PORT)
+        self.assertEqual('Hello World', cfg2.MSG)
+
+        # Values that were not loaded do not overwrite the database
+        cfg2.PASSWORD = 'secret'
+        cfg2.save_file()
+        self.assertEqual('Hi', storage2.read('msg'))
+        self.assertEqual('secret', storage2.read('DATABASE.password'))
+
+    def test_reload(self):
+        cfg, storage = self.new_cfg()
+        cfg.load_file()
+        cfg2, storage2 = self.new_cfg()
+        cfg2.load_file()
+        self.assertFalse(storage.changed())
+        self.assertIsNone(storage.reload(cfg))
+
+        cfg2.PORT = 3306
+        cfg2.save_file()
+        self.assertFalse(storage2.changed())
+        self.assertTrue(storage.changed())
+
+        report = storage.reload(cfg)
+        self.assertFalse(report.errors)
+        self.assertEqual(3306, cfg.PORT)
+        self.assertFalse(storage.changed())
+
+        # Changes of other writers are not skipped by a save
+        cfg2.PORT = 3307
+        cfg2.save_file()
+        cfg.MSG = 'Hi'
+        cfg.save_file()
+        self.assertTrue(storage.changed())
+
+        storage.reload(cfg)
+        self.assertEqual(3307, cfg.PORT)
+        self.assertFalse(storage.changed())
+
+    def test_map(self):
+        cfg, storage = self.new_cfg(MapCfg)
+        cfg.load_file()
+        cfg.HOSTS.add('web', {'ip': '10.0.0.1'})
+        cfg.HOSTS.add('db', {'port': 5432})
+        cfg.save_file()
+
+        cfg2, storage2 = self.new_cfg(MapCfg)
+        cfg2.load_file()
+        self.assertEqual(['web', 'db'], cfg2.HOSTS.keys())
+        self.assertEqual(5432, cfg2.HOSTS['db']['port'])
+
+        cfg.HOSTS.remove('web')
+        cfg.save_file()
+        self.assertRaises(KeyError, storage.read, 'HOSTS.web.ip')
+
+        storage2.reload(cfg2)
+        self.assertEqual(['db'], cfg2.HOSTS.keys())
+
+    def test_failed_save(self):
+        cfg, storage = self.new_cfg()
+        cfg.load_file()
+        with storage._conn:
+            storage._conn.execute("CREATE TRIGGER fail BEFORE INSERT ON cyra_values "
+                                  "BEGIN SELECT RAISE(ABORT, 'database is locked'); END")
+
+        # Changes are kept if the transaction fails
+        cfg.PORT = 3306
+        self.assertRaises(sqlite3.DatabaseError, cfg.save_file)
+        self.assertTrue(cfg._modified)
+        self.assertEqual(1, storage.sequence())
+        self.assertEqual(1443, storage.read('DATABASE.port'))
+
+        with storage._conn:
+            storage._conn.execute('DROP TRIGGER fail')
+        self.assertTrue(cfg.save_file())
+        self.assertEqual(3306, storage.read('DATABASE.port'))
+
+    def test_dates(self):
+        builder = cyra.core.ConfigBuilder()
+        builder.define('date', datetime.date(2020, 1, 1), strict=True)
+        builder.define('time', datetime.time(7, 32, 0, 500000), strict=True)
+        builder.define('datetime', datetime.datetime(2020, 1, 1, 10, 0, 0, 123456), strict=True)
+        builder.define('dates', [datetime.date(2020, 1, 1)])
+
+        cfg = cyra.Config(storage=SqliteStorage(self.db_file), cfg_builder=builder)
+        self.storages.append(cfg._storage)
+        cfg.load_file()
+
+        # Dates and times are stored as tagged ISO 8601 strings
+        value = datetime.datetime(2021, 5, 27, 7, 32, 0, 500000)
+        cfg.accessor('datetime').set(value)
+        cfg.save_file()
+        self.assertEqual(value, cfg._storage.read('datetime'))
+        self.assertIs(datetime.datetime, type(cfg._storage.read('datetime')))
+        self.assertEqual([datetime.date(2020, 1, 1)], cfg._storage.read('dates'))
+
+        cfg2 = cyra.Config(storage=SqliteStorage(self.db_file), cfg_builder=builder)
+        self.storages.append(cfg2._storage)
+        cfg2.load_file()
+        self.assertEqual(cfg.as_dict(), cfg2.as_dict())
+        self.assertIs(datetime.time, type(cfg2.get('time')))
+        self.assertIs(datetime.date, type(cfg2.get('date')))
+
+    def test_encode_unsupported(self):
+        self.assertRaises(TypeError, cyra.storage._encode, {1, 2})
+        self.assertEqual({'$x': 1, '$date': 2}, cyra.storage._decode('{"$x":1,"$date":2}'))
+        self.assertEqual({'$x': 1}, cyra.storage._decode('{"$x":1}'))